@@ -0,0 +1,251 @@
+# Under MIT License, see LICENSE.txt
+
+import asyncio
+import logging
+import pickle
+import socket
+from threading import Thread, Condition
+from time import time
+
+from Communication.IngestQueue import IngestQueue
+
+__author__ = 'RoboCupULaval'
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    """ Protocole asyncio qui relaie les datagrammes reçus au serveur """
+    def __init__(self, server):
+        self._server = server
+
+    def datagram_received(self, data, addr):
+        self._server._on_datagram(data, addr)
+
+    def error_received(self, exc):
+        self._server._logger.error('RECV: ({}) {}'.format(type(exc).__name__, exc))
+
+
+class AsyncUDPServer:
+    """
+        AsyncUDPServer offre la même interface que UDPServer (send_message, new_rcv_connexion, ports et
+        waiting_for_last_data), mais reçoit les paquets avec un DatagramProtocol asyncio sur une boucle
+        d'événements dédiée. Les datagrammes reçus pendant une fenêtre de regroupement sont livrés en lot,
+        soit à un consommateur (fonction ou coroutine) exécuté dans la boucle, soit à une file protégée par
+        une condition pour les consommateurs bloquants. Un changement de port se fait sans attendre de
+        timeout de réception. La file peut être une IngestQueue bornée qui classe les paquets par priorité.
+    """
+    def __init__(self, name='UDP', ip="127.0.0.1", rcv_port=None, snd_port=None, debug=False, batch_window=0.002,
+                 ingest_queue=None):
+        self._num = 0
+        self._ip = ip
+        self._default_rcv_port = 20021
+        self._default_snd_port = 10221
+        self._rcv_port = rcv_port or self._default_rcv_port
+        self._snd_port = snd_port or self._default_snd_port
+        self._batch_window = batch_window
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._run_loop, name=name)
+        self._thread.daemon = True
+        self._transport = None
+
+        # Lot en cours d'accumulation, manipulé seulement dans le fil de la boucle
+        self._pending = []
+        self._flush_handle = None
+
+        # Capture et relecture: tap(data, temps de réception) voit chaque paquet reçu du réseau
+        self._tap = None
+        self._accept_network = True
+
+        # Livraison des lots
+        self._consumer = None
+        self._data_queue = ingest_queue if ingest_queue is not None else IngestQueue()
+        self._data_condition = Condition()
+        self._wakeup = False
+
+        self._logger = logging.getLogger(name)
+        if debug:
+            self._logger.setLevel(logging.DEBUG)
+        else:
+            self._logger.setLevel(logging.INFO)
+
+        self.init_logger()
+
+    def toggle_debug(self):
+        pass
+
+    def init_logger(self):
+        ch = logging.StreamHandler()
+        ch.setLevel(logging.DEBUG)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(threadName)s - %(levelname)s - %(message)s')
+        ch.setFormatter(formatter)
+        self._logger.addHandler(ch)
+
+    # === EVENT LOOP ===
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _run_in_loop(self, coroutine):
+        """ Exécute une coroutine dans la boucle dédiée et attend son résultat """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _bind(self):
+        """ Ouvre le socket de réception sur le port courant """
+        self._close_transport()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self._ip, self._rcv_port))
+        self._transport, _ = await self._loop.create_datagram_endpoint(lambda: _DatagramProtocol(self), sock=sock)
+        self._logger.debug('UP: {}, {}'.format(self._ip, self._rcv_port))
+
+    async def _unbind(self):
+        self._close_transport()
+
+    def _close_transport(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+            self._logger.debug('DOWN: {}, {}'.format(self._ip, self._rcv_port))
+
+    # === RECEPTION ===
+    def _on_datagram(self, data, addr):
+        """ Accumule un datagramme dans le lot courant et planifie sa livraison """
+        if addr is not None:
+            if self._tap is not None:
+                self._tap(data, time())
+            if not self._accept_network:
+                return
+        self._pending.append((self._num, data))
+        self._num += 1
+        if self._flush_handle is None:
+            if self._batch_window > 0:
+                self._flush_handle = self._loop.call_later(self._batch_window, self._flush)
+            else:
+                self._flush_handle = self._loop.call_soon(self._flush)
+
+    def _flush(self):
+        """ Livre le lot accumulé au consommateur ou à la file """
+        self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('RECV: batch of {} packets'.format(len(batch)))
+        consumer = self._consumer
+        if consumer is None:
+            with self._data_condition:
+                self._data_queue.extend(batch)
+                self._data_condition.notify_all()
+        elif asyncio.iscoroutinefunction(consumer):
+            self._loop.create_task(consumer(batch))
+        else:
+            try:
+                consumer(batch)
+            except Exception as e:
+                self._logger.error('CONSUMER: ({}) {}'.format(type(e).__name__, e))
+
+    def set_batch_consumer(self, consumer):
+        """ Assigne une fonction ou une coroutine qui reçoit chaque lot [(num, data), ...] dans la boucle.
+            None retourne au mode par file (waiting_for_last_data / waiting_for_data_batch). """
+        self._consumer = consumer
+
+    def set_tap(self, tap):
+        """ Assigne une fonction tap(data, temps de réception) appelée pour chaque paquet reçu du réseau """
+        self._tap = tap
+
+    def set_accept_network(self, accept):
+        """ Ignore les paquets du réseau (False) pendant une relecture """
+        self._accept_network = accept
+
+    def inject(self, data):
+        """ Ajoute un paquet comme s'il avait été reçu du réseau, sans passer par le tap """
+        self._loop.call_soon_threadsafe(self._on_datagram, data, None)
+
+    # === INTERFACE UDPServer ===
+    def send_message(self, p_object):
+        if not type(b'') == type(p_object):
+            self._logger.debug('SEND: object not serialized')
+            p_object = pickle.dumps(p_object)
+        self._logger.debug('SEND: {} bytes'.format(len(p_object)))
+        self._loop.call_soon_threadsafe(self._send, p_object)
+
+    def _send(self, p_object):
+        try:
+            if self._transport is None:
+                raise ConnectionError('transport fermé')
+            self._transport.sendto(p_object, (self._ip, self._snd_port))
+        except Exception as e:
+            self._logger.error('Message not send : {}'.format(type(e).__name__ + str(e)))
+
+    def get_snd_port(self):
+        self._logger.debug('GET: snd port {}'.format(self._snd_port))
+        return self._snd_port
+
+    def get_default_snd_port(self):
+        self._logger.debug("GET: default snd port {}".format(self._default_snd_port))
+        return self._default_snd_port
+
+    def get_rcv_port(self):
+        self._logger.debug('GET: rcv port {}'.format(self._rcv_port))
+        return self._rcv_port
+
+    def get_default_rcv_port(self):
+        self._logger.debug('GET: default rcv port {}'.format(self._default_rcv_port))
+        return self._default_rcv_port
+
+    def set_snd_port(self, port):
+        self._logger.debug('SET: snd port {} -> {}'.format(self._snd_port, port))
+        self._snd_port = port
+
+    def new_rcv_connexion(self, port):
+        assert isinstance(port, int) and 0 < port
+        self._logger.debug('NEW CONNEXION: port {}'.format(port))
+        try:
+            self.set_connexion(port)
+            self.start()
+        except Exception as e:
+            self._logger.error('({}) {}'.format(type(e).__name__, e))
+
+    def set_connexion(self, port):
+        self._logger.debug('SET_CONNEXION: port {}'.format(port))
+        self._rcv_port = port
+
+    def start(self):
+        self._logger.debug('START')
+        if not self._thread.is_alive():
+            self._thread.start()
+        self._run_in_loop(self._bind())
+
+    def stop(self):
+        self._logger.debug('STOP')
+        if self._thread.is_alive():
+            self._run_in_loop(self._unbind())
+
+    def wait_for_new_connexion(self):
+        """ Le socket est fermé de façon synchrone par stop(), il n'y a rien à attendre """
+        pass
+
+    def waiting_for_last_data(self):
+        """ Attend et récupère le plus ancien paquet reçu (num, data) """
+        with self._data_condition:
+            while not self._data_queue:
+                self._data_condition.wait()
+            return self._data_queue.popleft()
+
+    def waiting_for_data_batch(self, timeout=None):
+        """ Attend et récupère tous les paquets reçus [(num, data), ...], une liste vide après timeout ou wake() """
+        with self._data_condition:
+            self._data_condition.wait_for(lambda: self._data_queue or self._wakeup, timeout)
+            self._wakeup = False
+            return self._data_queue.pop_all()
+
+    def get_ingest_stats(self):
+        """ Récupère les compteurs de la file de réception par voie (en file, acceptés, jetés, remplacés) """
+        with self._data_condition:
+            return self._data_queue.get_stats()
+
+    def wake(self):
+        """ Réveille un consommateur bloqué dans waiting_for_data_batch, qui reçoit alors un lot vide """
+        with self._data_condition:
+            self._wakeup = True
+            self._data_condition.notify_all()
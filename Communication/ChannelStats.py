@@ -0,0 +1,127 @@
+# Under MIT License, see LICENSE.txt
+
+from collections import deque
+from threading import Lock
+from time import time
+
+__author__ = 'RoboCupULaval'
+
+
+class _StreamStats:
+    """ Statistiques d'un flux de paquets (un émetteur et un type, ou une caméra) """
+    # Un recul plus grand que ce seuil dans les numéros de séquence indique un redémarrage de l'émetteur
+    SEQUENCE_RESET_GAP = 1000
+
+    def __init__(self, now, latency_samples):
+        self.packets = 0
+        self.bytes = 0
+        self.gaps = 0
+        self.reorders = 0
+        self.duplicates = 0
+        self.last_seq = None
+        self.latencies = deque(maxlen=latency_samples)
+
+        self.window_start = now
+        self.window_packets = 0
+        self.window_bytes = 0
+        self.packets_per_sec = 0.0
+        self.bytes_per_sec = 0.0
+
+    def record(self, nbytes, seq, latency, now):
+        self.packets += 1
+        self.bytes += nbytes
+        self.window_packets += 1
+        self.window_bytes += nbytes
+        if seq is not None:
+            self._record_sequence(seq)
+        if latency is not None:
+            self.latencies.append(latency)
+        self.update_rates(now)
+
+    def _record_sequence(self, seq):
+        """ Compte les trous et les paquets arrivés dans le désordre à partir des numéros de séquence """
+        last_seq = self.last_seq
+        if last_seq is None or seq == last_seq + 1:
+            self.last_seq = seq
+        elif seq > last_seq:
+            self.gaps += seq - last_seq - 1
+            self.last_seq = seq
+        elif seq == last_seq:
+            self.duplicates += 1
+        elif last_seq - seq < self.SEQUENCE_RESET_GAP:
+            # Un paquet en retard remplit un trou déjà compté
+            self.reorders += 1
+            self.gaps = max(0, self.gaps - 1)
+        else:
+            self.last_seq = seq
+
+    def update_rates(self, now):
+        """ Calcule les taux sur une fenêtre d'une seconde """
+        dt = now - self.window_start
+        if dt >= 1:
+            self.packets_per_sec = self.window_packets / dt
+            self.bytes_per_sec = self.window_bytes / dt
+            self.window_packets = 0
+            self.window_bytes = 0
+            self.window_start = now
+
+    def get_dict(self, now):
+        if now - self.window_start >= 2:
+            # Plus aucun paquet depuis deux fenêtres, le flux est considéré arrêté
+            self.packets_per_sec = 0.0
+            self.bytes_per_sec = 0.0
+        latencies = sorted(self.latencies)
+        expected = self.packets + self.gaps
+        return {'packets': self.packets,
+                'bytes': self.bytes,
+                'packets_per_sec': self.packets_per_sec,
+                'bytes_per_sec': self.bytes_per_sec,
+                'gaps': self.gaps,
+                'reorders': self.reorders,
+                'duplicates': self.duplicates,
+                'loss_ratio': self.gaps / expected if expected else 0.0,
+                'latency_p50': _percentile(latencies, 0.50),
+                'latency_p90': _percentile(latencies, 0.90),
+                'latency_p99': _percentile(latencies, 0.99)}
+
+
+def _percentile(sorted_values, ratio):
+    """ Percentile d'une liste triée, None si elle est vide """
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(ratio * len(sorted_values)))]
+
+
+class ChannelStats:
+    """
+        ChannelStats compte les paquets d'un canal par flux (par exemple (émetteur, type) pour StrategyIA ou
+        le numéro de caméra pour la vision): paquets/s, octets/s, trous et désordres dans les numéros de
+        séquence et percentiles de la latence (réception - envoi, en secondes). La latence suppose que les
+        horloges de l'émetteur et de l'UI sont synchronisées. Les méthodes sont thread-safe.
+    """
+    def __init__(self, latency_samples=512):
+        self._latency_samples = latency_samples
+        self._streams = dict()
+        self._lock = Lock()
+
+    def record(self, key, nbytes, seq=None, sent_time=None, now=None):
+        """ Compte un paquet reçu pour le flux key """
+        if now is None:
+            now = time()
+        latency = now - sent_time if sent_time is not None else None
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = _StreamStats(now, self._latency_samples)
+                self._streams[key] = stream
+            stream.record(nbytes, seq, latency, now)
+
+    def get_stats(self):
+        """ Récupère les statistiques de chaque flux {key: {...}} """
+        now = time()
+        with self._lock:
+            return {key: stream.get_dict(now) for key, stream in self._streams.items()}
+
+    def reset(self):
+        with self._lock:
+            self._streams.clear()
@@ -0,0 +1,146 @@
+# Under MIT License, see LICENSE.txt
+
+from collections import deque, OrderedDict
+from heapq import merge
+from itertools import groupby
+
+__author__ = 'RoboCupULaval'
+
+# Politiques d'une voie pleine
+POLICY_LOSSLESS = 'lossless'                # aucune perte, la capacité n'est pas appliquée
+POLICY_DROP_OLDEST = 'drop_oldest'          # le plus ancien paquet est jeté
+POLICY_LATEST_PER_KEY = 'latest_per_key'    # seul le dernier paquet d'une clé est gardé, puis le plus ancien est jeté
+POLICY_SAMPLE = 'sample'                    # le plus récent est gardé et le plus ancien jeté, un paquet sur
+                                            # sample_every reste en file, les autres sont remplacés par le suivant
+
+LANE_DEFAULT = 'default'
+
+
+class _Lane:
+    """ Voie de la file: paquets d'une même classe dans l'ordre d'arrivée et leurs compteurs """
+    def __init__(self, name, priority, policy, capacity, sample_every):
+        self.name = name
+        self.priority = priority
+        self.policy = policy
+        self.capacity = capacity
+        self.sample_every = sample_every
+        self.items = OrderedDict() if policy == POLICY_LATEST_PER_KEY else deque()
+        self.accepted = 0
+        self.dropped = 0
+        self.replaced = 0
+        self.overflow = 0
+        # Le dernier paquet de la voie n'a pas été retenu par l'échantillon et sera remplacé par le suivant
+        self._replace_tail = False
+
+    def put(self, item, key):
+        if self.policy == POLICY_LATEST_PER_KEY:
+            if key in self.items:
+                del self.items[key]
+                self.replaced += 1
+            self.items[key] = item
+            if len(self.items) > self.capacity:
+                self.items.popitem(last=False)
+                self.dropped += 1
+        elif self.policy == POLICY_SAMPLE and len(self.items) >= self.capacity:
+            self.overflow += 1
+            if self._replace_tail:
+                self.items.pop()
+            else:
+                self.items.popleft()
+            self.items.append(item)
+            self.dropped += 1
+            self._replace_tail = bool(self.overflow % self.sample_every)
+        else:
+            self._replace_tail = False
+            self.items.append(item)
+            if self.policy == POLICY_DROP_OLDEST and len(self.items) > self.capacity:
+                self.items.popleft()
+                self.dropped += 1
+        self.accepted += 1
+
+    def values(self):
+        return self.items.values() if self.policy == POLICY_LATEST_PER_KEY else self.items
+
+    def popleft(self):
+        if self.policy == POLICY_LATEST_PER_KEY:
+            return self.items.popitem(last=False)[1]
+        return self.items.popleft()
+
+
+class IngestQueue:
+    """
+        File bornée à plusieurs classes de paquets (num, data). classify(data) -> (nom de voie, clé) range chaque
+        paquet dans une voie qui a sa priorité, sa capacité et sa politique de perte. Les paquets sont retirés par
+        priorité croissante (0 d'abord); les voies de même priorité sont fusionnées dans l'ordre d'arrivée (num).
+        Sans classify, la file se comporte comme une deque sans limite.
+        La file n'est pas protégée: l'appelant la manipule sous son propre verrou.
+    """
+    def __init__(self, classify=None):
+        self._classify = classify
+        self._lanes = dict()
+        self._ordered_lanes = []
+        self._length = 0
+        self.add_lane(LANE_DEFAULT, priority=0, policy=POLICY_LOSSLESS)
+
+    def add_lane(self, name, priority, policy, capacity=None, sample_every=1):
+        """ Ajoute une voie. capacity est obligatoire pour une politique avec perte. """
+        if policy != POLICY_LOSSLESS and not (isinstance(capacity, int) and capacity > 0):
+            raise ValueError('la voie {} ({}) doit avoir une capacité positive'.format(name, policy))
+        self._lanes[name] = _Lane(name, priority, policy, capacity, max(1, sample_every))
+        self._ordered_lanes = sorted(self._lanes.values(), key=lambda lane: lane.priority)
+
+    def put(self, item):
+        """ Ajoute un paquet (num, data) dans sa voie en appliquant la politique de la voie """
+        if self._classify is None:
+            lane, key = self._lanes[LANE_DEFAULT], None
+        else:
+            lane_name, key = self._classify(item[1])
+            lane = self._lanes.get(lane_name) or self._lanes[LANE_DEFAULT]
+        before = len(lane.items)
+        lane.put(item, key)
+        self._length += len(lane.items) - before
+
+    def extend(self, items):
+        for item in items:
+            self.put(item)
+
+    def popleft(self):
+        """ Retire le plus ancien paquet de la voie non vide la plus prioritaire """
+        for lane in self._ordered_lanes:
+            if lane.items:
+                self._length -= 1
+                return lane.popleft()
+        raise IndexError('pop from an empty IngestQueue')
+
+    def pop_all(self):
+        """ Retire tous les paquets [(num, data), ...] par priorité puis dans l'ordre d'arrivée """
+        batch = []
+        for _, lanes in groupby(self._ordered_lanes, key=lambda lane: lane.priority):
+            lanes = [lane for lane in lanes if lane.items]
+            if len(lanes) == 1:
+                batch.extend(lanes[0].values())
+            elif lanes:
+                batch.extend(merge(*[lane.values() for lane in lanes], key=lambda item: item[0]))
+            for lane in lanes:
+                lane.items.clear()
+        self._length = 0
+        return batch
+
+    def clear(self):
+        for lane in self._ordered_lanes:
+            lane.items.clear()
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def get_stats(self):
+        """ Récupère les compteurs par voie: paquets en file, acceptés, jetés et remplacés par un plus récent """
+        return {lane.name: {'queued': len(lane.items),
+                            'accepted': lane.accepted,
+                            'dropped': lane.dropped,
+                            'replaced': lane.replaced}
+                for lane in self._ordered_lanes}
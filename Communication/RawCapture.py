@@ -0,0 +1,339 @@
+# Under MIT License, see LICENSE.txt
+
+import logging
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from collections import deque
+from threading import Thread, Event, Lock
+from time import time
+
+__author__ = 'RoboCupULaval'
+
+"""
+    Capture brute des datagrammes reçus (vision et StrategyIA) dans un journal binaire segmenté.
+
+    Segment (capture-NNNNN.seg):
+        entête      4s H    b'UDRC', version du format
+        enregistrements     temps de réception (f64), canal (u8), taille (u32), datagramme
+
+    Index (capture.idx): un point d'entrée (temps, numéro de segment, position) au plus à chaque
+    index_interval secondes et au début de chaque segment, pour se positionner sans tout relire.
+"""
+
+CHANNEL_VISION = 0
+CHANNEL_STRATEGY = 1
+
+SPEED_MIN = 0.25
+SPEED_MAX = 16.0
+
+_MAGIC = b'UDRC'
+_FORMAT_VERSION = 1
+_SEGMENT_HEADER = struct.Struct('<4sH')
+_RECORD_HEADER = struct.Struct('<dBI')
+_INDEX_ENTRY = struct.Struct('<dIQ')
+_INDEX_FILE = 'capture.idx'
+
+
+def _segment_path(directory, number):
+    return os.path.join(directory, 'capture-{:05d}.seg'.format(number))
+
+
+class RawCaptureWriter(Thread):
+    """
+        RawCaptureWriter ajoute les datagrammes reçus au journal. Les fils de réception ne font que copier le
+        datagramme dans une file, l'écriture sur disque se fait dans ce fil. Un nouveau segment est ouvert
+        lorsque le segment courant dépasse segment_size octets.
+    """
+    def __init__(self, directory, segment_size=64 * 1024 * 1024, index_interval=1.0):
+        super().__init__(name=RawCaptureWriter.__name__)
+        self.daemon = True
+        self._directory = directory
+        self._segment_size = segment_size
+        self._index_interval = index_interval
+
+        self._queue = deque()
+        self._event_data = Event()
+        self._is_running = True
+
+        self._segment_number = -1
+        self._segment_file = None
+        self._segment_pos = 0
+        self._index_file = None
+        self._last_index_time = None
+
+        self._stats_lock = Lock()
+        self._records = 0
+        self._bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._index_file = open(os.path.join(directory, _INDEX_FILE), 'ab')
+        self._open_next_segment()
+        self.start()
+
+    def write(self, channel, data, timestamp=None):
+        """ Ajoute un datagramme à la file d'écriture (appelé par les fils de réception) """
+        self._queue.append((time() if timestamp is None else timestamp, channel, bytes(data)))
+        self._event_data.set()
+
+    def tap(self, channel):
+        """ Retourne une fonction tap(data, temps de réception) qui capture sur le canal donné """
+        def capture(data, received_time=None):
+            self.write(channel, data, received_time)
+        return capture
+
+    def run(self):
+        while self._is_running or self._queue:
+            self._event_data.wait(0.5)
+            self._event_data.clear()
+            self._write_pending()
+        self._close()
+
+    def _write_pending(self):
+        queue = self._queue
+        while queue:
+            timestamp, channel, data = queue.popleft()
+            if self._segment_pos >= self._segment_size:
+                self._open_next_segment()
+            if self._last_index_time is None or timestamp - self._last_index_time >= self._index_interval:
+                self._index_file.write(_INDEX_ENTRY.pack(timestamp, self._segment_number, self._segment_pos))
+                self._last_index_time = timestamp
+            self._segment_file.write(_RECORD_HEADER.pack(timestamp, channel, len(data)))
+            self._segment_file.write(data)
+            self._segment_pos += _RECORD_HEADER.size + len(data)
+            with self._stats_lock:
+                self._records += 1
+                self._bytes += len(data)
+        self._segment_file.flush()
+        self._index_file.flush()
+
+    def _open_next_segment(self):
+        if self._segment_file is not None:
+            self._segment_file.close()
+        self._segment_number += 1
+        while os.path.exists(_segment_path(self._directory, self._segment_number)):
+            self._segment_number += 1
+        self._segment_file = open(_segment_path(self._directory, self._segment_number), 'wb')
+        self._segment_file.write(_SEGMENT_HEADER.pack(_MAGIC, _FORMAT_VERSION))
+        self._segment_pos = _SEGMENT_HEADER.size
+        # Le début de chaque segment est toujours indexé
+        self._last_index_time = None
+
+    def _close(self):
+        self._segment_file.close()
+        self._index_file.close()
+
+    def get_stats(self):
+        """ Récupère le nombre d'enregistrements et d'octets capturés """
+        with self._stats_lock:
+            return {'records': self._records, 'bytes': self._bytes, 'segment': self._segment_number}
+
+    def stop(self):
+        """ Termine l'écriture de la file et ferme le journal """
+        self._is_running = False
+        self._event_data.set()
+        self.join()
+
+
+class RawCaptureReader:
+    """ Lecture d'un journal de capture par projection mémoire (mmap) des segments """
+    def __init__(self, directory):
+        self._directory = directory
+        self._segments = []
+        number = 0
+        while os.path.exists(_segment_path(directory, number)):
+            self._segments.append(self._map_segment(_segment_path(directory, number)))
+            number += 1
+        self._index_times, self._index_positions = self._load_index()
+
+    @staticmethod
+    def _map_segment(path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= _SEGMENT_HEADER.size:
+                return None
+            segment = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = _SEGMENT_HEADER.unpack_from(segment, 0)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            segment.close()
+            raise ValueError('{} n\'est pas un segment de capture valide'.format(path))
+        return segment
+
+    def _load_index(self):
+        times, positions = [], []
+        path = os.path.join(self._directory, _INDEX_FILE)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                raw = f.read()
+            for offset in range(0, len(raw) - _INDEX_ENTRY.size + 1, _INDEX_ENTRY.size):
+                timestamp, segment, position = _INDEX_ENTRY.unpack_from(raw, offset)
+                if segment < len(self._segments):
+                    times.append(timestamp)
+                    positions.append((segment, position))
+        return times, positions
+
+    def get_time_range(self):
+        """ Retourne le temps du premier et du dernier enregistrement indexé """
+        if not self._index_times:
+            return None, None
+        return self._index_times[0], self._index_times[-1]
+
+    def seek(self, timestamp):
+        """ Retourne la position (segment, position) de l'entrée d'index qui précède le temps donné """
+        index = bisect_right(self._index_times, timestamp) - 1
+        if index < 0:
+            return 0, _SEGMENT_HEADER.size
+        return self._index_positions[index]
+
+    def records(self, start=None):
+        """ Itère sur les enregistrements (temps, canal, datagramme) à partir d'une position (segment, position) """
+        segment_number, position = start if start is not None else (0, _SEGMENT_HEADER.size)
+        for number in range(segment_number, len(self._segments)):
+            segment = self._segments[number]
+            if segment is None:
+                continue
+            end = len(segment)
+            if number != segment_number:
+                position = _SEGMENT_HEADER.size
+            while position + _RECORD_HEADER.size <= end:
+                timestamp, channel, length = _RECORD_HEADER.unpack_from(segment, position)
+                position += _RECORD_HEADER.size
+                if position + length > end:
+                    # Enregistrement tronqué (capture interrompue)
+                    break
+                yield timestamp, channel, segment[position:position + length]
+                position += length
+
+    def close(self):
+        for segment in self._segments:
+            if segment is not None:
+                segment.close()
+        self._segments = []
+
+
+class RawCaptureReplayer(Thread):
+    """
+        RawCaptureReplayer relit un journal de capture et réinjecte chaque datagramme dans le récepteur de son
+        canal (sinks {canal: fonction(data)}), en respectant les écarts de temps divisés par la vitesse
+        (SPEED_MIN à SPEED_MAX). Une vitesse None relit aussi vite que possible, pour les tests de charge.
+    """
+    def __init__(self, directory, sinks, speed=1.0, start_time=None, on_finished=None):
+        super().__init__(name=RawCaptureReplayer.__name__)
+        self.daemon = True
+        self._reader = RawCaptureReader(directory)
+        self._sinks = sinks
+        self._lock = Lock()
+        # Réveille l'attente d'un enregistrement pour stop, seek, pause et set_speed
+        self._event_wake = Event()
+        self._speed = None
+        self._pace_origin = None
+        self.set_speed(speed)
+        self._start_time = start_time
+        self._on_finished = on_finished
+        self._is_running = True
+        self._event_play = Event()
+        self._event_play.set()
+        self._seek_request = None
+        self._current_time = None
+        self._logger = logging.getLogger(RawCaptureReplayer.__name__)
+
+    def set_speed(self, speed):
+        """ Change la vitesse de relecture, None pour relire aussi vite que possible """
+        if speed is not None:
+            speed = min(SPEED_MAX, max(SPEED_MIN, float(speed)))
+        with self._lock:
+            self._speed = speed
+            self._pace_origin = None
+        self._event_wake.set()
+
+    def get_speed(self):
+        return self._speed
+
+    def get_time_range(self):
+        return self._reader.get_time_range()
+
+    def get_current_time(self):
+        return self._current_time
+
+    def seek(self, timestamp):
+        """ Se positionne au temps donné du journal """
+        with self._lock:
+            self._seek_request = timestamp
+        self._event_wake.set()
+
+    def pause(self):
+        self._event_play.clear()
+        self._event_wake.set()
+
+    def play(self):
+        with self._lock:
+            self._pace_origin = None
+        self._event_play.set()
+
+    def stop(self):
+        self._is_running = False
+        self._event_play.set()
+        self._event_wake.set()
+
+    def run(self):
+        start = self._reader.seek(self._start_time) if self._start_time is not None else None
+        while self._is_running:
+            with self._lock:
+                self._pace_origin = None
+            seek_to = self._replay(start)
+            if seek_to is None:
+                break
+            start = self._reader.seek(seek_to)
+            self._start_time = seek_to
+        self._reader.close()
+        if self._on_finished is not None:
+            self._on_finished()
+
+    def _replay(self, start):
+        """ Relit à partir de la position donnée, retourne le temps demandé par un seek ou None à la fin """
+        for timestamp, channel, data in self._reader.records(start):
+            if self._start_time is not None and timestamp < self._start_time:
+                continue
+            while True:
+                if not self._event_play.is_set():
+                    self._event_play.wait()
+                if not self._is_running:
+                    return None
+                with self._lock:
+                    seek_to, self._seek_request = self._seek_request, None
+                if seek_to is not None:
+                    return seek_to
+                if self._wait_until(timestamp):
+                    break
+            self._current_time = timestamp
+            sink = self._sinks.get(channel)
+            if sink is not None:
+                try:
+                    sink(data)
+                except Exception as e:
+                    self._logger.error('REPLAY: ({}) {}'.format(type(e).__name__, e))
+        return None
+
+    def _is_interrupted(self):
+        return not self._is_running or not self._event_play.is_set() or self._seek_request is not None
+
+    def _wait_until(self, timestamp):
+        """ Attend le moment de relecture d'un enregistrement selon la vitesse courante. Retourne False si
+            l'attente est interrompue par stop, seek ou pause; un changement de vitesse recalcule l'attente. """
+        while True:
+            self._event_wake.clear()
+            if self._is_interrupted():
+                return False
+            with self._lock:
+                speed = self._speed
+                if speed is None:
+                    return True
+                now = time()
+                if self._pace_origin is None:
+                    self._pace_origin = now, timestamp
+                wall_origin, capture_origin = self._pace_origin
+            delay = wall_origin + (timestamp - capture_origin) / speed - now
+            if delay <= 0:
+                return True
+            if not self._event_wake.wait(delay):
+                return True
@@ -3,8 +3,9 @@
 import logging
 import pickle
 import socket
-from queue import Queue
+from queue import Queue, Empty
 from threading import Thread, Event
+from time import time
 
 __author__ = 'RoboCupULaval'
 
@@ -27,6 +28,9 @@ class UDPServer(Thread):
         self._is_running = False
 
         self._data_queue = Queue()
+        # Capture et relecture: tap(data, temps de réception) voit chaque paquet reçu du réseau
+        self._tap = None
+        self._accept_network = True
         self._msg_logging = []
         self._logger = logging.getLogger(name)
 
@@ -117,6 +121,10 @@ class UDPServer(Thread):
                 try:
                     self._logger.debug("WAITING FOR: new package")
                     data, addr = self._sock.recvfrom(65565)
+                    if self._tap is not None:
+                        self._tap(data, time())
+                    if not self._accept_network:
+                        continue
                     #if not len(self._data) or not data == self._data[-1]:
                     data = self._num, data
                     self._data_queue.put(data)
@@ -129,6 +137,20 @@ class UDPServer(Thread):
             self._logger.debug('DOWN: {}, {}'.format(self._ip, self._rcv_port))
             self._event_connexion.set()
 
+    def set_tap(self, tap):
+        """ Assigne une fonction tap(data, temps de réception) appelée pour chaque paquet reçu du réseau """
+        self._tap = tap
+
+    def set_accept_network(self, accept):
+        """ Ignore les paquets du réseau (False) pendant une relecture """
+        self._accept_network = accept
+
+    def inject(self, data):
+        """ Ajoute un paquet comme s'il avait été reçu du réseau, sans passer par le tap """
+        self._data_queue.put((self._num, data))
+        self._num += 1
+        self._event_input.set()
+
     def wait_for_new_connexion(self):
         self._logger.debug('WAITING FOR: Shutdown connexion: {}, {}'.format(self._ip, self._rcv_port))
         self._event_connexion.wait()
@@ -144,3 +166,17 @@ class UDPServer(Thread):
         finally:
             self._event_input.clear()
             return raw_data
+
+    def waiting_for_data_batch(self, timeout=None):
+        """ Attend au moins un paquet puis vide la file au complet, une liste vide après le timeout """
+        raw_data = []
+        try:
+            raw_data.append(self._data_queue.get(timeout=timeout))
+            while True:
+                raw_data.append(self._data_queue.get_nowait())
+        except Empty:
+            pass
+        finally:
+            self._event_input.clear()
+        self._logger.debug("GET: data batch {}".format(len(raw_data)))
+        return raw_data
@@ -2,12 +2,18 @@
 
 __author__ = 'RoboCupULaval'
 
+from collections import deque
 from socketserver import ThreadingMixIn, UDPServer, BaseRequestHandler
+from time import time
 import threading
+import select
 import socket
 import struct
 
 
+RECEIVER_MODE_THREADED = 'threaded'
+RECEIVER_MODE_BATCHED = 'batched'
+
 
 def getUDPHandler(receiver):
     class ThreadedUDPRequestHandler(BaseRequestHandler):
@@ -18,6 +24,11 @@ def getUDPHandler(receiver):
     return ThreadedUDPRequestHandler
 
 
+def multicast_membership(host):
+    """ Génère la requête d'adhésion au groupe multicast """
+    return struct.pack("=4sl", socket.inet_aton(host), socket.INADDR_ANY)
+
+
 class ThreadedUDPServer(ThreadingMixIn, UDPServer):
     allow_reuse_address = True
 
@@ -26,38 +37,261 @@ class ThreadedUDPServer(ThreadingMixIn, UDPServer):
         super(ThreadedUDPServer, self).__init__(('', port), handler)
         self.socket.setsockopt(socket.IPPROTO_IP,
                                socket.IP_ADD_MEMBERSHIP,
-                               struct.pack("=4sl",
-                                           socket.inet_aton(host),
-                                           socket.INADDR_ANY))
+                               multicast_membership(host))
         server_thread = threading.Thread(target=self.serve_forever)
         server_thread.daemon = True
         server_thread.start()
 
+    def stop(self):
+        """ Arrête le serveur et libère le socket """
+        self.shutdown()
+        self.server_close()
+
+
+class BatchedUDPServer(threading.Thread):
+    """
+        BatchedUDPServer est un récepteur UDP multicast à fil unique. À chaque réveil, il vide tous les
+        datagrammes en attente dans un bassin de tampons préalloués et les remet au récepteur en un seul lot.
+        Lorsque le bassin est épuisé (le consommateur ne suit plus), les datagrammes sont jetés et comptés.
+    """
+    def __init__(self, host, port, receiver, pool_size=64, buffer_size=65536, select_timeout=0.5):
+        super().__init__()
+        self.daemon = True
+        self._receiver = receiver
+        self._select_timeout = select_timeout
+        self._is_running = True
+
+        # Bassin de tampons préalloués, deque est thread-safe pour append/pop
+        self._buffer_size = buffer_size
+        self._free_buffers = deque(bytearray(buffer_size) for _ in range(pool_size))
+        self._scratch_buffer = bytearray(buffer_size)
+
+        # Statistiques
+        self._stats_lock = threading.Lock()
+        self._window_start = time()
+        self._window_received = 0
+        self._window_dropped = 0
+        self._received_per_sec = 0.0
+        self._dropped_per_sec = 0.0
+        self._received_total = 0
+        self._dropped_total = 0
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('', port))
+        self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, multicast_membership(host))
+        self._sock.setblocking(False)
+        self.start()
+
+    def run(self):
+        while self._is_running:
+            try:
+                readable, _, _ = select.select([self._sock], [], [], self._select_timeout)
+            except (OSError, ValueError):
+                break
+            if readable:
+                self._drain_socket()
+            self._update_rates()
+        self._sock.close()
+
+    def _drain_socket(self):
+        """ Vide tous les datagrammes en attente et remet le lot au récepteur """
+        batch = []
+        dropped = 0
+        while True:
+            try:
+                buffer = self._free_buffers.pop()
+            except IndexError:
+                buffer = None
+            try:
+                if buffer is None:
+                    self._sock.recv_into(self._scratch_buffer)
+                    dropped += 1
+                else:
+                    batch.append((buffer, self._sock.recv_into(buffer)))
+            except (BlockingIOError, InterruptedError):
+                if buffer is not None:
+                    self._free_buffers.append(buffer)
+                break
+            except OSError:
+                if buffer is not None:
+                    self._free_buffers.append(buffer)
+                break
+        if batch:
+            self._receiver.add_frames(batch)
+        with self._stats_lock:
+            self._window_received += len(batch) + dropped
+            self._window_dropped += dropped
+            self._received_total += len(batch) + dropped
+            self._dropped_total += dropped
+
+    def _update_rates(self):
+        """ Calcule les taux de réception et de perte sur une fenêtre d'une seconde """
+        now = time()
+        dt = now - self._window_start
+        if dt >= 1:
+            with self._stats_lock:
+                self._received_per_sec = self._window_received / dt
+                self._dropped_per_sec = self._window_dropped / dt
+                self._window_received = 0
+                self._window_dropped = 0
+                self._window_start = now
+
+    def release_buffer(self, buffer):
+        """ Remet un tampon dans le bassin une fois son contenu consommé """
+        self._free_buffers.append(buffer)
+
+    def get_stats(self):
+        """ Récupère les statistiques de réception """
+        with self._stats_lock:
+            return {'received_per_sec': self._received_per_sec,
+                    'dropped_per_sec': self._dropped_per_sec,
+                    'received_total': self._received_total,
+                    'dropped_total': self._dropped_total}
+
+    def stop(self):
+        """ Arrête la boucle de réception, le socket est fermé par le fil de réception """
+        self._is_running = False
+
 
 class PBPacketReceiver(object):
-    def __init__(self, host, port, packet_type):
+    # Un saut arrière plus grand que ce seuil dans frame_number indique un redémarrage de la source
+    FRAME_NUMBER_RESET_GAP = 1000
+
+    def __init__(self, host, port, packet_type, mode=RECEIVER_MODE_THREADED, frame_key=None, frame_observer=None):
         self.received_frames = []
         self.lock = threading.Lock()
         self.packet_type = packet_type
-        self.server = ThreadedUDPServer(host, port, self)
+        self.mode = mode
+        # frame_key(data) -> (source, numéro) ou None, active la fusion du dernier frame par source
+        self.frame_key = frame_key
+        # frame_observer(data, temps de réception) est appelé dans le fil de réception pour chaque frame
+        self.frame_observer = frame_observer
+        # frame_listener() est appelé dans le fil de réception une fois des frames ajoutés, pour réveiller le lecteur
+        self.frame_listener = None
+        # Capture et relecture: frame_tap(data, temps de réception) voit chaque frame reçu du réseau
+        self.frame_tap = None
+        self.accept_network = True
+        self._coalesce_stats = {'parsed': 0, 'skipped': 0}
+        if mode == RECEIVER_MODE_BATCHED:
+            self.server = BatchedUDPServer(host, port, self)
+        else:
+            self.server = ThreadedUDPServer(host, port, self)
 
     def add_frame(self, frame):
+        if self.frame_tap is not None:
+            self.frame_tap(frame, time())
+        if self.accept_network:
+            self._append_frame(frame)
+
+    def inject_frame(self, frame):
+        """ Ajoute un frame comme s'il avait été reçu du réseau, sans passer par le frame_tap """
+        self._append_frame(frame)
+
+    def _append_frame(self, frame):
+        if self.frame_observer is not None:
+            self.frame_observer(frame, time())
         self.lock.acquire()
         self.received_frames.append(frame)
         self.lock.release()
+        if self.frame_listener is not None:
+            self.frame_listener()
+
+    def add_frames(self, frames):
+        """ Ajoute un lot de (tampon, taille) reçu par le BatchedUDPServer en une seule opération """
+        if self.frame_tap is not None:
+            now = time()
+            for frame in frames:
+                self.frame_tap(self._frame_view(frame), now)
+        if not self.accept_network:
+            for frame in frames:
+                self._discard_frame(frame)
+            return
+        if self.frame_observer is not None:
+            now = time()
+            for frame in frames:
+                self.frame_observer(self._frame_view(frame), now)
+        with self.lock:
+            self.received_frames.extend(frames)
+        if self.frame_listener is not None:
+            self.frame_listener()
 
     def get_latest_frames(self):
         if len(self.received_frames) == 0:
             return []
 
         self.lock.acquire()
-        frames = self.received_frames.copy()
-        self.received_frames.clear()
+        frames = self.received_frames
+        self.received_frames = []
         self.lock.release()
 
+        if self.frame_key is not None:
+            frames = self._coalesce_frames(frames)
+
         packets = []
         for frame in frames:
             packet = self.packet_type()
-            packet.ParseFromString(frame)
+            packet.ParseFromString(self._frame_to_bytes(frame))
             packets.append(packet)
+        self._coalesce_stats['parsed'] += len(packets)
         return packets
+
+    def _coalesce_frames(self, frames):
+        """ Conserve seulement le frame le plus récent par source, sans décoder les autres """
+        newest = dict()
+        for index, frame in enumerate(frames):
+            key = self.frame_key(self._frame_view(frame))
+            source, number = key if key is not None else (None, None)
+            if source in newest:
+                best_number = newest[source][0]
+                if number is not None and best_number is not None and \
+                        number < best_number <= number + self.FRAME_NUMBER_RESET_GAP:
+                    continue
+            newest[source] = number, index
+
+        kept_indexes = sorted(index for _, index in newest.values())
+        kept = [frames[index] for index in kept_indexes]
+        skipped = len(frames) - len(kept)
+        if skipped:
+            kept_set = set(kept_indexes)
+            for index, frame in enumerate(frames):
+                if index not in kept_set:
+                    self._discard_frame(frame)
+            self._coalesce_stats['skipped'] += skipped
+        return kept
+
+    @staticmethod
+    def _frame_view(frame):
+        """ Donne une vue sur le contenu d'un frame sans le copier """
+        if isinstance(frame, tuple):
+            buffer, nbytes = frame
+            return memoryview(buffer)[:nbytes]
+        return frame
+
+    def _frame_to_bytes(self, frame):
+        """ Convertit un frame reçu en bytes et remet son tampon dans le bassin en mode batched """
+        if isinstance(frame, tuple):
+            buffer, nbytes = frame
+            data = memoryview(buffer)[:nbytes].tobytes()
+            self.server.release_buffer(buffer)
+            return data
+        return frame
+
+    def _discard_frame(self, frame):
+        """ Abandonne un frame sans le décoder """
+        if isinstance(frame, tuple):
+            self.server.release_buffer(frame[0])
+
+    def get_coalesce_stats(self):
+        """ Récupère le nombre de frames décodés et ignorés par la fusion """
+        return dict(self._coalesce_stats)
+
+    def get_stats(self):
+        """ Récupère les statistiques de réception (disponibles en mode batched seulement) """
+        if self.mode == RECEIVER_MODE_BATCHED:
+            return self.server.get_stats()
+        return None
+
+    def stop(self):
+        """ Arrête le serveur de réception """
+        self.server.stop()
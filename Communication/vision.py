@@ -1,18 +1,119 @@
 # Under MIT License, see LICENSE.txt
 
+import struct
+
 from Communication import messages_robocup_ssl_wrapper_pb2 as ssl_wrapper
-from Communication.udp_server import PBPacketReceiver
+from Communication.udp_server import PBPacketReceiver, RECEIVER_MODE_THREADED
+from Communication.ChannelStats import ChannelStats
 
 __author__ = 'RoboCupULaval'
 
+# Types de fil (wire type) du format protobuf
+_WIRE_VARINT = 0
+_WIRE_FIXED64 = 1
+_WIRE_LENGTH_DELIMITED = 2
+_WIRE_FIXED32 = 5
+
+_DOUBLE = struct.Struct('<d')
+
+
+def _read_varint(data, pos):
+    """ Lit un varint protobuf à la position donnée, retourne la valeur et la nouvelle position """
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _skip_field(data, pos, wire_type):
+    """ Saute la valeur d'un champ protobuf, retourne la nouvelle position """
+    if wire_type == _WIRE_VARINT:
+        return _read_varint(data, pos)[1]
+    elif wire_type == _WIRE_FIXED64:
+        return pos + 8
+    elif wire_type == _WIRE_LENGTH_DELIMITED:
+        length, pos = _read_varint(data, pos)
+        return pos + length
+    elif wire_type == _WIRE_FIXED32:
+        return pos + 4
+    raise ValueError('wire type {} non supporté'.format(wire_type))
+
+
+def peek_detection_header(data):
+    """ Lit l'entête du SSL_DetectionFrame d'un SSL_WrapperPacket sérialisé sans le décoder au complet.
+        Retourne un dictionnaire (camera_id, frame_number, t_capture, t_sent) ou None s'il n'y a pas de
+        détection. """
+    try:
+        pos, end = 0, len(data)
+        while pos < end:
+            tag, pos = _read_varint(data, pos)
+            if tag >> 3 == 1 and tag & 0x07 == _WIRE_LENGTH_DELIMITED:
+                length, pos = _read_varint(data, pos)
+                return _peek_detection_fields(data, pos, pos + length)
+            pos = _skip_field(data, pos, tag & 0x07)
+    except (IndexError, ValueError, struct.error):
+        pass
+    return None
+
+
+def _peek_detection_fields(data, pos, end):
+    """ Lit les champs scalaires en tête du SSL_DetectionFrame """
+    header = dict()
+    while pos < end and len(header) < 4:
+        tag, pos = _read_varint(data, pos)
+        field, wire_type = tag >> 3, tag & 0x07
+        if field == 1 and wire_type == _WIRE_VARINT:
+            header['frame_number'], pos = _read_varint(data, pos)
+        elif field == 2 and wire_type == _WIRE_FIXED64:
+            header['t_capture'] = _DOUBLE.unpack_from(data, pos)[0]
+            pos += 8
+        elif field == 3 and wire_type == _WIRE_FIXED64:
+            header['t_sent'] = _DOUBLE.unpack_from(data, pos)[0]
+            pos += 8
+        elif field == 4 and wire_type == _WIRE_VARINT:
+            header['camera_id'], pos = _read_varint(data, pos)
+        else:
+            pos = _skip_field(data, pos, wire_type)
+    if 'camera_id' not in header:
+        return None
+    return header
+
+
+def detection_frame_key(data):
+    """ Clé de fusion d'un frame de vision: (camera_id, frame_number) """
+    header = peek_detection_header(data)
+    if header is None:
+        return None
+    return header['camera_id'], header.get('frame_number')
+
 
 class Vision(PBPacketReceiver):
-    def __init__(self, host="224.5.23.2", port=10024):
+    def __init__(self, host="224.5.23.2", port=10024, mode=RECEIVER_MODE_THREADED, coalesce=False):
         self._default_ip = "224.5.23.2"
         self._default_port = 10024
         self._ip = host
         self._port = port
-        super().__init__(host, port, ssl_wrapper.SSL_WrapperPacket)
+        self._coalesce = coalesce
+        self._camera_stats = ChannelStats()
+        super().__init__(host, port, ssl_wrapper.SSL_WrapperPacket, mode=mode,
+                         frame_key=detection_frame_key if coalesce else None,
+                         frame_observer=self._observe_frame)
+
+    def _observe_frame(self, data, received_time):
+        """ Compte le frame dans les statistiques de sa caméra (frame_number et t_sent) """
+        header = peek_detection_header(data)
+        if header is not None:
+            self._camera_stats.record(header['camera_id'], len(data), header.get('frame_number'),
+                                      header.get('t_sent'), received_time)
+
+    def get_camera_stats(self):
+        """ Récupère les statistiques de réception par caméra """
+        return self._camera_stats.get_stats()
 
     def get_ip(self):
         return self._ip
@@ -27,6 +128,12 @@ class Vision(PBPacketReceiver):
         return self._port
 
     def set_new_connexion(self, ip, port):
+        self.stop()
         self._ip = ip
         self._port = port
-        super().__init__(ip, port, ssl_wrapper.SSL_WrapperPacket)
+        self._camera_stats.reset()
+        frame_tap, accept_network, frame_listener = self.frame_tap, self.accept_network, self.frame_listener
+        super().__init__(ip, port, ssl_wrapper.SSL_WrapperPacket, mode=self.mode,
+                         frame_key=detection_frame_key if self._coalesce else None,
+                         frame_observer=self._observe_frame)
+        self.frame_tap, self.accept_network, self.frame_listener = frame_tap, accept_network, frame_listener
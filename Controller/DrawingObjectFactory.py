@@ -1,38 +1,36 @@
 # Under MIT License, see LICENSE.txt
 
-from Controller.DrawingObject.BaseDrawingObject import BaseDrawingObject
-from Controller.MobileObject.BaseMobileObject import BaseMobileObject
+from Util.lazy_registry import LazyRegistry
 
 __author__ = 'RoboCupULaval'
 
+# Catalogue des objets Qt {DataIn associé ou nom: module}, la classe porte le nom de son module.
+# Un nouvel objet dessinable doit être ajouté ici.
+DRAWING_OBJECT_MODULES = {
+    'DrawCircleDataIn': 'Controller.DrawingObject.CircleDrawing',
+    'DrawInfluenceMapDataIn': 'Controller.DrawingObject.InfluenceMapDrawing',
+    'DrawLineDataIn': 'Controller.DrawingObject.LineDrawing',
+    'DrawMultipleLinesDataIn': 'Controller.DrawingObject.MultipleLinesDrawing',
+    'DrawMultiplePointsDataIn': 'Controller.DrawingObject.MultiplePointsDrawing',
+    'DrawPointDataIn': 'Controller.DrawingObject.PointDrawing',
+    'DrawRectDataIn': 'Controller.DrawingObject.RectDrawing',
+    'DrawTextDataIn': 'Controller.DrawingObject.TextDrawing',
+    'DrawTreeDataIn': 'Controller.DrawingObject.TreeDrawing',
+    'field-ground': 'Controller.DrawingObject.FieldGroundDrawing',
+    'field-lines': 'Controller.DrawingObject.FieldLineDrawing',
+    'frame-rate': 'Controller.DrawingObject.FrameRateDrawing',
+    'ball': 'Controller.MobileObject.BallMob',
+    'robot': 'Controller.MobileObject.RobotMob',
+    'target': 'Controller.MobileObject.TargetMob',
+}
+
 
 class DrawingObjectFactory:
     def __init__(self, controller):
         self._controller = controller
         self._name = DrawingObjectFactory.__name__
-        self._catalog_from_datain_class_to_qt_object = dict()
-        self._init_object_catalog()
-
-    def _init_object_catalog(self):
-        """ Initialise le catalogue d'objet pour la factory """
-        self._import_data_in_classes()
-        for subclass in BaseDrawingObject.__subclasses__() + BaseMobileObject.__subclasses__():
-            self._catalog_from_datain_class_to_qt_object[subclass.get_datain_associated()] = subclass
-
-    def _import_data_in_classes(self):
-        """ Importe les objets dans les sous-dossiers de Model.DataObject """
-        from os import listdir
-        from os.path import isfile, join, isdir
-        from importlib.machinery import SourceFileLoader
-
-        path_current_dir = __file__.replace(DrawingObjectFactory.__name__ + '.py', '')
-        folders_inside_current_dir = [f for f in listdir(path_current_dir)
-                                      if isdir(join(path_current_dir, f)) and f.count('_') == 0]
-        for folder in folders_inside_current_dir:
-            files = [f for f in listdir(join(path_current_dir, folder))
-                     if isfile(join(path_current_dir, folder, f)) and f.count('_') == 0]
-            for file in files:
-                SourceFileLoader("", join(path_current_dir, folder, file)).load_module()
+        self._catalog_from_datain_class_to_qt_object = LazyRegistry(
+            DRAWING_OBJECT_MODULES, get_key=lambda qt_class: qt_class.get_datain_associated())
 
     def get_qt_draw_object(self, data_draw):
         """ Génère un DataObject en fonction data_draw paquet reçu """
@@ -1,20 +1,23 @@
 # Under MIT License, see LICENSE.txt
 
+import pickle
 from signal import signal, SIGINT
-from time import sleep
+from time import sleep, time
 
 import PyQt5
 from PyQt5.QtWidgets import QSplitter
 from PyQt5.QtWidgets import QWidget, QMenuBar, QHBoxLayout, QVBoxLayout, \
-                            QAction, QMessageBox, QPushButton
+                            QAction, QActionGroup, QMessageBox, QPushButton, QFileDialog
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import Qt, pyqtSlot
+from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal
 
 from Communication.GrSimReplacementSender import GrSimReplacementSender
 from Model.FrameModel import FrameModel
 from Model.DataInModel import DataInModel
+from Model.IngestPolicy import create_ingest_queue
 from Model.DataOutModel import DataOutModel
 from Model.RecorderModel import RecorderModel
+from Model.SessionFile import SessionWriter, SessionFileError
 
 from View.FieldView import FieldView
 from View.FilterCtrlView import FilterCtrlView
@@ -26,9 +29,11 @@ from View.MediaControllerView import MediaControllerView
 from View.StatusBarView import StatusBarView
 from View.GameStateView import GameStateView
 
-from Communication.UDPServer import UDPServer
+from Communication.AsyncUDPServer import AsyncUDPServer
 from Communication.vision import Vision
+from Communication.udp_server import RECEIVER_MODE_BATCHED
 from Communication.UDPConfig import UDPConfig
+from Communication.RawCapture import RawCaptureWriter, RawCaptureReplayer, CHANNEL_VISION, CHANNEL_STRATEGY
 
 from Controller.DrawingObject.color import Color
 
@@ -40,7 +45,11 @@ __author__ = 'RoboCupULaval'
 
 class MainController(QWidget):
     # TODO: Dissocier Controller de la fenêtre principale
-    def __init__(self, team_color, vision_port, referee_port, ui_cmd_sender_port, ui_cmd_receiver_port):
+    # Émis par le fil de relecture à la fin d'une capture brute, traité dans le fil de l'interface
+    raw_replay_finished = pyqtSignal(object)
+
+    def __init__(self, team_color, vision_port, referee_port, ui_cmd_sender_port, ui_cmd_receiver_port,
+                 sender_trust=None, log_spill_path=None):
         super().__init__()
 
         self.team_color = team_color
@@ -51,18 +60,26 @@ class MainController(QWidget):
 
         # Communication
         # self.network_data_in = UDPServer(self)
-        self.network_data_in = UDPServer(name='UDPServer', debug=False, rcv_port=ui_cmd_sender_port, snd_port=ui_cmd_receiver_port)
-        self.network_vision = Vision(port=self.receiving_port)
+        self.network_data_in = AsyncUDPServer(name='UDPServer', debug=False, rcv_port=ui_cmd_sender_port, snd_port=ui_cmd_receiver_port,
+                                              ingest_queue=create_ingest_queue())
+        self.network_vision = Vision(port=self.receiving_port, mode=RECEIVER_MODE_BATCHED, coalesce=True)
         self.ai_server_is_serial = False
         self.udp_config = UDPConfig(port=self.receiving_port)
         self.grsim_sender = GrSimReplacementSender()
+        self.raw_capture = None
+        self.raw_replayer = None
+        self.raw_replay_speed = 1.0
+        self.raw_replay_finished.connect(self._raw_replay_finished, Qt.QueuedConnection)
 
 
         # Création des Modèles
         self.model_frame = FrameModel(self)
-        self.model_datain = DataInModel(self)
+        self.model_datain = DataInModel(self, log_spill_path=log_spill_path)
         self.model_dataout = DataOutModel(self)
         self.model_recorder = RecorderModel()
+        # Niveau de validation des paquets par nom d'émetteur, {nom: TRUST_FULL, TRUST_SHAPE ou TRUST_NONE}
+        for name, trust in (sender_trust or dict()).items():
+            self.model_datain.set_sender_trust(name, trust)
 
         # Création des Vues
         self.view_menu = QMenuBar(self)
@@ -173,6 +190,27 @@ class MainController(QWidget):
 
         fileMenu.addSeparator()
 
+        captureMenu = fileMenu.addMenu('Capture brute')
+
+        self.rawCaptureAction = QAction('Capturer les paquets reçus...', self, checkable=True)
+        self.rawCaptureAction.triggered.connect(self.toggle_raw_capture)
+        captureMenu.addAction(self.rawCaptureAction)
+
+        self.rawReplayAction = QAction('Rejouer une capture...', self, checkable=True)
+        self.rawReplayAction.triggered.connect(self.toggle_raw_replay)
+        captureMenu.addAction(self.rawReplayAction)
+
+        speedMenu = captureMenu.addMenu('Vitesse de relecture')
+        speedGroup = QActionGroup(self)
+        for speed in [0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, None]:
+            speedAction = QAction('x{}'.format(speed) if speed is not None else 'Aussi vite que possible', self,
+                                  checkable=True, checked=speed == self.raw_replay_speed)
+            speedAction.triggered.connect(lambda checked, speed=speed: self.set_raw_replay_speed(speed))
+            speedGroup.addAction(speedAction)
+            speedMenu.addAction(speedAction)
+
+        fileMenu.addSeparator()
+
         exitAction = QAction('Quitter', self)
         exitAction.triggered.connect(self.closeEvent)
         fileMenu.addAction(exitAction)
@@ -298,6 +336,7 @@ class MainController(QWidget):
 
     @pyqtSlot(name='on_triggered')
     def closeEvent(self, event):
+        self.stop_raw_capture()
         self.close()
 
     def signal_handle(self, *args):
@@ -317,13 +356,32 @@ class MainController(QWidget):
         except:
             pass
 
-    def set_ball_pos_on_screen(self, x, y):
-        """ Modifie la position de la balle sur le terrain """
-        self.view_field_screen.set_ball_pos(x, y)
+    def add_draws_on_screen(self, draws):
+        """ Ajoute un lot de dessins sur la fenêtre du terrain en un seul appel à la vue """
+        qt_draws = []
+        for draw in draws:
+            try:
+                qt_draw = self.draw_handler.get_qt_draw_object(draw)
+            except:
+                continue
+            if qt_draw is not None:
+                qt_draws.append(qt_draw)
+        if qt_draws:
+            self.view_field_screen.load_draws(qt_draws)
+
+    def replace_draws_on_screen(self, packages):
+        """ Remplace tous les dessins du terrain par les dessins enregistrés (paquets) de l'enregistreur """
+        self.view_field_screen.delete_all_draw()
+        self.add_draws_on_screen(self.model_datain.build_data_objects(packages))
 
-    def set_robot_pos_on_screen(self, bot_id, team_color, pst, theta):
-        """ Modifie la position et l'orientation d'un robot sur le terrain """
-        self.view_field_screen.set_bot_pos(bot_id, team_color, pst[0], pst[1], theta)
+    def set_ball_pos_on_screen(self, x, y, t_capture=None):
+        """ Modifie la position de la balle sur le terrain, t_capture est le temps de capture de la vision """
+        self.view_field_screen.set_ball_pos(x, y, t_capture)
+
+    def set_robot_pos_on_screen(self, bot_id, team_color, pst, theta, t_capture=None):
+        """ Modifie la position et l'orientation d'un robot sur le terrain, t_capture est le temps de capture de
+            la vision """
+        self.view_field_screen.set_bot_pos(bot_id, team_color, pst[0], pst[1], theta, t_capture)
 
     def set_field_size(self, frame_geometry_field):
         """ Modifie la dimension du terrain provenant des frames de vision"""
@@ -404,6 +462,8 @@ class MainController(QWidget):
 
     def toggle_recorder(self, p_bool):
         """ Active/Désactive le Recorder """
+        # Les dessins du direct et ceux de l'enregistreur ne sont pas mélangés
+        self.view_field_screen.delete_all_draw()
         if p_bool:
             self.model_frame.enable_recorder()
             self.model_datain.enable_recorder()
@@ -415,6 +475,98 @@ class MainController(QWidget):
         """ Récupère la fréquence de rafraîchissement de l'écran """
         return self.view_field_screen.get_fps()
 
+    def toggle_raw_capture(self, p_bool):
+        """ Démarre/Arrête la capture brute après avoir demandé le dossier de destination """
+        if p_bool:
+            directory = QFileDialog.getExistingDirectory(self, 'Dossier de capture')
+            if directory:
+                self.start_raw_capture(directory)
+            else:
+                self.rawCaptureAction.setChecked(False)
+        else:
+            self.stop_raw_capture()
+
+    def start_raw_capture(self, directory):
+        """ Capture tous les datagrammes reçus de la vision et de StrategyIA dans le dossier """
+        self.stop_raw_capture()
+        self.raw_capture = RawCaptureWriter(directory)
+        self.network_vision.frame_tap = self.raw_capture.tap(CHANNEL_VISION)
+        self.network_data_in.set_tap(self.raw_capture.tap(CHANNEL_STRATEGY))
+
+    def stop_raw_capture(self):
+        if self.raw_capture is not None:
+            self.network_vision.frame_tap = None
+            self.network_data_in.set_tap(None)
+            self.raw_capture.stop()
+            self.raw_capture = None
+
+    def toggle_raw_replay(self, p_bool):
+        """ Démarre/Arrête la relecture d'une capture brute après avoir demandé son dossier """
+        if p_bool:
+            directory = QFileDialog.getExistingDirectory(self, 'Capture à rejouer')
+            if directory:
+                self.start_raw_replay(directory)
+            else:
+                self.rawReplayAction.setChecked(False)
+        else:
+            self.stop_raw_replay()
+
+    def start_raw_replay(self, directory, speed=None):
+        """ Rejoue une capture brute à la place des paquets du réseau """
+        self.stop_raw_replay()
+        if speed is not None:
+            self.raw_replay_speed = speed
+        self.network_vision.accept_network = False
+        self.network_data_in.set_accept_network(False)
+        self.model_frame.reset_vision()
+        replayer = RawCaptureReplayer(directory,
+                                      {CHANNEL_VISION: self.network_vision.inject_frame,
+                                       CHANNEL_STRATEGY: self.network_data_in.inject},
+                                      speed=self.raw_replay_speed,
+                                      on_finished=lambda: self.raw_replay_finished.emit(replayer))
+        self.raw_replayer = replayer
+        replayer.start()
+
+    def stop_raw_replay(self):
+        replayer = self.raw_replayer
+        if replayer is not None:
+            replayer.stop()
+            replayer.join()
+            self._end_raw_replay()
+
+    def seek_raw_replay(self, timestamp):
+        """ Saute au temps donné de la capture en relecture """
+        if self.raw_replayer is not None:
+            self.model_frame.reset_vision()
+            self.raw_replayer.seek(timestamp)
+
+    def _raw_replay_finished(self, replayer):
+        """ Fin d'une capture rejouée, ignorée si la relecture a déjà été arrêtée ou remplacée """
+        if replayer is self.raw_replayer:
+            self._end_raw_replay()
+            self.rawReplayAction.setChecked(False)
+
+    def _end_raw_replay(self):
+        """ Retourne aux paquets du réseau à la fin de la relecture """
+        self.raw_replayer = None
+        self.network_vision.accept_network = True
+        self.network_data_in.set_accept_network(True)
+
+    def set_raw_replay_speed(self, speed):
+        """ Vitesse de relecture de 0.25 à 16, None pour relire aussi vite que possible """
+        self.raw_replay_speed = speed
+        if self.raw_replayer is not None:
+            self.raw_replayer.set_speed(speed)
+
+    def get_network_stats(self):
+        """ Récupère les statistiques réseau: StrategyIA par (émetteur, type), par émetteur et par voie de la file
+            de réception, vision par caméra et le récepteur de vision (paquets reçus/jetés) """
+        return {'strategy': self.model_datain.get_packet_stats(),
+                'strategy_by_sender': self.model_datain.get_packet_stats_by_sender(),
+                'strategy_ingest': self.network_data_in.get_ingest_stats(),
+                'vision': self.network_vision.get_camera_stats(),
+                'vision_receiver': self.network_vision.get_stats()}
+
     def get_is_serial(self):
         """ Récupère si le serveur de strategyIA est en mode serial (True) ou udp (False)"""
         return self.ai_server_is_serial
@@ -423,9 +575,9 @@ class MainController(QWidget):
         """ Détermine si le serveur de strategyIA est en mode serial (True) ou udp (False)"""
         self.ai_server_is_serial = is_serial
 
-    def send_handshake(self):
-        """ Envoie un HandShake au client """
-        self.model_dataout.send_handshake()
+    def send_handshake(self, wire_format=None):
+        """ Envoie un HandShake au client avec le format de paquet retenu """
+        self.model_dataout.send_handshake(wire_format)
 
     def send_ports_rs(self):
         ports_info = dict(zip(['recv_port',
@@ -492,6 +644,57 @@ class MainController(QWidget):
     def recorder_skip_to(self, value):
         self.model_recorder.skip_to(value)
 
+    def recorder_set_rate(self, rate):
+        self.model_recorder.set_rate(rate)
+
+    def recorder_get_rate(self):
+        return self.model_recorder.get_rate()
+
+    def recorder_set_retention(self, **kwargs):
+        self.model_frame.set_recorder_retention(**kwargs)
+
+    def recorder_get_retention(self):
+        return self.model_frame.get_recorder_retention()
+
+    def recorder_get_footprint(self):
+        return self.model_frame.get_recorder_footprint()
+
+    def recorder_save_session(self, path):
+        """ Sauvegarde l'enregistrement en mémoire (vision, états, PlayInfo, graphiques, dessins) dans un fichier de
+            session, retourne False si l'écriture a échoué (le fichier partiel est supprimé) """
+        try:
+            writer = SessionWriter(path)
+        except OSError as e:
+            self._session_save_failed(e)
+            return False
+        try:
+            writer.write_vision(self.model_frame.get_recorder_chunk_columns())
+            for section, records in self.model_datain.get_session_states().items():
+                writer.write_timeline(section, records)
+            for section, records in self.model_datain.get_session_records().items():
+                writer.write_records(section, records)
+            writer.write_draws(self.model_datain.get_draw_records())
+            writer.close({'created': time(), 'team_color': self.model_datain.get_team_color()})
+        except (OSError, pickle.PicklingError, TypeError, ValueError) as e:
+            writer.abort()
+            self._session_save_failed(e)
+            return False
+        return True
+
+    def _session_save_failed(self, error):
+        self.add_logging_message('Recorder', 'Sauvegarde de la session impossible: {}'.format(error), level=3)
+        QMessageBox.warning(self, 'Session', 'Impossible de sauvegarder la session:\n{}'.format(error))
+
+    def recorder_open_session(self, path):
+        """ Ouvre un fichier de session dans l'enregistreur, retourne False s'il est invalide """
+        try:
+            self.model_recorder.open_session(path)
+        except (OSError, SessionFileError) as e:
+            self.add_logging_message('Recorder', 'Session invalide: {}'.format(e), level=3)
+            QMessageBox.warning(self, 'Session', 'Impossible d\'ouvrir la session:\n{}'.format(e))
+            return False
+        return True
+
     def save_teams_formation(self):
         self.teams_formation = self.view_field_screen.get_teams_formation()
 
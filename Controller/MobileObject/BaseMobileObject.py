@@ -9,28 +9,56 @@ __author__ = 'jbecirovski'
 
 
 class BaseMobileObject(AbstractDrawingObject):
+    # Nombre de positions conservées pour estimer la vitesse par moindres carrés
+    SPEED_SAMPLES = 6
+    # Écart (secondes) entre deux captures au-delà duquel l'historique de positions est oublié
+    SPEED_MAX_GAP = 0.5
+
     def __init__(self, x=-9999, y=-9999, theta=0):
         AbstractDrawingObject.__init__(self)
         self._x = x
         self._y = y
-        self._last_vector_time = time()
-        self._last_x = None
-        self._last_y = None
+        # Historique circulaire (temps de capture, x, y) des dernières positions
+        self._samples = [None] * self.SPEED_SAMPLES
+        self._sample_index = 0
+        self._sample_count = 0
         self._speed_vector = (0, 0)
         self._theta = theta
 
-    def setPos(self, x, y):
-        self._last_x, self._last_y = self._x, self._y
+    def setPos(self, x, y, t_capture=None):
+        """ Modifie la position, t_capture est le temps de capture de la vision (le temps courant par défaut) """
         self._x, self._y = x, y
+        self._add_sample(time() if t_capture is None else t_capture, x, y)
         self._calculate_speed_vector()
 
+    def _add_sample(self, t_capture, x, y):
+        if self._sample_count:
+            last_index = (self._sample_index - 1) % self.SPEED_SAMPLES
+            last_time = self._samples[last_index][0]
+            if t_capture == last_time:
+                # Même capture, seule la position est corrigée
+                self._samples[last_index] = t_capture, x, y
+                return
+            if t_capture < last_time or t_capture - last_time > self.SPEED_MAX_GAP:
+                # Retour en arrière (lecture de l'enregistreur) ou objet perdu de vue: l'historique est oublié
+                self._sample_count = 0
+        self._samples[self._sample_index] = t_capture, x, y
+        self._sample_index = (self._sample_index + 1) % self.SPEED_SAMPLES
+        self._sample_count = min(self.SPEED_SAMPLES, self._sample_count + 1)
+
     def _calculate_speed_vector(self):
-        if self._last_x is not None and self._last_y is not None:
-            cur_time = time()
-            delta_t = cur_time - self._last_vector_time
-            self._last_vector_time = cur_time
-            self._speed_vector = (self._x - self._last_x) / (delta_t * 1000),\
-                                 (self._y - self._last_y) / (delta_t * 1000)
+        """ Pente des moindres carrés des positions de l'historique en fonction du temps de capture (m/s) """
+        if self._sample_count < 2:
+            self._speed_vector = (0, 0)
+            return
+        samples = [self._samples[(self._sample_index - i - 1) % self.SPEED_SAMPLES]
+                   for i in range(self._sample_count)]
+        t_mean = sum(sample[0] for sample in samples) / self._sample_count
+        x_mean = sum(sample[1] for sample in samples) / self._sample_count
+        y_mean = sum(sample[2] for sample in samples) / self._sample_count
+        t_var = sum((sample[0] - t_mean) ** 2 for sample in samples)
+        self._speed_vector = sum((t - t_mean) * (x - x_mean) for t, x, _ in samples) / (t_var * 1000),\
+                             sum((t - t_mean) * (y - y_mean) for t, _, y in samples) / (t_var * 1000)
 
     def setRotation(self, theta):
         self._theta = theta
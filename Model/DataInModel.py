@@ -1,7 +1,7 @@
 # Under MIT License, see LICENSE.txt
 
-import pickle
 import logging
+from collections import OrderedDict, deque
 from time import time, sleep
 
 from threading import Thread, Event
@@ -15,10 +15,18 @@ from Model.DataObject.AccessorData.FieldGeometryAcc import FieldGeometryAcc
 from Model.DataObject.AccessorData.RobotStrategicStateAcc import RobotStrategicStateAcc
 from Model.DataObject.AccessorData.GameStateAcc import GameStateAcc
 from Model.DataObject.AccessorData.VeryLargeDataAcc import VeryLargeDataAcc
-from Model.DataObject.DataFactory import DataFactory
+from Model.DataObject.BaseDataObject import FormatPackageError
+from Model.DataObject.DataFactory import DataFactory, DATA_OBJECT_MODULES
 from Model.DataObject.DrawingData.BaseDataDraw import BaseDataDraw
+from Model.DataObject.DrawingData.DrawBundleDataIn import DrawBundleDataIn
 from Model.DataObject.LoggingData.BaseDataLog import BaseDataLog
 from Model.DataObject.AccessorData.HandShakeAcc import HandShakeAcc
+from Model.DataObject.WireFormat import WIRE_FORMATS_SUPPORTED
+from Model.DecodePipeline import DecodePipeline
+from Model.DrawRecorder import DrawRecorder
+from Model.LogStore import LogStore
+from Model.SessionFile import SECTION_GAME_STATE, SECTION_ROBOT_STATE, SECTION_PLAY_INFO, SECTION_PLOT
+from Communication.ChannelStats import ChannelStats
 
 
 from .TimeListState.TimeListState import TimeListState
@@ -27,7 +35,21 @@ __author__ = 'RoboCupULaval'
 
 
 class DataInModel(Thread):
-    def __init__(self, controller=None, debug=False):
+    # Rétention en secondes des historiques: un match complet pour GameState/PlayInfo
+    _MATCH_STATE_RETENTION = 2 * 60 * 60
+    _STRATEGIC_STATE_RETENTION = 30 * 60
+    # Nombre de points de graphique conservés pour les sessions de l'enregistreur
+    _PLOT_HISTORY_SIZE = 100000
+    # Messages de logging gardés en mémoire, les plus anciens sont ajoutés à un fichier avec rotation
+    _LOG_CAPACITY = 20000
+    # Plages de types de paquets distribués par un traitement générique
+    _LOG_TYPES = range(0, 1000)
+    _DRAW_TYPES = range(3000, 3900)
+    # Attente maximale (s) de la réception lorsque des paquets volumineux sont en décodage, pour un serveur UDP
+    # qui ne peut pas être réveillé
+    _BULK_POLL_PERIOD = 0.05
+
+    def __init__(self, controller=None, debug=False, log_spill_path=None):
         super().__init__()
         self._logger = logging.getLogger(DataInModel.__name__)
         if debug:
@@ -41,27 +63,41 @@ class DataInModel(Thread):
         self._team_color = 'blue' #TODO Faire fonctionner l'update auto de l'IA
 
         # Stockage de données
-        self._data_logging = list()
+        # Les plus vieux messages du logging ne sont écrits sur disque que si un fichier est demandé
+        self._log_store = LogStore(capacity=self._LOG_CAPACITY, spill_path=log_spill_path)
         self._robot_state = None
         self._robot_strategic_state = TimeListState('RobotState', dict(zip(['yellow', 'blue'],
                                                                            [dict(zip(list(range(16)),
                                                                            [dict(zip(['tactic', 'action', 'target'],
                                                                                     ['None', 'None', 'None'])) for _ in range(12)]
-                                                                           )) for _ in range(2)])))
+                                                                           )) for _ in range(2)])),
+                                                    max_duration=self._STRATEGIC_STATE_RETENTION)
 
-        self._game_state = TimeListState('GameState', {'yellow': 'None', 'blue': 'None'})
+        self._game_state = TimeListState('GameState', {'yellow': 'None', 'blue': 'None'},
+                                         max_duration=self._MATCH_STATE_RETENTION)
         self._data_config = list()
         self._data_draw = dict()
-        self._distrib_specific_packet = dict()
+        # Traitement spécifique par type de paquet {type: fonction}
+        self._distrib_by_type = dict()
         self._data_STA_config = None
         self._play_info = TimeListState('PlayInfo', {'referee_info': 'None',
                                                      'referee_team_info': 'None',
-                                                     'auto_play_info': 'None'})
+                                                     'auto_play_info': 'None'},
+                                        max_duration=self._MATCH_STATE_RETENTION)
 
         self._plot_data = []
+        self._plot_history = deque(maxlen=self._PLOT_HISTORY_SIZE)
+        self._draw_recorder = DrawRecorder(max_duration=self._STRATEGIC_STATE_RETENTION)
 
         # Système interne
         self._datain_factory = DataFactory()
+        self._sender_names = dict()
+        self._decode_pipeline = DecodePipeline(self._datain_factory, self._sender_names, on_ready=self._wake_receiver)
+        # Numéro d'arrivée du dernier dessin unique affiché par (émetteur, type, filtre)
+        self._latest_unique_draw = dict()
+        # Statistiques par (émetteur, type), et par émetteur pour les numéros de séquence
+        self._packet_stats = ChannelStats()
+        self._sender_stats = ChannelStats()
         self._start_time = time()
         self.daemon = True
 
@@ -96,18 +132,22 @@ class DataInModel(Thread):
 
     def _init_distributor(self):
         """ Initialise la distribution des paquets en fonction du type de paquet """
-        self._distrib_specific_packet[VeryLargeDataAcc.__name__] = self._distrib_VeryLargeData
-        self._distrib_specific_packet[BaseDataDraw.__name__] = self._distrib_BaseDataDraw
-        self._distrib_specific_packet[StratGeneralAcc.__name__] = self._distrib_StratGeneral
-        self._distrib_specific_packet[BaseDataLog.__name__] = self._distrib_BaseDataLog
-        self._distrib_specific_packet[HandShakeAcc.__name__] = self._distrib_HandShake
-        self._distrib_specific_packet[RobotStrategicStateAcc.__name__] = self._distrib_RobotStrategicState
-        self._distrib_specific_packet[GameStateAcc.__name__] = self._distrib_GameState
-        self._distrib_specific_packet[FieldGeometryAcc.__name__] = self._distrib_FieldGeometry
-        self._distrib_specific_packet[TeamColorAcc.__name__] = self._distrib_TeamColor
-        self._distrib_specific_packet[RobotStateAcc.__name__] = self._distrib_RobotState
-        self._distrib_specific_packet[PlayInfoAcc.__name__] = self._distrib_PlayInfo
-        self._distrib_specific_packet[PlotDataAcc.__name__] = self._distrib_PlotData
+        for p_type in DATA_OBJECT_MODULES:
+            if p_type in self._LOG_TYPES:
+                self._distrib_by_type[p_type] = self._distrib_BaseDataLog
+            elif p_type in self._DRAW_TYPES:
+                self._distrib_by_type[p_type] = self._distrib_BaseDataDraw
+        self._distrib_by_type[DrawBundleDataIn.get_type()] = self._distrib_DrawBundle
+        self._distrib_by_type[VeryLargeDataAcc.get_type()] = self._distrib_VeryLargeData
+        self._distrib_by_type[StratGeneralAcc.get_type()] = self._distrib_StratGeneral
+        self._distrib_by_type[HandShakeAcc.get_type()] = self._distrib_HandShake
+        self._distrib_by_type[RobotStrategicStateAcc.get_type()] = self._distrib_RobotStrategicState
+        self._distrib_by_type[GameStateAcc.get_type()] = self._distrib_GameState
+        self._distrib_by_type[FieldGeometryAcc.get_type()] = self._distrib_FieldGeometry
+        self._distrib_by_type[TeamColorAcc.get_type()] = self._distrib_TeamColor
+        self._distrib_by_type[RobotStateAcc.get_type()] = self._distrib_RobotState
+        self._distrib_by_type[PlayInfoAcc.get_type()] = self._distrib_PlayInfo
+        self._distrib_by_type[PlotDataAcc.get_type()] = self._distrib_PlotData
 
         self._logger.debug('INIT: Distributor')
 
@@ -130,6 +170,7 @@ class DataInModel(Thread):
     def start(self):
         """ Exécute la boucle principale du Thread """
         self._logger.debug('START: Thread')
+        self._decode_pipeline.prewarm()
         super().start()
 
     def run(self):
@@ -137,17 +178,15 @@ class DataInModel(Thread):
         self._logger.debug('Thread RUNNING')
         while True:
             self.waiting_for_pause_event()
+            timeout = self._BULK_POLL_PERIOD if self._decode_pipeline.has_pending() else None
+            packages = self._udp_receiver.waiting_for_data_batch(timeout)
             try:
-                self._logger.debug('RUN: get Last data from udp server')
-                package = self._udp_receiver.waiting_for_last_data()
-                self._extract_and_distribute_data(package)
-            except AttributeError as e:
-
-                self._logger.warn(type(e).__name__ + str(e))
-            except TypeError:
-                pass
+                self._decode_and_distribute_batch(packages)
+            except Exception as e:
+                self._logger.warn('DISTRIB: batch dropped ({}) {}'.format(type(e).__name__, e))
             finally:
-                self._last_packet = package[0] if package is not None else None
+                if packages:
+                    self._last_packet = max(num for num, _ in packages)
 
         self._logger.debug('Thread RUN STOPPING')
 
@@ -168,8 +207,14 @@ class DataInModel(Thread):
     def _distrib_VeryLargeData(self, data):
         """ Traite le paquet spécifique VeryLargeData """
         self._logger.debug('DISTRIB: VeryLargeData')
-        data.store()
-        self._extract_and_distribute_data(data.rebuild())
+        if data.store():
+            try:
+                rebuilt = data.rebuild()
+            except FormatPackageError as e:
+                self._logger.warn('DISTRIB: VeryLargeData dropped, {}'.format(e))
+                return
+            if rebuilt is not None:
+                self._decode_pipeline.submit_bulk(rebuilt)
 
     def _distrib_BaseDataDraw(self, data):
         """ Traite le paquet de type générique DataDraw """
@@ -177,6 +222,13 @@ class DataInModel(Thread):
         #self._data_draw['notset'].append(data)
         self.show_draw(data)
 
+    def _distrib_DrawBundle(self, data):
+        """ Traite le paquet spécifique DrawBundle """
+        self._logger.debug('DISTRIB: DrawBundle')
+        draws = self._unpack_bundle(data)
+        if draws:
+            self.show_draws(draws)
+
     def _distrib_StratGeneral(self, data):
         """ Traite le paquet spécifique StratGeneral """
         self._logger.debug('DISTRIB: StratGeneral')
@@ -194,12 +246,17 @@ class DataInModel(Thread):
     def _distrib_HandShake(self, data):
         """ Traite le paquet spécifique HandShake """
         self._logger.debug('DISTRIB: HandShake')
-        self._controller.send_handshake()
+        if 'sender_id' in data.data:
+            self._sender_names[data.data['sender_id']] = data.name
+        wire_format = next(wire_format for wire_format in WIRE_FORMATS_SUPPORTED
+                           if wire_format in data.data['wire_formats'] or wire_format == 'pickle')
+        self._logger.debug('DISTRIB: HandShake wire format {}'.format(wire_format))
+        self._controller.send_handshake(wire_format)
 
     def _distrib_RobotStrategicState(self, data):
         """ Traite le paquet spécifique RobotState """
         self._logger.debug('DISTRIB: RobotStrategicState')
-        self._robot_strategic_state.append(data.data.copy())
+        self._robot_strategic_state.append(data.data)
         self._event_robot_strategic_state.set()
 
     def _distrib_TeamColor(self, data):
@@ -208,7 +265,7 @@ class DataInModel(Thread):
 
     def _distrib_PlayInfo(self, data):
         self._logger.debug('DISTRIB: AutoState')
-        self._play_info.append(data.data.copy())
+        self._play_info.append(data.data)
         self._event_play_info.set()
 
     def _distrib_RobotState(self, data):
@@ -219,36 +276,134 @@ class DataInModel(Thread):
     def _distrib_PlotData(self, data):
         self._logger.debug('DISTRIB: RobotState')
         self._plot_data.append(data.data.copy())
+        self._plot_history.append((time(), data.data))
 
 
     # === PRIVATE METHODS ===
 
-    def _extract_and_distribute_data(self, package):
-        self._logger.debug('INTERNAL: Extract and distribute')
-        if package is not None:
+    def _wake_receiver(self):
+        """ Réveille la boucle principale lorsqu'un paquet volumineux est décodé """
+        wake = getattr(self._udp_receiver, 'wake', None)
+        if wake is not None:
+            wake()
+
+    def _decode_and_distribute_batch(self, packages):
+        """ Soumet un lot de paquets bruts au décodage, attend les paquets de contrôle et distribue, dans l'ordre
+            d'arrivée de chaque voie, tous les paquets décodés """
+        self._logger.debug('INTERNAL: Decode and distribute batch of {}'.format(len(packages)))
+        for package in packages:
             if isinstance(package, (tuple, list)):
                 package = package[1]
-            data_in = pickle.loads(package)
-            if data_in is not None:
-                data = self._datain_factory.get_data_object(data_in)
+            if package is not None:
+                self._decode_pipeline.submit(package)
+        self._decode_pipeline.wait_control()
+        self._distribute_batch(self._decode_pipeline.pop_ready())
+
+    def _distribute_batch(self, decoded):
+        """ Distribue un lot de paquets décodés [(DataObject, taille, exception, numéro d'arrivée)]. Les dessins
+            sont regroupés par type et filtre pour n'appeler le contrôleur qu'une fois par lot. Un dessin unique
+            par filtre plus ancien que celui déjà affiché (paquet volumineux décodé après un plus récent) est
+            jeté. """
+        draws_by_group = OrderedDict()
+        bundle_type = DrawBundleDataIn.get_type()
+        for data, nbytes, error, order in decoded:
+            if error is not None:
+                self._logger.warn('({}) {}'.format(type(error).__name__, error))
+                continue
+            if data is None:
+                continue
+            self._packet_stats.record((data.name, data.type), nbytes, sent_time=data.sent_time)
+            self._sender_stats.record(data.name, nbytes, data.seq, data.sent_time)
+            if data.type == bundle_type:
                 try:
-                    if isinstance(data, BaseDataDraw):
-                        self._distrib_specific_packet[BaseDataDraw.__name__](data)
-                    elif isinstance(data, BaseDataLog):
-                        self._distrib_specific_packet[BaseDataLog.__name__](data)
+                    draws = self._unpack_bundle(data) or []
+                except Exception as e:
+                    self._log_distrib_error(data, e)
+                    continue
+            elif data.type in self._DRAW_TYPES:
+                draws = [data]
+            else:
+                draws = None
+            if draws is not None:
+                for draw in draws:
+                    key = draw.type, draw.filter
+                    if draw.is_unique_per_filter:
+                        if not self._is_latest_unique_draw(draw, order):
+                            self._logger.debug('DISTRIB: stale draw {} dropped'.format(key))
+                            continue
+                        draws_by_group[key] = [draw]
                     else:
-                        self._distrib_specific_packet[type(data).__name__](data)
-                except KeyError as e:
-                    self._logger.warn(type(e).__name__, e)
+                        draws_by_group.setdefault(key, []).append(draw)
+            else:
+                self._distribute_data(data)
+
+        if draws_by_group:
+            self.show_draws([draw for draws in draws_by_group.values() for draw in draws])
+
+    def _unpack_bundle(self, bundle):
+        """ Valide tous les dessins d'un regroupement, le regroupement est rejeté au complet si un seul est
+            invalide """
+        draws = []
+        for package in bundle.get_sub_packages():
+            draw = self._datain_factory.get_data_object(package)
+            if not isinstance(draw, BaseDataDraw) or isinstance(draw, DrawBundleDataIn):
+                self._logger.warn('INTERNAL: DrawBundle rejected, invalid draw type {}'.format(package['type']))
+                if isinstance(draw, BaseDataLog):
+                    self._store_data_logging(draw)
+                return None
+            draws.append(draw)
+        return draws
+
+    def _distribute_data(self, data):
+        """ Distribue un DataObject au traitement spécifique à son type """
+        try:
+            distrib = self._distrib_by_type[data.type]
+        except KeyError as e:
+            self._logger.warn('DISTRIB: no handler for packet type {}'.format(e))
+            return
+        try:
+            distrib(data)
+        except Exception as e:
+            self._log_distrib_error(data, e)
+
+    def _log_distrib_error(self, data, error):
+        """ Signale un paquet jeté parce que son traitement a échoué """
+        self._logger.warn('DISTRIB: packet type {} from {} dropped ({}) {}'.format(data.type, data.name,
+                                                                              type(error).__name__, error))
+
+    def _is_latest_unique_draw(self, draw, order):
+        """ Retient le numéro d'arrivée du dessin unique s'il est plus récent que celui affiché pour son émetteur
+            et son filtre """
+        key = draw.name, draw.type, draw.filter
+        if order < self._latest_unique_draw.get(key, -1):
+            return False
+        self._latest_unique_draw[key] = order
+        return True
 
     def _store_data_logging(self, data):
         """ Stock les données de logging """
         self._logger.debug('INTERNAL: Store logging')
-        self._data_logging.append(data)
+        self._log_store.append(data.time.timestamp(), data.get_level(), data.name, str(data))
         self._controller.update_logging()
 
     # === PUBLIC METHODS ===
 
+    def get_packet_stats(self):
+        """ Récupère les statistiques des paquets reçus par (émetteur, type) """
+        return self._packet_stats.get_stats()
+
+    def get_packet_stats_by_sender(self):
+        """ Récupère les statistiques des paquets reçus par émetteur, avec les trous de séquence """
+        return self._sender_stats.get_stats()
+
+    def set_sender_trust(self, name, trust):
+        """ Assigne le niveau de validation des paquets d'un émetteur (TRUST_FULL, TRUST_SHAPE ou TRUST_NONE) """
+        self._datain_factory.set_sender_trust(name, trust)
+        self._logger.debug('SET: sender {} trust {}'.format(name, trust))
+
+    def get_sender_trust(self):
+        return self._datain_factory.get_sender_trust()
+
     def set_recorder(self, recorder):
         self._recorder = recorder
 
@@ -258,6 +413,27 @@ class DataInModel(Thread):
     def get_robot_state_copy(self):
         return self._robot_strategic_state.copy()
 
+    def get_play_info_copy(self):
+        return self._play_info.copy()
+
+    def get_session_states(self):
+        """ Récupère les historiques d'états à sauvegarder dans une session {section: [(temps, état)]} """
+        return {SECTION_GAME_STATE: self._game_state.get_history(),
+                SECTION_ROBOT_STATE: self._robot_strategic_state.get_history(),
+                SECTION_PLAY_INFO: self._play_info.get_history()}
+
+    def get_session_records(self):
+        """ Récupère les événements à sauvegarder dans une session {section: [(temps, valeur)]} """
+        return {SECTION_PLOT: list(self._plot_history)}
+
+    def get_draw_records(self):
+        """ Récupère les dessins enregistrés [[début, fin, paquet]] à sauvegarder dans une session """
+        return self._draw_recorder.get_records()
+
+    def build_data_objects(self, packages):
+        """ Convertit des paquets déjà validés (dessins enregistrés) en DataObject """
+        return [self._datain_factory.get_data_object(package) for package in packages]
+
     def get_team_color(self):
         return self._team_color
 
@@ -318,25 +494,37 @@ class DataInModel(Thread):
                    }
         self._store_data_logging(self._datain_factory.get_data_object(data_in))
 
-    def get_last_log(self, index=0):
-        """ Récupère les derniers logging"""
-        if len(self._data_logging):
-            self._logger.debug('TRIGGER: GET LOG')
-            return self._data_logging[index:]
-        else:
-            self._logger.warn('TRIGGER: GET LOG - No new log')
-            return None
+    def get_logs_since(self, cursor, levels=None):
+        """ Récupère les logging reçus depuis le curseur, filtrés par niveaux si donnés.
+            Retourne ([LogRecord, ...], curseur de la prochaine lecture). """
+        self._logger.debug('TRIGGER: GET LOG since {}'.format(cursor))
+        return self._log_store.read_since(cursor, levels)
+
+    def get_last_logs(self, count, levels=None):
+        """ Récupère les count derniers logging, filtrés par niveaux si donnés, du plus ancien au plus récent """
+        self._logger.debug('TRIGGER: GET LAST LOG {}'.format(count))
+        return self._log_store.read_last(count, levels)
 
     def fetch_plot_data(self):
         data = self._plot_data.copy()
         self._plot_data.clear()
         return data
 
+    def show_draws(self, draws):
+        """ Enregistre un lot de dessins et l'affiche sur la fenêtre du terrain en un seul appel, sauf pendant
+            la lecture de l'enregistreur qui affiche les dessins enregistrés """
+        self._logger.debug('TRIGGER: SHOW DRAWS {}'.format(len(draws)))
+        self._draw_recorder.record(draws)
+        if not self._recorder_is_enable:
+            self._controller.add_draws_on_screen(draws)
+
     def show_draw(self, draw):
-        """ Afficher le dessin sur la fenêtre du terrain """
+        """ Enregistre le dessin et l'affiche sur la fenêtre du terrain """
         if isinstance(draw, BaseDataDraw):
             self._logger.debug('TRIGGER: SHOW DRAW')
-            self._controller.add_draw_on_screen(draw)
+            self._draw_recorder.record([draw])
+            if not self._recorder_is_enable:
+                self._controller.add_draw_on_screen(draw)
         else:
             self._logger.warn('TRIGGER: SHOW DRAW not available object')
 
@@ -367,7 +555,8 @@ class DataInModel(Thread):
         """ Activer l'enregistreur sur le modèle de frame """
         self._logger.debug('SET: Enable recorder')
         if self._recorder is not None:
-            self._recorder.init(game_state=self.get_game_state_copy(), robot_state=self.get_robot_state_copy())
+            self._recorder.init(game_state=self.get_game_state_copy(), robot_state=self.get_robot_state_copy(),
+                                play_info=self.get_play_info_copy(), draws=self._draw_recorder)
             self._recorder_is_enable = True
             self._event_game_state.set()
             self._event_robot_strategic_state.set()
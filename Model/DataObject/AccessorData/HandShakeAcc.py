@@ -17,7 +17,20 @@ class HandShakeAcc(BaseDataAccessor):
 
     @catch_format_error
     def _check_optional_data(self):
-        pass
+        if 'wire_formats' in self.data.keys():
+            assert isinstance(self.data['wire_formats'], (list, tuple)), \
+                "data['wire_formats']: {} n'a pas le format attendu (list)".format(type(self.data['wire_formats']))
+            for wire_format in self.data['wire_formats']:
+                assert isinstance(wire_format, str), \
+                    "data['wire_formats']: {} n'a pas le format attendu (str)".format(type(wire_format))
+        else:
+            self.data['wire_formats'] = ['pickle']
+
+        if 'sender_id' in self.data.keys():
+            assert isinstance(self.data['sender_id'], int), \
+                "data['sender_id']: {} n'a pas le format attendu (int)".format(type(self.data['sender_id']))
+            assert 0 <= self.data['sender_id'] < 65536, \
+                "data['sender_id']: {} n'est pas dans l'intervalle 0 <= id < 65536".format(self.data['sender_id'])
 
     @staticmethod
     def get_default_data_dict():
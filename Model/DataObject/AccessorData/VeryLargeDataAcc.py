@@ -1,33 +1,177 @@
 # Under MIT License, see LICENSE.txt
 
+import zlib
+from collections import OrderedDict
 from time import time
 from Model.DataObject.AccessorData.BaseDataAccessor import BaseDataAccessor
-from Model.DataObject.BaseDataObject import catch_format_error
+from Model.DataObject.BaseDataObject import catch_format_error, FormatPackageError
 
 __author__ = 'RoboCupULaval'
 
 
+class _PendingBinary:
+    """ Binaire en cours de reconstruction, assemblé dans un tampon préalloué """
+    def __init__(self, total_pieces, deadline):
+        self.total_pieces = total_pieces
+        self.deadline = deadline
+        self.piece_size = None
+        self.buffer = None
+        self.received = set()
+        self.last_piece = None
+        self.nbytes = 0
+
+    def allocate(self, piece_size):
+        """ Préalloue le tampon à partir de la taille des morceaux (tous égaux sauf le dernier) """
+        self.piece_size = piece_size
+        self.buffer = bytearray(piece_size * self.total_pieces)
+        self.nbytes = len(self.buffer)
+
+    def write(self, piece_number, binary):
+        offset = (piece_number - 1) * self.piece_size
+        memoryview(self.buffer)[offset:offset + len(binary)] = binary
+
+    def write_last(self, binary):
+        """ Écrit le dernier morceau, plus court que les autres, et ajuste la taille du tampon """
+        self.write(self.total_pieces, binary)
+        del self.buffer[(self.total_pieces - 1) * self.piece_size + len(binary):]
+        self.nbytes = len(self.buffer)
+
+    def is_complete(self):
+        return len(self.received) == self.total_pieces
+
+
 class VeryLargeDataAcc(BaseDataAccessor):
-    __waiting_pieces = dict()
+    # Temps maximal en seconde pour recevoir tous les morceaux d'un binaire
+    REASSEMBLY_TIMEOUT = 2.0
+    # Mémoire maximale en octets réservée aux binaires en cours de reconstruction
+    MEMORY_CAP = 64 * 1024 * 1024
+    # Nombre maximal de morceaux d'un binaire
+    MAX_PIECES = 1 << 16
+
+    __waiting_pieces = OrderedDict()
+    __stats = {'completed': 0, 'expired': 0, 'evicted': 0, 'rejected': 0, 'last_rejected': None}
 
     def __init__(self, data_in):
         super().__init__(data_in)
         self._format_data()
 
     def store(self):
-        if self.data['id'] not in VeryLargeDataAcc.__waiting_pieces:
-            VeryLargeDataAcc.__waiting_pieces[self.data['id']] = dict()
-        VeryLargeDataAcc.__waiting_pieces[self.data['id']][self.data['piece_number']] = self.data['binary']
+        """ Stocke le morceau et indique si le binaire est complet """
+        waiting_pieces = VeryLargeDataAcc.__waiting_pieces
+        now = time()
+        VeryLargeDataAcc._evict_expired(now)
+
+        binary_id = self.data['id']
+        piece_number = self.data['piece_number']
+        total_pieces = self.data['total_pieces']
+        binary = self.data['binary']
+        if total_pieces > VeryLargeDataAcc.MAX_PIECES:
+            return self._reject(binary_id, '{} morceaux, maximum {}'.format(total_pieces, VeryLargeDataAcc.MAX_PIECES))
+
+        pending = waiting_pieces.get(binary_id)
+        if pending is None or pending.total_pieces != total_pieces:
+            pending = _PendingBinary(total_pieces, now + VeryLargeDataAcc.REASSEMBLY_TIMEOUT)
+            waiting_pieces[binary_id] = pending
+        if piece_number in pending.received:
+            return pending.is_complete()
+
+        if piece_number == total_pieces and total_pieces > 1:
+            if pending.buffer is None:
+                # La taille des morceaux est encore inconnue, le dernier morceau attend le premier
+                pending.last_piece = binary
+                pending.nbytes = len(binary)
+            elif len(binary) > pending.piece_size:
+                return self._reject(binary_id, 'dernier morceau trop grand')
+            else:
+                pending.write_last(binary)
+        else:
+            if pending.buffer is None:
+                # La taille du binaire est vérifiée avant d'allouer son tampon
+                pending.nbytes = len(binary) * total_pieces
+                if not self._fits_in_memory(binary_id, pending.nbytes):
+                    return self._reject(binary_id, 'dépasse la mémoire maximale')
+                pending.allocate(len(binary))
+                if pending.last_piece is not None:
+                    if len(pending.last_piece) > pending.piece_size:
+                        return self._reject(binary_id, 'dernier morceau trop grand')
+                    pending.write_last(pending.last_piece)
+                    pending.last_piece = None
+            elif len(binary) != pending.piece_size:
+                return self._reject(binary_id, 'taille de morceau incohérente')
+            pending.write(piece_number, binary)
+        pending.received.add(piece_number)
+        return pending.is_complete()
 
     @catch_format_error
     def rebuild(self):
-        if len(VeryLargeDataAcc.__waiting_pieces[self.data['id']].keys()) == self.data['total_pieces']:
-            bin_rebuilt = b''
-            for i in range(1, self.data['total_pieces'] + 1):
-                bin_rebuilt += VeryLargeDataAcc.__waiting_pieces[self.data['id']][i]
-            return bin_rebuilt
-        else:
+        """ Retourne le binaire reconstruit et libère sa mémoire, None s'il n'est pas complet. Un binaire
+            compressé invalide ou qui dépasse MEMORY_CAP une fois décompressé est rejeté (FormatPackageError). """
+        binary_id = self.data['id']
+        pending = VeryLargeDataAcc.__waiting_pieces.get(binary_id)
+        if pending is None or not pending.is_complete():
             return None
+        del VeryLargeDataAcc.__waiting_pieces[binary_id]
+        bin_rebuilt = bytes(pending.buffer) if pending.buffer is not None else pending.last_piece
+        if self.data['compressed']:
+            bin_rebuilt = self._decompress(binary_id, bin_rebuilt)
+        VeryLargeDataAcc.__stats['completed'] += 1
+        return bin_rebuilt
+
+    def _decompress(self, binary_id, binary):
+        """ Décompresse un binaire sans dépasser MEMORY_CAP """
+        decompressor = zlib.decompressobj()
+        try:
+            decompressed = decompressor.decompress(binary, VeryLargeDataAcc.MEMORY_CAP)
+        except zlib.error as e:
+            reason = 'compression invalide ({})'.format(e)
+        else:
+            if decompressor.unconsumed_tail:
+                reason = 'dépasse la mémoire maximale une fois décompressé'
+            elif not decompressor.eof:
+                reason = 'compression incomplète'
+            else:
+                return decompressed
+        self._reject(binary_id, reason)
+        raise FormatPackageError("data['id']: {} rejeté, {}".format(binary_id, reason))
+
+    def _reject(self, binary_id, reason):
+        """ Abandonne un binaire dont un morceau est invalide, la raison est conservée dans les statistiques """
+        VeryLargeDataAcc.__waiting_pieces.pop(binary_id, None)
+        VeryLargeDataAcc.__stats['rejected'] += 1
+        VeryLargeDataAcc.__stats['last_rejected'] = "data['id']: {} rejeté, {}".format(binary_id, reason)
+        return False
+
+    @staticmethod
+    def _evict_expired(now):
+        """ Retire les binaires dont le délai de reconstruction est dépassé """
+        waiting_pieces = VeryLargeDataAcc.__waiting_pieces
+        expired = [binary_id for binary_id, pending in waiting_pieces.items() if pending.deadline < now]
+        for binary_id in expired:
+            del waiting_pieces[binary_id]
+        VeryLargeDataAcc.__stats['expired'] += len(expired)
+
+    @staticmethod
+    def _fits_in_memory(binary_id, nbytes):
+        """ Retire les plus vieux binaires en attente jusqu'à ce que le nouveau respecte la mémoire maximale """
+        if nbytes > VeryLargeDataAcc.MEMORY_CAP:
+            return False
+        waiting_pieces = VeryLargeDataAcc.__waiting_pieces
+        used = sum(pending.nbytes for pending in waiting_pieces.values())
+        for old_id in list(waiting_pieces.keys()):
+            if used <= VeryLargeDataAcc.MEMORY_CAP:
+                break
+            if old_id != binary_id:
+                used -= waiting_pieces.pop(old_id).nbytes
+                VeryLargeDataAcc.__stats['evicted'] += 1
+        return used <= VeryLargeDataAcc.MEMORY_CAP
+
+    @staticmethod
+    def get_reassembly_stats():
+        """ Récupère l'état de la reconstruction des binaires """
+        stats = dict(VeryLargeDataAcc.__stats)
+        stats['pending'] = len(VeryLargeDataAcc.__waiting_pieces)
+        stats['pending_bytes'] = sum(pending.nbytes for pending in VeryLargeDataAcc.__waiting_pieces.values())
+        return stats
 
     @catch_format_error
     def _check_obligatory_data(self):
@@ -62,7 +206,11 @@ class VeryLargeDataAcc(BaseDataAccessor):
 
     @catch_format_error
     def _check_optional_data(self):
-        pass
+        if 'compressed' in self.data.keys():
+            assert isinstance(self.data['compressed'], bool), \
+                "data['compressed']: {} n'a pas le format attendu bool".format(type(self.data['compressed']))
+        else:
+            self.data['compressed'] = False
 
     @staticmethod
     def get_default_data_dict():
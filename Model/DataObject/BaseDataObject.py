@@ -14,6 +14,16 @@ class FormatPackageError(Exception):
     pass
 
 
+class CheckedPackage(dict):
+    """ Paquet dont la structure a déjà été validée par le décodeur du format binaire """
+    pass
+
+
+class TrustedPackage(CheckedPackage):
+    """ Paquet dont les données obligatoires ne sont pas revérifiées (émetteur de confiance, voir PacketSchema) """
+    pass
+
+
 def catch_format_error(funct):
     """ Décorateur qui récupère le message d'erreur d'une méthode spécifiquement pour les données
         entrantes. """
@@ -28,7 +38,8 @@ def catch_format_error(funct):
 class BaseDataObject:
     def __init__(self, data_in):
         if data_in is not None:
-            BaseDataObject.package_is_valid(data_in)
+            if not isinstance(data_in, CheckedPackage):
+                BaseDataObject.package_is_valid(data_in)
             self._data = data_in
         else:
             self._data = self.get_default_dict()
@@ -59,6 +70,16 @@ class BaseDataObject:
         """ Requête pour obtenir le filtre / id du robot associé """
         return self._data['link']
 
+    @property
+    def seq(self):
+        """ Requête pour obtenir le numéro de séquence de l'émetteur (None s'il n'est pas numéroté) """
+        return self._data.get('seq')
+
+    @property
+    def sent_time(self):
+        """ Requête pour obtenir le temps d'envoi de l'émetteur (None s'il n'est pas donné) """
+        return self._data.get('sent_time')
+
     @property
     def time(self):
         """ Requête pour obtenir le temps """
@@ -84,7 +105,8 @@ class BaseDataObject:
     @catch_format_error
     def _format_data(self):
         """ Vérifie les données et complète les données manquantes avec des valeurs par défauts """
-        self._check_obligatory_data()
+        if not isinstance(self._data, TrustedPackage):
+            self._check_obligatory_data()
         self._check_optional_data()
 
     @staticmethod
@@ -113,8 +135,11 @@ class BaseDataObject:
         del data_copy['time']
         return data_copy
 
-    def get_binary(self):
-        """ Retourne le un version binaire des données de l'objet """
+    def get_binary(self, wire_format='pickle', sender_id=0, sequence=0):
+        """ Retourne le un version binaire des données de l'objet dans le format négocié (pickle ou binary) """
+        if wire_format == 'binary':
+            from Model.DataObject.WireFormat import encode_packet
+            return encode_packet(self.get_dict(), sender_id, sequence)
         return pickle.dumps(self._data)
 
     @staticmethod
@@ -156,26 +181,21 @@ class BaseDataObject:
         assert isinstance(data_in['data'], dict), \
                 "paquet['data']: {} n'a pas le bon format (dict).".format(type(data_in['data']))
 
+        if 'seq' in keys:
+            assert isinstance(data_in['seq'], int) and data_in['seq'] >= 0, \
+                "paquet['seq']: {} n'a pas le bon format (int >= 0).".format(data_in['seq'])
+        if 'sent_time' in keys:
+            assert isinstance(data_in['sent_time'], (int, float)), \
+                "paquet['sent_time']: {} n'a pas le bon format (float).".format(type(data_in['sent_time']))
+
     @staticmethod
     def _colorRGB_is_valid(color):
         """ Vérifie si une couleur RGB est valide """
-        try:
-            assert isinstance(color, tuple)
-            assert len(color) == 3
-            for value in color:
-                assert 0 <= value <= 255
-            return True
-        except AssertionError:
-            return False
+        return isinstance(color, tuple) and len(color) == 3 and \
+            0 <= color[0] <= 255 and 0 <= color[1] <= 255 and 0 <= color[2] <= 255
 
     @staticmethod
     def _point_is_valid(point):
         """ Vérifie si un point est valide """
-        try:
-            assert isinstance(point, tuple)
-            assert len(point) == 2
-            for value in point:
-                assert isinstance(value, (float, int))
-            return True
-        except AssertionError:
-            return False
+        return isinstance(point, tuple) and len(point) == 2 and \
+            isinstance(point[0], (float, int)) and isinstance(point[1], (float, int))
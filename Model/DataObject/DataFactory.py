@@ -1,40 +1,89 @@
 # Under MIT License, see LICENSE.txt
 
-import pickle
-from Model.DataObject.BaseDataObject import BaseDataObject
+from Model.DataObject.BaseDataObject import CheckedPackage
+from Model.DataObject.PacketSchema import TRUST_FULL, TRUST_NONE, TRUST_LEVELS, check_envelope, compile_validator
+from Model.DataObject.WireFormat import decode_packet
+from Util.lazy_registry import LazyRegistry
 
 __author__ = 'RoboCupULaval'
 
+# Catalogue des DataObject reçus {type de paquet: module}, la classe porte le nom de son module.
+# Un nouveau type de paquet doit être ajouté ici.
+DATA_OBJECT_MODULES = {
+    1: 'Model.DataObject.LoggingData.LoggingData',
+    2: 'Model.DataObject.LoggingData.LoggingMessage',
+    1000: 'Model.DataObject.AccessorData.HandShakeAcc',
+    1001: 'Model.DataObject.AccessorData.StratGeneralAcc',
+    1002: 'Model.DataObject.AccessorData.RobotStrategicStateAcc',
+    1003: 'Model.DataObject.AccessorData.GameStateAcc',
+    1004: 'Model.DataObject.AccessorData.TeamColorAcc',
+    1005: 'Model.DataObject.AccessorData.PlayInfoAcc',
+    1006: 'Model.DataObject.AccessorData.RobotStateAcc',
+    1099: 'Model.DataObject.AccessorData.PlotDataAcc',
+    2000: 'Model.DataObject.AccessorData.VeryLargeDataAcc',
+    2001: 'Model.DataObject.AccessorData.FieldGeometryAcc',
+    3001: 'Model.DataObject.DrawingData.DrawLineDataIn',
+    3002: 'Model.DataObject.DrawingData.DrawMultipleLinesDataIn',
+    3003: 'Model.DataObject.DrawingData.DrawCircleDataIn',
+    3004: 'Model.DataObject.DrawingData.DrawPointDataIn',
+    3005: 'Model.DataObject.DrawingData.DrawMultiplePointsDataIn',
+    3006: 'Model.DataObject.DrawingData.DrawRectDataIn',
+    3007: 'Model.DataObject.DrawingData.DrawInfluenceMapDataIn',
+    3008: 'Model.DataObject.DrawingData.DrawTextDataIn',
+    3009: 'Model.DataObject.DrawingData.DrawTreeDataIn',
+    3900: 'Model.DataObject.DrawingData.DrawBundleDataIn',
+    5000: 'Model.DataObject.SendingData.SendingHandShake',
+    5001: 'Model.DataObject.SendingData.SendingToggleHumanCtrl',
+    5002: 'Model.DataObject.SendingData.SendingStrategy',
+    # SendingTactic et SendingAutoPlay partagent leur type avec SendingTarget et SendingUDPConfig
+    5003: 'Model.DataObject.SendingData.SendingTarget',
+    5005: 'Model.DataObject.SendingData.SendingGeometry',
+    5006: 'Model.DataObject.SendingData.SendingAIServer',
+    5007: 'Model.DataObject.SendingData.SendingDataPorts',
+    5008: 'Model.DataObject.SendingData.SendingUDPConfig',
+}
+
 
 class DataFactory:
     def __init__(self):
         self._name = DataFactory.__name__
         self._storage = dict()
-        self._catalog_from_type_to_data_in_object = dict()
-        self._init_object_catalog()
-
-    def _init_object_catalog(self):
-        """ Initialise le catalogue d'objet pour la factory """
-        self._import_data_classes()
-        for subclass in BaseDataObject.__subclasses__():
-            for subsubclass in subclass.__subclasses__():
-                self._catalog_from_type_to_data_in_object[subsubclass.get_type()] = subsubclass
-
-    @staticmethod
-    def _import_data_classes():
-        """ Importe les objets dans les sous-dossiers de Model.DataObject """
-        from os import listdir
-        from os.path import isfile, join, isdir
-        from importlib.machinery import SourceFileLoader
-
-        path_current_dir = __file__.replace(DataFactory.__name__ + '.py', '')
-        folders_inside_current_dir = [f for f in listdir(path_current_dir)
-                                      if isdir(join(path_current_dir, f)) and not f.count('_') and not f.count('Base')]
-        for folder in folders_inside_current_dir:
-            files = [f for f in listdir(join(path_current_dir, folder))
-                     if isfile(join(path_current_dir, folder, f)) and f.count('_') == 0]
-            for file in files:
-                SourceFileLoader("", join(path_current_dir, folder, file)).load_module()
+        self._catalog_from_type_to_data_in_object = LazyRegistry(DATA_OBJECT_MODULES,
+                                                                 get_key=lambda data_class: data_class.get_type())
+        # Validateurs compilés: niveau de confiance -> type de paquet -> validateur
+        self._validators = {trust: dict() for trust in TRUST_LEVELS}
+        self._sender_trust = dict()
+
+    def _get_validator(self, trust, p_type):
+        """ Récupère le validateur d'un type de paquet, la classe est importée et son validateur compilé au premier
+            paquet de ce type """
+        try:
+            return self._validators[trust][p_type]
+        except KeyError:
+            validator = compile_validator(self._catalog_from_type_to_data_in_object[p_type], trust)
+            self._validators[trust][p_type] = validator
+            return validator
+
+    def set_sender_trust(self, name, trust):
+        """ Assigne le niveau de confiance (TRUST_FULL, TRUST_SHAPE ou TRUST_NONE) des paquets d'un émetteur """
+        if trust not in TRUST_LEVELS:
+            raise ValueError('niveau de confiance {} inconnu, choix: {}'.format(trust, ', '.join(TRUST_LEVELS)))
+        if trust == TRUST_FULL:
+            self._sender_trust.pop(name, None)
+        else:
+            self._sender_trust[name] = trust
+
+    def get_sender_trust(self):
+        """ Récupère les niveaux de confiance des émetteurs qui ne sont pas validés au complet """
+        return dict(self._sender_trust)
+
+    def _get_trust(self, data_in):
+        if not self._sender_trust or not isinstance(data_in, dict):
+            return TRUST_FULL
+        name = data_in.get('name')
+        if not isinstance(name, str):
+            return TRUST_FULL
+        return self._sender_trust.get(name, TRUST_FULL)
 
     def get_msg_bad_format(self, **kargs):
         """ Génère un LoggingMessage formaté pour recevoir des erreurs d'envoies de données """
@@ -55,7 +104,19 @@ class DataFactory:
     def get_data_object(self, data_in):
         """ Génère un DataObject en fonction du paquet reçu """
         try:
-            BaseDataObject.package_is_valid(data_in)
-            return self._catalog_from_type_to_data_in_object[data_in['type']](data_in)
+            trust = self._get_trust(data_in)
+            if not isinstance(data_in, CheckedPackage):
+                if trust != TRUST_NONE:
+                    check_envelope(data_in)
+                data_in = CheckedPackage(data_in)
+            return self._get_validator(trust, data_in['type'])(data_in)
+        except Exception as e:
+            return self.get_msg_bad_format(FormatPackageError=str(e), PaquetBrute=data_in)
+
+    def get_data_object_from_binary(self, raw, sender_names=None):
+        """ Génère un DataObject à partir d'un paquet au format binaire """
+        try:
+            data_in = decode_packet(raw, sender_names)
+            return self._get_validator(self._get_trust(data_in), data_in['type'])(data_in)
         except Exception as e:
-            return self.get_msg_bad_format(FormatPackageError=str(e), PaquetBrute=data_in)
\ No newline at end of file
+            return self.get_msg_bad_format(FormatPackageError=str(e), PaquetBrute=bytes(raw[:64]))
@@ -10,6 +10,11 @@ __author__ = 'RoboCupULaval'
 class BaseDataDraw(BaseDataObject):
     """ Données entrantes pour les paquets de données pour dessiner """
     line_style_allowed = AbstractDrawingObject.line_style_allowed
+    # Un nouveau dessin de ce type remplace le précédent du même filtre sur la vue
+    is_unique_per_filter = False
+    # Forme des données obligatoires {clé: type} vérifiée pour un émetteur de confiance TRUST_SHAPE (PacketSchema),
+    # None pour toujours valider au complet
+    data_shape = None
 
     def __init__(self, data_in):
         super().__init__(data_in)
@@ -0,0 +1,70 @@
+# Under MIT License, see LICENSE.txt
+
+from Model.DataObject.BaseDataObject import catch_format_error, CheckedPackage
+from Model.DataObject.DrawingData.BaseDataDraw import BaseDataDraw
+
+__author__ = 'RoboCupULaval'
+
+
+class DrawBundleDataIn(BaseDataDraw):
+    """ Regroupe plusieurs dessins dans un seul paquet, avec le nom, le link et le timeout en commun """
+    def __init__(self, data_in):
+        super().__init__(data_in)
+        self._format_data()
+
+    @catch_format_error
+    def _check_obligatory_data(self):
+        """ Vérifie les données obligatoires """
+        assert isinstance(self.data, dict),\
+            "data: {} n'est pas un dictionnaire.".format(type(self.data))
+        keys = self.data.keys()
+
+        assert 'draws' in keys, \
+            "data['draws'] n'existe pas."
+        assert isinstance(self.data['draws'], (list, tuple)), \
+            "data['draws']: {} n'est pas une liste.".format(type(self.data['draws']))
+        for index, draw in enumerate(self.data['draws']):
+            assert isinstance(draw, dict), \
+                "data['draws'][{}]: {} n'est pas un dictionnaire.".format(index, type(draw))
+            assert 'type' in draw.keys() and isinstance(draw['type'], int), \
+                "data['draws'][{}]['type'] n'existe pas ou n'est pas du bon type (int).".format(index)
+            assert 3000 <= draw['type'] < 5000 and draw['type'] != self.get_type(), \
+                "data['draws'][{}]['type']: {} n'est pas un type de dessin.".format(index, draw['type'])
+            assert 'data' in draw.keys() and isinstance(draw['data'], dict), \
+                "data['draws'][{}]['data'] n'existe pas ou n'est pas un dictionnaire.".format(index)
+            if 'link' in draw.keys() and draw['link'] is not None:
+                assert isinstance(draw['link'], (int, str)), \
+                    "data['draws'][{}]['link']: {} n'a pas le bon format (int).".format(index, type(draw['link']))
+
+    @catch_format_error
+    def _check_optional_data(self):
+        """ Vérifie les données optionnelles """
+        keys = self.data.keys()
+        if 'timeout' in keys:
+            assert self.data['timeout'] >= 0, \
+                "data['timeout']: {} n'est pas valide.".format(self.data['timeout'])
+        else:
+            self.data['timeout'] = 0
+
+    def get_sub_packages(self):
+        """ Génère les paquets des dessins du regroupement avec l'entête commune """
+        packages = []
+        for draw in self.data['draws']:
+            data = dict(draw['data'])
+            if 'timeout' not in data:
+                data['timeout'] = self.data['timeout']
+            packages.append(CheckedPackage(name=self.name,
+                                           version=self.version,
+                                           type=draw['type'],
+                                           link=draw.get('link', self.link),
+                                           data=data))
+        return packages
+
+    @staticmethod
+    def get_default_data_dict():
+        return dict(zip(['draws'],
+                        [[]]))
+
+    @staticmethod
+    def get_type():
+        return 3900
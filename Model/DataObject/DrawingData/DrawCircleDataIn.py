@@ -7,6 +7,8 @@ __author__ = 'RoboCupULaval'
 
 
 class DrawCircleDataIn(BaseDataDraw):
+    data_shape = {'center': tuple, 'radius': (int, float)}
+
     def __init__(self, data_in):
         super().__init__(data_in)
         self._format_data()
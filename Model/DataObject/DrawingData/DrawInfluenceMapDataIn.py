@@ -5,8 +5,14 @@ from Model.DataObject.BaseDataObject import catch_format_error
 
 __author__ = 'RoboCupULaval'
 
+# Types des cases vérifiés d'un bloc par ligne, les autres cases sont vérifiées une à une
+_CELL_TYPES = frozenset((int, bool))
+
 
 class DrawInfluenceMapDataIn(BaseDataDraw):
+    is_unique_per_filter = True
+    data_shape = {'field_data': list}
+
     def __init__(self, data_in):
         super().__init__(data_in)
         self._format_data()
@@ -27,10 +33,11 @@ class DrawInfluenceMapDataIn(BaseDataDraw):
                 "data['field_data'][{}]: {} n'a pas le format attendu (list)".format(nb_line, type(line))
             assert len(line) == data_len, \
                 "data['field_data'][{}]: {} n'a pas une longueur uniforme ({})".format(nb_line, len(line), data_len)
-            for nb_col, case in enumerate(line):
-                assert isinstance(case, int), \
-                    "data['field_data'][{}][{}]: {} n'a pas le format attendu (int)" \
-                    "".format(nb_line, nb_col, type(case))
+            if not _CELL_TYPES.issuperset(map(type, line)):
+                for nb_col, case in enumerate(line):
+                    assert isinstance(case, int), \
+                        "data['field_data'][{}][{}]: {} n'a pas le format attendu (int)" \
+                        "".format(nb_line, nb_col, type(case))
 
     @catch_format_error
     def _check_optional_data(self):
@@ -7,6 +7,8 @@ __author__ = 'RoboCupULaval'
 
 
 class DrawLineDataIn(BaseDataDraw):
+    data_shape = {'start': tuple, 'end': tuple}
+
     def __init__(self, data_in):
         super().__init__(data_in)
         self._format_data()
@@ -7,6 +7,9 @@ __author__ = 'RoboCupULaval'
 
 
 class DrawMultiplePointsDataIn(BaseDataDraw):
+    is_unique_per_filter = True
+    data_shape = {'points': list}
+
     def __init__(self, data_in):
         super().__init__(data_in)
         self._format_data()
@@ -7,6 +7,8 @@ __author__ = 'RoboCupULaval'
 
 
 class DrawPointDataIn(BaseDataDraw):
+    data_shape = {'point': tuple}
+
     def __init__(self, data_in):
         super().__init__(data_in)
         self._format_data()
@@ -7,6 +7,8 @@ __author__ = 'RoboCupULaval'
 
 
 class DrawRectDataIn(BaseDataDraw):
+    data_shape = {'top_left': tuple, 'bottom_right': tuple}
+
     def __init__(self, data_in):
         super().__init__(data_in)
         self._format_data()
@@ -7,6 +7,8 @@ __author__ = 'RoboCupULaval'
 
 
 class DrawTextDataIn(BaseDataDraw):
+    data_shape = {'position': tuple, 'text': str}
+
     def __init__(self, data_in):
         super().__init__(data_in)
         self._format_data()
@@ -7,6 +7,8 @@ __author__ = 'RoboCupULaval'
 
 
 class DrawTreeDataIn(BaseDataDraw):
+    data_shape = {'tree': list}
+
     def __init__(self, data_in):
         super().__init__(data_in)
         self._format_data()
@@ -24,6 +24,10 @@ class BaseDataLog(BaseDataObject):
         """ Retourne une dictionnaire de données par défaut """
         raise NotImplementedError()
 
+    def get_level(self):
+        """ Niveau du message (clé de display_type), NOTSET par défaut """
+        return 0
+
     @abstractmethod
     def __str__(self):
         """ Affiche le message sous forme d'une chaîne de caractères."""
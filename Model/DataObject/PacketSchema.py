@@ -0,0 +1,80 @@
+# Under MIT License, see LICENSE.txt
+
+from Model.DataObject.BaseDataObject import BaseDataObject, TrustedPackage, __version__ as API_VERSION
+
+__author__ = 'RoboCupULaval'
+
+"""
+    Validateurs des paquets entrants, compilés une fois par type de paquet par la DataFactory au premier paquet
+    de ce type.
+    Le niveau de confiance d'un émetteur choisit le validateur:
+
+        TRUST_FULL      l'entête et toutes les données sont vérifiées (comportement par défaut)
+        TRUST_SHAPE     l'entête et la forme des données obligatoires (data_shape du type) sont vérifiées, les
+                        éléments (points, cases, ...) ne sont pas parcourus
+        TRUST_NONE      aucune vérification de l'entête ni des données obligatoires
+
+    Seules les données optionnelles sont toujours vérifiées et complétées par leurs valeurs par défaut. Un type
+    qui ne déclare pas de data_shape est validé au complet quel que soit le niveau, sauf l'entête en TRUST_NONE.
+"""
+
+TRUST_FULL = 'full'
+TRUST_SHAPE = 'shape'
+TRUST_NONE = 'none'
+TRUST_LEVELS = (TRUST_FULL, TRUST_SHAPE, TRUST_NONE)
+
+
+def envelope_is_valid(package):
+    """ Version rapide de BaseDataObject.package_is_valid, sans message d'erreur """
+    try:
+        return isinstance(package, dict) and \
+            isinstance(package['name'], str) and \
+            isinstance(package['type'], int) and 0 <= package['type'] < 7000 and \
+            isinstance(package['version'], str) and package['version'] == API_VERSION and \
+            (package['link'] is None or isinstance(package['link'], (int, str))) and \
+            isinstance(package['data'], dict) and \
+            ('seq' not in package or (isinstance(package['seq'], int) and package['seq'] >= 0)) and \
+            ('sent_time' not in package or isinstance(package['sent_time'], (int, float)))
+    except KeyError:
+        return False
+
+
+def check_envelope(package):
+    """ Vérifie l'entête du paquet, le message d'erreur détaillé n'est construit qu'en cas d'échec """
+    if not envelope_is_valid(package):
+        BaseDataObject.package_is_valid(package)
+
+
+def compile_shape(data_shape):
+    """ Compile un data_shape {clé: type ou tuple de types} en fonction qui vérifie les données d'un paquet """
+    fields = tuple(data_shape.items())
+
+    def shape_is_valid(data):
+        for key, types in fields:
+            if key not in data or not isinstance(data[key], types):
+                return False
+        return True
+
+    return shape_is_valid
+
+
+def compile_validator(data_class, trust):
+    """ Compile le validateur d'un type de paquet pour un niveau de confiance. Le validateur reçoit un
+        CheckedPackage (entête vérifiée ou non selon le niveau) et retourne le DataObject. """
+    data_shape = getattr(data_class, 'data_shape', None)
+    if trust == TRUST_FULL or data_shape is None:
+        return data_class
+
+    if trust == TRUST_NONE:
+        def validate_none(package):
+            return data_class(TrustedPackage(package))
+        return validate_none
+
+    shape_is_valid = compile_shape(data_shape)
+
+    def validate_shape(package):
+        if shape_is_valid(package['data']):
+            return data_class(TrustedPackage(package))
+        # Validation complète pour obtenir le message d'erreur détaillé
+        return data_class(package)
+    return validate_shape
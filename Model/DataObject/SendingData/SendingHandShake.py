@@ -1,6 +1,7 @@
 # Under MIT License, see LICENSE.txt
 
 from Model.DataObject.BaseDataObject import catch_format_error
+from Model.DataObject.WireFormat import WIRE_FORMATS_SUPPORTED
 from Model.DataObject.SendingData.BaseDataSending import BaseDataSending
 
 __author__ = 'RoboCupULaval'
@@ -17,7 +18,10 @@ class SendingHandShake(BaseDataSending):
 
     @catch_format_error
     def _check_optional_data(self):
-        pass
+        if 'wire_format' in self.data.keys():
+            assert self.data['wire_format'] in WIRE_FORMATS_SUPPORTED, \
+                "data['wire_format']: {} n'est pas un format supporté {}".format(self.data['wire_format'],
+                                                                               WIRE_FORMATS_SUPPORTED)
 
     @staticmethod
     def get_default_data_dict():
@@ -0,0 +1,418 @@
+# Under MIT License, see LICENSE.txt
+
+import pickletools
+import struct
+
+from Model.DataObject.BaseDataObject import FormatPackageError, CheckedPackage, __version__ as API_VERSION
+
+__author__ = 'RoboCupULaval'
+
+"""
+    Format binaire compact des paquets, utilisé en parallèle de pickle lorsque le client l'annonce dans son
+    HandShake. Un paquet est une entête fixe suivie d'une charge utile typée:
+
+    Entête (little-endian, 14 octets):
+        magic       2s      b'UD'
+        version     u8      version de l'API (majeur << 4 | mineur), 0x10 pour '1.0'
+        flags       u8      FLAG_STR_LINK: le link est une chaîne qui suit l'entête
+                            FLAG_SENT_TIME: le temps d'envoi (f64, secondes epoch) suit l'entête
+        type        u16     type du paquet
+        link        i16     numéro du link, LINK_NONE pour None
+        sender_id   u16     identifiant de l'émetteur annoncé dans le HandShake
+        sequence    u32     numéro de séquence de l'émetteur, 0 pour un paquet non numéroté
+
+    La charge utile est la valeur typée de paquet['data']. Les listes de points sont transmises en tableaux
+    float32 compacts et les grilles d'entiers (Influence Map) en tableaux int32. Le décodeur ne construit que
+    des types connus, la structure du paquet n'a donc pas à être revérifiée champ par champ.
+"""
+
+WIRE_FORMAT_PICKLE = 'pickle'
+WIRE_FORMAT_BINARY = 'binary'
+WIRE_FORMATS_SUPPORTED = (WIRE_FORMAT_BINARY, WIRE_FORMAT_PICKLE)
+
+MAGIC = b'UD'
+HEADER = struct.Struct('<2sBBHhHI')
+LINK_NONE = -1
+FLAG_STR_LINK = 0x01
+FLAG_SENT_TIME = 0x02
+
+# Étiquettes des valeurs typées de la charge utile
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_STR = 5
+TAG_BYTES = 6
+TAG_LIST = 7
+TAG_TUPLE = 8
+TAG_DICT = 9
+TAG_POINTS_F32 = 10
+TAG_POINT_F32 = 11
+TAG_COLOR = 12
+TAG_GRID_I32 = 13
+TAG_POINT_I32 = 14
+
+_U8 = struct.Struct('<B')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+_POINT_F32 = struct.Struct('<2f')
+_POINT_I32 = struct.Struct('<2i')
+_COLOR = struct.Struct('<3B')
+_GRID_SHAPE = struct.Struct('<II')
+
+_INT32_MIN, _INT32_MAX = -2 ** 31, 2 ** 31 - 1
+# Nombre maximal de cases d'une grille décodée (Influence Map)
+_GRID_MAX_CASES = 1 << 22
+
+
+def is_binary_packet(raw):
+    """ Détermine si un paquet brut est au format binaire """
+    return raw[:2] == MAGIC
+
+
+def _version_to_byte(version):
+    major, minor = version.split('.')
+    return int(major) << 4 | int(minor)
+
+
+def _byte_to_version(value):
+    return '{}.{}'.format(value >> 4, value & 0x0f)
+
+
+# === ENCODAGE ===
+def encode_packet(packet, sender_id=0, sequence=0):
+    """ Encode un paquet (dictionnaire name, version, type, link, data) au format binaire. Les clés optionnelles
+        'seq' et 'sent_time' du paquet sont reportées dans l'entête. """
+    chunks = []
+    link = packet['link']
+    sequence = packet.get('seq', sequence)
+    sent_time = packet.get('sent_time')
+    flags = FLAG_SENT_TIME if sent_time is not None else 0
+    if link is None:
+        header_link = LINK_NONE
+    elif isinstance(link, str):
+        flags |= FLAG_STR_LINK
+        header_link = LINK_NONE
+    else:
+        header_link = link
+    chunks.append(HEADER.pack(MAGIC, _version_to_byte(packet['version']), flags, packet['type'],
+                              header_link, sender_id, sequence & 0xffffffff))
+    if flags & FLAG_SENT_TIME:
+        chunks.append(_F64.pack(sent_time))
+    if flags & FLAG_STR_LINK:
+        _encode_str(chunks, link)
+    _encode_value(chunks, packet['data'])
+    return b''.join(chunks)
+
+
+def _encode_str(chunks, value):
+    encoded = value.encode('utf-8')
+    chunks.append(_U32.pack(len(encoded)))
+    chunks.append(encoded)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_point(value):
+    return isinstance(value, tuple) and len(value) == 2 and _is_number(value[0]) and _is_number(value[1])
+
+
+def _encode_value(chunks, value):
+    """ Encode une valeur typée en choisissant la représentation la plus compacte """
+    if value is None:
+        chunks.append(_U8.pack(TAG_NONE))
+    elif value is True or value is False:
+        chunks.append(_U8.pack(TAG_TRUE if value else TAG_FALSE))
+    elif isinstance(value, int):
+        chunks.append(_U8.pack(TAG_INT))
+        chunks.append(_I64.pack(value))
+    elif isinstance(value, float):
+        chunks.append(_U8.pack(TAG_FLOAT))
+        chunks.append(_F64.pack(value))
+    elif isinstance(value, str):
+        chunks.append(_U8.pack(TAG_STR))
+        _encode_str(chunks, value)
+    elif isinstance(value, bytes):
+        chunks.append(_U8.pack(TAG_BYTES))
+        chunks.append(_U32.pack(len(value)))
+        chunks.append(value)
+    elif isinstance(value, dict):
+        chunks.append(_U8.pack(TAG_DICT))
+        chunks.append(_U32.pack(len(value)))
+        for key, item in value.items():
+            _encode_value(chunks, key)
+            _encode_value(chunks, item)
+    elif isinstance(value, tuple):
+        _encode_tuple(chunks, value)
+    elif isinstance(value, list):
+        _encode_list(chunks, value)
+    else:
+        raise FormatPackageError('{} ne peut pas être encodé au format binaire'.format(type(value).__name__))
+
+
+def _encode_tuple(chunks, value):
+    if _is_point(value):
+        if isinstance(value[0], int) and isinstance(value[1], int) and \
+                _INT32_MIN <= value[0] <= _INT32_MAX and _INT32_MIN <= value[1] <= _INT32_MAX:
+            chunks.append(_U8.pack(TAG_POINT_I32))
+            chunks.append(_POINT_I32.pack(*value))
+        else:
+            chunks.append(_U8.pack(TAG_POINT_F32))
+            chunks.append(_POINT_F32.pack(*value))
+    elif len(value) == 3 and all(isinstance(c, int) and not isinstance(c, bool) and 0 <= c <= 255 for c in value):
+        chunks.append(_U8.pack(TAG_COLOR))
+        chunks.append(_COLOR.pack(*value))
+    else:
+        chunks.append(_U8.pack(TAG_TUPLE))
+        chunks.append(_U32.pack(len(value)))
+        for item in value:
+            _encode_value(chunks, item)
+
+
+def _encode_list(chunks, value):
+    if value and all(_is_point(item) for item in value):
+        chunks.append(_U8.pack(TAG_POINTS_F32))
+        chunks.append(_U32.pack(len(value)))
+        chunks.append(struct.pack('<{}f'.format(2 * len(value)), *(c for point in value for c in point)))
+    elif value and _is_int_grid(value):
+        rows, cols = len(value), len(value[0])
+        chunks.append(_U8.pack(TAG_GRID_I32))
+        chunks.append(_GRID_SHAPE.pack(rows, cols))
+        chunks.append(struct.pack('<{}i'.format(rows * cols), *(case for line in value for case in line)))
+    else:
+        chunks.append(_U8.pack(TAG_LIST))
+        chunks.append(_U32.pack(len(value)))
+        for item in value:
+            _encode_value(chunks, item)
+
+
+def _is_int_grid(value):
+    """ Vérifie si une liste est une grille rectangulaire d'entiers int32 """
+    if not isinstance(value[0], list) or not value[0]:
+        return False
+    cols = len(value[0])
+    for line in value:
+        if not isinstance(line, list) or len(line) != cols:
+            return False
+        for case in line:
+            if not isinstance(case, int) or isinstance(case, bool) or not _INT32_MIN <= case <= _INT32_MAX:
+                return False
+    return True
+
+
+# === DÉCODAGE ===
+def decode_packet(raw, sender_names=None):
+    """ Décode un paquet binaire en CheckedPackage (name, version, type, link, data). Le nom de l'émetteur est
+        résolu avec sender_names {sender_id: name} rempli lors du HandShake. """
+    try:
+        view = memoryview(raw)
+        magic, version, flags, p_type, link, sender_id, sequence = HEADER.unpack_from(view, 0)
+        pos = HEADER.size
+        sent_time = None
+        if flags & FLAG_SENT_TIME:
+            sent_time = _F64.unpack_from(view, pos)[0]
+            pos += 8
+        if flags & FLAG_STR_LINK:
+            link, pos = _decode_str(view, pos)
+        elif link == LINK_NONE:
+            link = None
+        data, pos = _decode_value(view, pos)
+    except (struct.error, IndexError, UnicodeDecodeError, KeyError) as e:
+        raise FormatPackageError('paquet binaire invalide: ({}) {}'.format(type(e).__name__, e))
+    version = _byte_to_version(version)
+    if version != API_VERSION:
+        raise FormatPackageError("paquet['version']: {} n'a pas la bonne valeur (version = {})"
+                                 "".format(version, API_VERSION))
+    if not p_type < 7000:
+        raise FormatPackageError("paquet['type']: {} n'a pas la bonne valeur (0 <= type < 7000)".format(p_type))
+    if not isinstance(data, dict):
+        raise FormatPackageError("paquet['data']: {} n'a pas le bon format (dict).".format(type(data)))
+
+    if sender_names is not None and sender_id in sender_names:
+        name = sender_names[sender_id]
+    else:
+        name = 'sender-{}'.format(sender_id)
+    package = CheckedPackage(name=name, version=version, type=p_type, link=link, data=data, sender_id=sender_id)
+    if sequence:
+        package['seq'] = sequence
+    if sent_time is not None:
+        package['sent_time'] = sent_time
+    return package
+
+
+def _check_remaining(view, pos, nbytes):
+    """ Vérifie que la longueur annoncée d'une valeur ne dépasse pas la fin du paquet """
+    if pos + nbytes > len(view):
+        raise FormatPackageError('paquet binaire invalide: {} octets annoncés, {} restants'.format(nbytes,
+                                                                                                len(view) - pos))
+
+
+def _decode_str(view, pos):
+    length = _U32.unpack_from(view, pos)[0]
+    pos += 4
+    _check_remaining(view, pos, length)
+    return str(view[pos:pos + length], 'utf-8'), pos + length
+
+
+def _decode_none(view, pos):
+    return None, pos
+
+
+def _decode_false(view, pos):
+    return False, pos
+
+
+def _decode_true(view, pos):
+    return True, pos
+
+
+def _decode_int(view, pos):
+    return _I64.unpack_from(view, pos)[0], pos + 8
+
+
+def _decode_float(view, pos):
+    return _F64.unpack_from(view, pos)[0], pos + 8
+
+
+def _decode_bytes(view, pos):
+    length = _U32.unpack_from(view, pos)[0]
+    pos += 4
+    _check_remaining(view, pos, length)
+    return view[pos:pos + length].tobytes(), pos + length
+
+
+def _decode_list(view, pos):
+    count = _U32.unpack_from(view, pos)[0]
+    pos += 4
+    items = []
+    for _ in range(count):
+        item, pos = _decode_value(view, pos)
+        items.append(item)
+    return items, pos
+
+
+def _decode_tuple(view, pos):
+    items, pos = _decode_list(view, pos)
+    return tuple(items), pos
+
+
+def _decode_dict(view, pos):
+    count = _U32.unpack_from(view, pos)[0]
+    pos += 4
+    items = dict()
+    for _ in range(count):
+        key, pos = _decode_value(view, pos)
+        items[key], pos = _decode_value(view, pos)
+    return items, pos
+
+
+def _decode_points(view, pos):
+    count = _U32.unpack_from(view, pos)[0]
+    pos += 4
+    _check_remaining(view, pos, 8 * count)
+    coords = struct.unpack_from('<{}f'.format(2 * count), view, pos)
+    return list(zip(coords[0::2], coords[1::2])), pos + 8 * count
+
+
+def _decode_point_f32(view, pos):
+    return _POINT_F32.unpack_from(view, pos), pos + 8
+
+
+def _decode_point_i32(view, pos):
+    return _POINT_I32.unpack_from(view, pos), pos + 8
+
+
+def _decode_color(view, pos):
+    return _COLOR.unpack_from(view, pos), pos + 3
+
+
+def _decode_grid(view, pos):
+    rows, cols = _GRID_SHAPE.unpack_from(view, pos)
+    pos += _GRID_SHAPE.size
+    if not rows or not cols or rows * cols > _GRID_MAX_CASES:
+        raise FormatPackageError('paquet binaire invalide: grille de {} x {}'.format(rows, cols))
+    _check_remaining(view, pos, 4 * rows * cols)
+    cases = struct.unpack_from('<{}i'.format(rows * cols), view, pos)
+    return [list(cases[i * cols:(i + 1) * cols]) for i in range(rows)], pos + 4 * rows * cols
+
+
+_DECODERS = {TAG_NONE: _decode_none,
+             TAG_FALSE: _decode_false,
+             TAG_TRUE: _decode_true,
+             TAG_INT: _decode_int,
+             TAG_FLOAT: _decode_float,
+             TAG_STR: _decode_str,
+             TAG_BYTES: _decode_bytes,
+             TAG_LIST: _decode_list,
+             TAG_TUPLE: _decode_tuple,
+             TAG_DICT: _decode_dict,
+             TAG_POINTS_F32: _decode_points,
+             TAG_POINT_F32: _decode_point_f32,
+             TAG_COLOR: _decode_color,
+             TAG_GRID_I32: _decode_grid,
+             TAG_POINT_I32: _decode_point_i32}
+
+
+def _decode_value(view, pos):
+    return _DECODERS[view[pos]](view, pos + 1)
+
+
+# === APERÇU ===
+# Opcodes pickle des valeurs de l'entête d'un paquet
+_PICKLE_STR_OPS = frozenset(('SHORT_BINUNICODE', 'BINUNICODE', 'UNICODE', 'SHORT_BINSTRING', 'BINSTRING'))
+_PICKLE_INT_OPS = frozenset(('BININT1', 'BININT2', 'BININT', 'INT', 'LONG1'))
+# Les clés de l'entête précèdent 'data' dans un paquet construit par le client, l'aperçu s'arrête donc à 'data'
+_PEEK_MAX_OPS = 32
+
+
+def peek_packet(raw):
+    """ Lit l'émetteur, le type et le link d'un paquet brut sans le décoder au complet.
+        Retourne (émetteur, type, link), avec un type None si l'entête n'est pas lisible. """
+    if is_binary_packet(raw):
+        return _peek_binary(raw)
+    return _peek_pickle(raw)
+
+
+def _peek_binary(raw):
+    try:
+        _, _, flags, p_type, link, sender_id, _ = HEADER.unpack_from(raw, 0)
+        if flags & FLAG_STR_LINK:
+            pos = HEADER.size + (8 if flags & FLAG_SENT_TIME else 0)
+            link, _ = _decode_str(memoryview(raw), pos)
+        elif link == LINK_NONE:
+            link = None
+    except (struct.error, IndexError, UnicodeDecodeError, FormatPackageError):
+        return None, None, None
+    return sender_id, p_type, link
+
+
+def _peek_pickle(raw):
+    header = dict()
+    key = None
+    try:
+        for count, (opcode, arg, _) in enumerate(pickletools.genops(raw)):
+            name = opcode.name
+            if key is None:
+                if name in _PICKLE_STR_OPS:
+                    if arg == 'data' or count > _PEEK_MAX_OPS:
+                        break
+                    key = arg
+            elif name in _PICKLE_STR_OPS or name in _PICKLE_INT_OPS or name == 'NONE':
+                header[key] = arg
+                key = None
+                if 'name' in header and 'type' in header and 'link' in header:
+                    break
+            elif not name.endswith(('PUT', 'MEMOIZE')):
+                # La valeur n'est pas un scalaire: la clé ne fait pas partie de l'entête recherchée
+                key = None
+    except (ValueError, EOFError, UnicodeDecodeError):
+        pass
+    p_type = header.get('type')
+    if not isinstance(p_type, int):
+        return None, None, None
+    return header.get('name'), p_type, header.get('link')
+
@@ -11,6 +11,7 @@ from Model.DataObject.SendingData.SendingGeometry import SendingGeometry
 from Model.DataObject.SendingData.SendingAIServer import SendingAIServer
 from Model.DataObject.SendingData.SendingDataPorts import SendingDataPorts
 from Model.DataObject.SendingData.SendingUDPConfig import SendingUDPConfig
+from Model.DataObject.WireFormat import WIRE_FORMAT_PICKLE
 
 __author__ = 'RoboCupULaval'
 
@@ -21,6 +22,10 @@ class DataOutModel:
         self._udp_sender = None
         self.target = 0, 0
 
+        # Format négocié lors du HandShake et numéro de séquence des paquets envoyés
+        self._wire_format = WIRE_FORMAT_PICKLE
+        self._sequence = 0
+
         self.frame_timer = QTimer()
         self.frame_timer.timeout.connect(self.update_screen)
         self.frame_timer.start(30)  # C'est quoi ca? c'était à 20
@@ -28,6 +33,14 @@ class DataOutModel:
     def setup_udp_server(self, server):
         self._udp_sender = server
 
+    def get_wire_format(self):
+        return self._wire_format
+
+    def _send_package(self, pkg):
+        """ Sérialise le paquet dans le format négocié et l'envoie au client """
+        self._sequence += 1
+        self._udp_sender.send_message(pkg.get_binary(self._wire_format, sequence=self._sequence))
+
     def update_screen(self):
         self._controller.update_target_on_screen()
 
@@ -42,23 +55,28 @@ class DataOutModel:
                                        target=target,
                                        goal=goal,
                                        args=args)
-        self._udp_sender.send_message(pkg.get_binary())
+        self._send_package(pkg)
 
     def send_strategy(self, strat, team, roles):
         pkg = SendingStrategy().set_data(strategy=strat, team=team, roles=roles)
-        self._udp_sender.send_message(pkg.get_binary())
+        self._send_package(pkg)
 
     def send_auto_play(self, status):
         pkg = SendingAutoPlay().set_data(status=status)
-        self._udp_sender.send_message(pkg.get_binary())
+        self._send_package(pkg)
 
     def send_toggle_human_control(self, result):
         pkg = SendingToggleHumanCtrl().set_data(is_human_control=result)
-        self._udp_sender.send_message(pkg.get_binary())
+        self._send_package(pkg)
 
-    def send_handshake(self):
+    def send_handshake(self, wire_format=None):
+        """ Répond au HandShake, toujours avec pickle pour rester compris des anciens clients """
         pkg = SendingHandShake()
+        if wire_format is not None:
+            pkg.set_data(wire_format=wire_format)
         self._udp_sender.send_message(pkg.get_binary())
+        if wire_format is not None:
+            self._wire_format = wire_format
 
     def send_geometry(self, field_control):
         pkg = SendingGeometry().set_data(field_length=field_control.field_length,
@@ -70,23 +88,23 @@ class DataOutModel:
                                          goal_depth=field_control.goal_depth,
                                          ratio_field_mobs=field_control.ratio_field_mobs)
         if self._udp_sender is not None:
-            self._udp_sender.send_message(pkg.get_binary())
+            self._send_package(pkg)
 
     def send_ports_rs(self, ports_info):
         pkg = SendingDataPorts().set_data(recv_port=ports_info['recv_port'],
                                           send_port=ports_info['send_port'])
         if self._udp_sender is not None:
-            self._udp_sender.send_message(pkg.get_binary())
+            self._send_package(pkg)
 
     def send_server(self, server_info):
         pkg = SendingAIServer().set_data(is_serial=server_info['is_serial'],
                                          ip=server_info['ip'],
                                          port=server_info['port'])
         if self._udp_sender is not None:
-            self._udp_sender.send_message(pkg.get_binary())
+            self._send_package(pkg)
 
     def send_udp_config(self, udp_config_info):
         pkg = SendingUDPConfig().set_data(ip=udp_config_info['ip'],
                                          port=int(udp_config_info['port']))
         if self._udp_sender is not None:
-            self._udp_sender.send_message(pkg.get_binary())
\ No newline at end of file
+            self._send_package(pkg)
\ No newline at end of file
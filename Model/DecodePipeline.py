@@ -0,0 +1,177 @@
+# Under MIT License, see LICENSE.txt
+
+import logging
+import multiprocessing
+import pickle
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from Model.DataObject.DataFactory import DataFactory
+from Model.DataObject.PacketSchema import TRUST_FULL
+from Model.DataObject.WireFormat import is_binary_packet, peek_packet
+
+__author__ = 'RoboCupULaval'
+
+LANE_CONTROL = 'control'
+LANE_BULK = 'bulk'
+
+# Types décodés dans la voie volumineuse: Influence Map (DrawInfluenceMapDataIn) et regroupements de dessins
+# (DrawBundleDataIn). Les états (GameState, RobotState, ...) restent dans la voie de contrôle peu importe leur
+# taille pour être appliqués dans l'ordre d'arrivée.
+BULK_TYPES = frozenset((3007, 3900))
+
+# DataFactory d'un processus de décodage, créée au premier paquet
+_process_factory = None
+
+
+def decode_package(factory, raw, sender_names=None):
+    """ Désérialise un paquet brut (binaire ou pickle) et le convertit en DataObject, None pour un paquet vide """
+    if is_binary_packet(raw):
+        return factory.get_data_object_from_binary(raw, sender_names)
+    data_in = pickle.loads(raw)
+    if data_in is None:
+        return None
+    return factory.get_data_object(data_in)
+
+
+def _decode_in_process(raw, sender_names, sender_trust):
+    """ Décode un paquet volumineux dans un processus de décodage avec les niveaux de confiance du modèle """
+    global _process_factory
+    if _process_factory is None:
+        _process_factory = DataFactory()
+    for name in _process_factory.get_sender_trust():
+        if name not in sender_trust:
+            _process_factory.set_sender_trust(name, TRUST_FULL)
+    for name, trust in sender_trust.items():
+        _process_factory.set_sender_trust(name, trust)
+    return decode_package(_process_factory, raw, sender_names)
+
+
+def _prewarm_process():
+    """ Importe les modules de décodage dans un processus de décodage avant son premier paquet """
+    global _process_factory
+    if _process_factory is None:
+        _process_factory = DataFactory()
+
+
+def _get_process_context():
+    """ Contexte de création des processus de décodage: un fork du UI, qui exécute déjà Qt et les fils de
+        réception, pourrait hériter d'un verrou tenu par un autre fil """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class DecodePipeline:
+    """
+        DecodePipeline désérialise et valide les paquets reçus hors du fil du modèle. Les paquets de contrôle sont
+        décodés par un bassin de fils, les paquets de BULK_TYPES d'au moins bulk_threshold octets (Influence Map,
+        regroupements de dessins) et les binaires reconstruits de VeryLargeData par un bassin de processus.
+        Chaque voie rend ses DataObject dans l'ordre d'arrivée. Les états sont toujours dans la voie de contrôle:
+        leur ordre par émetteur est conservé, et un paquet volumineux ne retarde jamais les paquets de contrôle
+        reçus après lui. Chaque paquet reçoit un numéro d'arrivée qui permet de reconnaître un dessin volumineux
+        devenu périmé.
+    """
+    def __init__(self, factory, sender_names, decode_workers=2, bulk_workers=1, bulk_threshold=16 * 1024,
+                 use_processes=True, on_ready=None):
+        self._logger = logging.getLogger(DecodePipeline.__name__)
+        self._factory = factory
+        self._sender_names = sender_names
+        self._bulk_threshold = bulk_threshold
+        self._bulk_workers = bulk_workers
+        self._use_processes = use_processes
+        # on_ready() est appelé dans un fil de décodage lorsqu'un paquet volumineux est prêt
+        self._on_ready = on_ready
+
+        self._executor = ThreadPoolExecutor(max_workers=decode_workers)
+        self._bulk_executor = None
+        # Voies: deque de (future, taille du paquet, numéro d'arrivée) dans l'ordre d'arrivée
+        self._lanes = {LANE_CONTROL: deque(), LANE_BULK: deque()}
+        self._next_order = 0
+
+    def _get_bulk_executor(self):
+        """ Crée le bassin de la voie volumineuse à son premier paquet """
+        if self._bulk_executor is None:
+            if self._use_processes:
+                try:
+                    self._bulk_executor = ProcessPoolExecutor(max_workers=self._bulk_workers,
+                                                              mp_context=_get_process_context())
+                except (TypeError, ValueError, OSError):
+                    # Sans mp_context (Python < 3.7), le bassin serait créé par fork
+                    self._use_threads_for_bulk()
+            else:
+                self._bulk_executor = ThreadPoolExecutor(max_workers=self._bulk_workers)
+        return self._bulk_executor
+
+    def prewarm(self):
+        """ Démarre les processus de décodage pour que le premier paquet volumineux n'attende pas leur création """
+        if not self._use_processes:
+            return
+        try:
+            executor = self._get_bulk_executor()
+            if self._use_processes:
+                for _ in range(self._bulk_workers):
+                    executor.submit(_prewarm_process)
+        except (BrokenProcessPool, OSError, RuntimeError):
+            self._use_threads_for_bulk()
+
+    def _use_threads_for_bulk(self):
+        """ Remplace un bassin de processus défaillant par un bassin de fils """
+        self._logger.warning('DISTRIB: decode processes unavailable, bulk packets are decoded by threads')
+        self._use_processes = False
+        self._bulk_executor = ThreadPoolExecutor(max_workers=self._bulk_workers)
+
+    def submit(self, raw):
+        """ Ajoute un paquet brut à décoder dans la voie correspondant à son type """
+        if len(raw) < self._bulk_threshold or peek_packet(raw)[1] not in BULK_TYPES:
+            self._lanes[LANE_CONTROL].append((self._executor.submit(decode_package, self._factory, raw,
+                                                                    self._sender_names), len(raw),
+                                               self._take_order()))
+        else:
+            self.submit_bulk(raw)
+
+    def submit_bulk(self, raw):
+        """ Ajoute un paquet brut à la voie volumineuse, quelle que soit sa taille """
+        future = None
+        if self._use_processes:
+            try:
+                future = self._get_bulk_executor().submit(_decode_in_process, bytes(raw), dict(self._sender_names),
+                                                          self._factory.get_sender_trust())
+            except (BrokenProcessPool, OSError, RuntimeError):
+                self._use_threads_for_bulk()
+        if future is None:
+            future = self._get_bulk_executor().submit(decode_package, self._factory, raw, self._sender_names)
+        if self._on_ready is not None:
+            future.add_done_callback(lambda _: self._on_ready())
+        self._lanes[LANE_BULK].append((future, len(raw), self._take_order()))
+
+    def _take_order(self):
+        order = self._next_order
+        self._next_order += 1
+        return order
+
+    def wait_control(self, timeout=None):
+        """ Attend que les paquets de contrôle soumis soient décodés """
+        wait([future for future, _, _ in self._lanes[LANE_CONTROL]], timeout)
+
+    def has_pending(self):
+        return bool(self._lanes[LANE_CONTROL] or self._lanes[LANE_BULK])
+
+    def pop_ready(self):
+        """ Retire les paquets décodés en tête de chaque voie, voie de contrôle d'abord.
+            Retourne une liste de (DataObject ou None, taille du paquet, exception ou None, numéro d'arrivée). """
+        ready = []
+        for lane_name in (LANE_CONTROL, LANE_BULK):
+            lane = self._lanes[lane_name]
+            while lane and lane[0][0].done():
+                future, nbytes, order = lane.popleft()
+                error = future.exception()
+                if isinstance(error, BrokenProcessPool) and self._use_processes:
+                    self._use_threads_for_bulk()
+                ready.append((None if error is not None else future.result(), nbytes, error, order))
+        return ready
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+        if self._bulk_executor is not None:
+            self._bulk_executor.shutdown(wait=False)
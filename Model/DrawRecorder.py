@@ -0,0 +1,195 @@
+# Under MIT License, see LICENSE.txt
+
+from threading import Lock
+from time import time
+
+from Model.DataObject.BaseDataObject import CheckedPackage
+
+__author__ = 'RoboCupULaval'
+
+INFINITE = float('inf')
+
+
+class _IntervalNode:
+    """ Noeud d'un arbre d'intervalles centré """
+    __slots__ = ['center', 'by_start', 'by_end', 'left', 'right']
+
+    def __init__(self, center, by_start, by_end, left, right):
+        self.center = center
+        self.by_start = by_start
+        self.by_end = by_end
+        self.left = left
+        self.right = right
+
+
+class DrawIntervalIndex:
+    """
+        Arbre d'intervalles centré statique sur des enregistrements [début, fin, paquet] (intervalles [début, fin[).
+        La recherche des enregistrements actifs à un temps donné se fait en O(log n + k). Les fins peuvent être
+        raccourcies après la construction: l'arbre retourne alors un sur-ensemble qui est filtré.
+    """
+    def __init__(self, records):
+        self._records = records
+        # La liste peut continuer de grandir après la construction, seuls les premiers éléments sont indexés
+        self._size = len(records)
+        self._root = self._build(list(range(self._size)))
+
+    def __len__(self):
+        return self._size
+
+    def _build(self, indexes):
+        if not indexes:
+            return None
+        records = self._records
+        points = sorted(records[index][0] for index in indexes)
+        center = points[len(points) // 2]
+        left, middle, right = [], [], []
+        for index in indexes:
+            start, end = records[index][0], records[index][1]
+            if end <= center and start < center:
+                left.append(index)
+            elif start > center:
+                right.append(index)
+            else:
+                middle.append(index)
+        by_start = sorted(middle, key=lambda index: records[index][0])
+        # La fin au moment de la construction est conservée: une fin raccourcie ensuite ne change pas l'ordre
+        by_end = sorted(((records[index][1], index) for index in middle), reverse=True)
+        return _IntervalNode(center, by_start, by_end, self._build(left), self._build(right))
+
+    def query(self, p_time):
+        """ Récupère les index (ordre d'ajout) des enregistrements actifs au temps donné """
+        records = self._records
+        found = []
+        node = self._root
+        while node is not None:
+            if p_time < node.center:
+                for index in node.by_start:
+                    if records[index][0] > p_time:
+                        break
+                    found.append(index)
+                node = node.left
+            else:
+                for end, index in node.by_end:
+                    if end <= p_time:
+                        break
+                    found.append(index)
+                node = node.right
+        return sorted(index for index in found if records[index][0] <= p_time < records[index][1])
+
+    def get_active(self, p_time):
+        return [self._records[index] for index in self.query(p_time)]
+
+
+class DrawChunk:
+    """
+        Bloc de dessins d'une session: les enregistrements qui commencent dans le bloc, indexés, et ceux des blocs
+        précédents encore ouverts au début du bloc. Les dessins actifs à un temps du bloc sont donc trouvés sans
+        lire les blocs précédents.
+    """
+    def __init__(self, open_records, records):
+        self._open_records = open_records
+        self._index = DrawIntervalIndex(records)
+
+    def get_active(self, p_time):
+        active = [record for record in self._open_records if record[0] <= p_time < record[1]]
+        active.extend(self._index.get_active(p_time))
+        return active
+
+
+class DrawRecorder:
+    """
+        DrawRecorder conserve chaque dessin reçu de StrategyIA sous forme d'enregistrement [début, fin, paquet,
+        numéro], la fin étant le début plus le timeout du dessin (infinie pour un timeout nul) et le numéro
+        l'ordre de réception. (début, numéro) identifie un enregistrement. Un dessin unique par filtre termine le
+        dessin précédent du même type et du même filtre. Passé max_duration, un dessin sans fin est oublié, sauf
+        le dernier dessin unique de chaque filtre: l'enregistrement est élagué dès que sa taille double, même si
+        aucune lecture n'a lieu. L'index d'intervalles est reconstruit paresseusement: les dessins ajoutés depuis
+        la dernière construction sont parcourus linéairement tant qu'ils restent peu nombreux.
+    """
+    # Proportion de dessins hors index au-delà de laquelle l'index est reconstruit
+    _REBUILD_RATIO = 0.125
+    _REBUILD_MIN = 256
+    # Nombre minimal de dessins avant un élagage à l'enregistrement
+    _PRUNE_MIN = 1024
+
+    def __init__(self, max_duration=30 * 60):
+        self._max_duration = max_duration
+        self._records = []
+        self._index = DrawIntervalIndex([])
+        self._open_by_key = dict()
+        self._next_seq = 0
+        self._prune_size = self._PRUNE_MIN
+        self._lock = Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+    @staticmethod
+    def to_package(draw):
+        """ Convertit un DataObject de dessin en paquet compact, déjà validé """
+        return CheckedPackage(name=draw.name, version=draw.version, type=draw.type, link=draw.link,
+                              data=dict(draw.data))
+
+    def record(self, draws, timestamp=None):
+        """ Enregistre un lot de DataObject de dessin reçus au temps donné """
+        if timestamp is None:
+            timestamp = time()
+        with self._lock:
+            for draw in draws:
+                timeout = draw.data.get('timeout', 0)
+                record = [timestamp, timestamp + timeout if timeout else INFINITE, self.to_package(draw),
+                          self._next_seq]
+                self._next_seq += 1
+                if draw.is_unique_per_filter:
+                    key = type(draw).__name__, draw.filter
+                    previous = self._open_by_key.get(key)
+                    if previous is not None and previous[1] > timestamp:
+                        previous[1] = timestamp
+                    self._open_by_key[key] = record
+                self._records.append(record)
+            if len(self._records) >= self._prune_size:
+                self._prune()
+                # L'index est reconstruit à la prochaine lecture
+                self._index = DrawIntervalIndex([])
+
+    def _prune(self):
+        """ Oublie les dessins terminés ou sans fin plus vieux que max_duration """
+        if self._max_duration is not None and self._records:
+            cutoff = self._records[-1][0] - self._max_duration
+            open_unique = set(id(record) for record in self._open_by_key.values())
+            self._records = [record for record in self._records
+                             if record[1] >= cutoff and
+                             (record[1] != INFINITE or record[0] >= cutoff or id(record) in open_unique)]
+        self._prune_size = max(self._PRUNE_MIN, 2 * len(self._records))
+
+    def _rebuild_if_needed(self):
+        """ Reconstruit l'index lorsque trop de dessins ont été ajoutés depuis la dernière construction """
+        pending = len(self._records) - len(self._index)
+        if pending > max(self._REBUILD_MIN, len(self._index) * self._REBUILD_RATIO):
+            self._prune()
+            self._index = DrawIntervalIndex(self._records)
+
+    def get_active(self, p_time):
+        """ Récupère les enregistrements [début, fin, paquet, numéro] actifs au temps donné, dans l'ordre de
+            réception """
+        with self._lock:
+            self._rebuild_if_needed()
+            active = self._index.get_active(p_time)
+            active.extend(record for record in self._records[len(self._index):]
+                          if record[0] <= p_time < record[1])
+            return active
+
+    def get_records(self):
+        """ Récupère la liste des enregistrements [début, fin, paquet, numéro] triés par début """
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records = []
+            self._index = DrawIntervalIndex([])
+            self._open_by_key = dict()
+            self._next_seq = 0
+            self._prune_size = self._PRUNE_MIN
@@ -1,37 +1,63 @@
 # Under MIT License, see LICENSE.txt
 
-from collections import deque
-from datetime import datetime
-from datetime import timedelta
+from time import time, monotonic
 
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+from Model.SnapshotRecorder import SnapshotRecorder
+from Model.TimerWheel import TimerWheel
+from Model.VisionMerger import VisionMerger
 
 __author__ = 'RoboCupULaval'
 
 
+class _FrameNotifier(QObject):
+    """ Porte le signal de frames reçus du fil de réception vers le fil de l'interface """
+    frames_ready = pyqtSignal()
+
+
 class FrameModel:
     """
-        FrameModel est un modèle qui gère les données provenant du système de vision. FrameModel possède
-        un récupérateur de données du module de vision (Frame Catcher) pour ensuite mettre à jour les
-        positions des objets mobiles sur la vue du terrain (Screen View).
+        FrameModel est un modèle qui gère les données provenant du système de vision. Le fil de réception de la
+        vision signale l'arrivée de frames (au plus une mise à jour en attente), FrameModel les récupère alors
+        pour mettre à jour les positions des objets mobiles sur la vue du terrain (Screen View). Les objets qui
+        ne sont plus détectés sont cachés par un balayage de leurs échéances (TimerWheel).
     """
+    # Délai après lequel un objet non détecté est caché (secondes)
+    DETECTION_TIMEOUT = 1.0
+    # Précision des échéances de détection (secondes)
+    DETECTION_RESOLUTION = 0.1
+
     def __init__(self, controller=None):
         self._controller = controller
         self._vision = None
         self._recorder = None
 
         # Initialisation des variables de données
-        self._max_data_queue = 1
-        self._data_queue_received = deque(maxlen=self._max_data_queue)
-        self._current_frame = None
-
-        # Initialisation des variables pour le frame catcher
-        self._last_frame_caught_time = datetime.min
-        self._frame_catcher_update_rate = 100.0        # Fréquence d'update en Hz
-        self._frame_catcher_timer = QTimer()
-
-        self._ball_last_detected_time = datetime.min
-        self._robots_last_detected_time = {'blue': {}, 'yellow': {}}
+        self._snapshot_recorder = SnapshotRecorder()
+        self._current_snapshot = None
+
+        # Fusion des caméras du direct, l'enregistreur conserve les instantanés déjà fusionnés
+        self._merger = VisionMerger()
+
+        # Réveil par le fil de réception: une seule mise à jour en attente à la fois
+        self._notifier = _FrameNotifier()
+        self._notifier.frames_ready.connect(self._catching_frame, Qt.QueuedConnection)
+        self._update_is_pending = False
+        self._last_frame_caught_time = None
+
+        # Lecture de l'enregistreur: aucun frame n'arrive du réseau, les instantanés sont lus à la cadence
+        # de la vue
+        self._playback_update_rate = 30.0        # Fréquence d'update en Hz
+        self._playback_timer = QTimer()
+        self._playback_timer.timeout.connect(self._playing_frame)
+
+        # Échéances de détection de la balle ('ball',) et des robots (couleur, id)
+        self._detection_wheel = TimerWheel(self.DETECTION_TIMEOUT, self.DETECTION_RESOLUTION)
+        self._detection_timer = QTimer()
+        self._detection_timer.timeout.connect(self._sweep_detections)
+        # t_capture de la dernière détection affichée de chaque robot
+        self._applied_captures = dict()
 
         # Contrôleur
         self._recorder_is_enable = False
@@ -40,98 +66,137 @@ class FrameModel:
         self._vision = server
 
     def start(self):
-        """ Initialise le timer pour récupérer """
-        self._frame_catcher_timer.timeout.connect(self._catching_frame)
-        self._frame_catcher_timer.start(self._frequency_to_milliseconds_int(self._frame_catcher_update_rate))
-
-    def _update_is_in_progress(self):
-        """ Vérifie si la mise à jour des données est terminée pour éviter une erreur de récursivité """
-        if datetime.now() - self._last_frame_caught_time > timedelta(seconds=1 / self._frame_catcher_update_rate):
-            return False
-        else:
-            return True
+        """ Branche le réveil du modèle sur la réception des frames de la vision """
+        self._vision.frame_listener = self._notify_frames
 
+    def _notify_frames(self):
+        """ Appelé dans le fil de réception: demande une mise à jour si aucune n'est déjà en attente """
+        if not self._update_is_pending:
+            self._update_is_pending = True
+            self._notifier.frames_ready.emit()
 
     def _catching_frame(self):
-        """ Récupère le dernier frame reçu, le met à jour et le sauvegarde """
-        if not self._update_is_in_progress():
-            frames = self._get_last_frames()
-            #if not self._frame_has_been_processed(frame):
-            for frame in frames:
-                self._last_frame_caught_time = datetime.now()
-                self._update_view_screen_mobs(datetime.now(), frame)
-                if frame.geometry.field.field_width != 0:
-                    self._update_field_size(frame)
-
-
-    def _get_last_frames(self):
-        """ Récupère le dernier frame de la vision ou de l'enregistreur """
-        if not self._recorder_is_enable:
-            return self._vision.get_latest_frames()
-        else:
-            return [self._recorder.get_last_frame()]
-
-    def _update_field_size(self, frame):
+        """ Récupère les derniers frames reçus, les fusionne en un instantané, le met à jour et le sauvegarde """
+        if self._recorder_is_enable:
+            # La mise à jour reste en attente: le direct ne réveille plus le modèle jusqu'à la fin de la lecture
+            return
+        # Les frames reçus à partir d'ici demandent une nouvelle mise à jour
+        self._update_is_pending = False
+        snapshot = self._merger.merge(self._vision.get_latest_frames())
+        if snapshot is not None and snapshot.camera_ids:
+            self._snapshot_recorder.append(snapshot, time())
+        self._show_snapshot(snapshot)
+
+    def reset_vision(self):
+        """ Oublie les détections fusionnées, avant une relecture ou un saut dans une relecture """
+        self._merger.reset()
+        self._applied_captures.clear()
+
+    def _playing_frame(self):
+        """ Récupère l'instantané et les dessins au temps de lecture de l'enregistreur et les met à jour """
+        snapshot = self._recorder.get_last_frame()
+        draws = self._recorder.get_draws_if_changed()
+        if draws is not None:
+            self._controller.replace_draws_on_screen(draws)
+        self._show_snapshot(snapshot)
+
+    def _show_snapshot(self, snapshot):
+        """ Met à jour la vue avec l'instantané, un seul temps monotone est utilisé pour tout le lot """
+        if snapshot is not None:
+            now = monotonic()
+            self._last_frame_caught_time = now
+            self._update_view_screen_mobs(snapshot, now)
+            if snapshot.field is not None:
+                self._update_field_size(snapshot.field)
+
+    def _update_field_size(self, field):
         """ Mise à jour des données de dimensions du terrain"""
-        self._controller.set_field_size(frame.geometry.field)
+        self._controller.set_field_size(field)
 
-    def _update_view_screen_mobs(self, ftime, frame):
+    def _update_view_screen_mobs(self, snapshot, now):
         """ Mise à jour des données de la vue des objets mobiles  """
-        if not self._recorder_is_enable:
-            frame_pkg = ftime, frame
-            self._data_queue_received.append(frame_pkg)
-        self._current_frame = frame
-        self._update_view_screen_ball()
+        self._current_snapshot = snapshot
+        self._update_view_screen_ball(now)
 
-        self._update_view_screen_robot('blue')
-        self._update_view_screen_robot('yellow')
+        self._update_view_screen_robot('blue', now)
+        self._update_view_screen_robot('yellow', now)
+        self._start_detection_timer()
 
-    def _update_view_screen_ball(self):
+    def _update_view_screen_ball(self, now):
         """ Mise à jour des données de la vue de la balle """
-        balls = self._current_frame.detection.balls
-        if len(balls) > 0:
-            self._ball_last_detected_time = datetime.now()
-            self._controller.set_ball_pos_on_screen(balls[0].x, balls[0].y)
-
-        # Only one frame out of 4 have the ball's geometry
-        if datetime.now() - self._ball_last_detected_time > timedelta(seconds=1):
-            self._controller.hide_ball()
-
-    def _update_view_screen_robot(self, team_color):
-        """ Mise à jour des données de la vue des robots"""
-
-        if team_color == 'yellow':
-            detected_robots = self._current_frame.detection.robots_yellow
-        elif team_color == 'blue':
-            detected_robots = self._current_frame.detection.robots_blue
-
-        for info_bot in detected_robots:
-            bot_id = info_bot.robot_id
-            x = info_bot.x
-            y = info_bot.y
-            theta = info_bot.orientation
-            self._controller.set_robot_pos_on_screen(bot_id, team_color, (x, y), theta)
-            self._robots_last_detected_time[team_color][bot_id] = datetime.now()
-
-        for id, last_detection_time in self._robots_last_detected_time[team_color].items():
-            if datetime.now() - last_detection_time > timedelta(seconds=1):
-                self._controller.hide_mob(id, team_color)
-
+        # Only one frame out of 4 have the ball's geometry, la balle est cachée par le balayage des échéances
+        ball = self._current_snapshot.ball
+        if ball is not None:
+            self._detection_wheel.touch(('ball',), now)
+            self._controller.set_ball_pos_on_screen(ball[0], ball[1], self._current_snapshot.t_capture)
+
+    def _update_view_screen_robot(self, team_color, now):
+        """ Mise à jour des données de la vue des robots, une détection déjà affichée (même t_capture) n'est pas
+            réappliquée """
+        touch = self._detection_wheel.touch
+        applied_captures = self._applied_captures
+        for bot_id, (x, y, theta, _, t_capture) in self._current_snapshot.robots[team_color].items():
+            key = team_color, bot_id
+            if applied_captures.get(key) != t_capture:
+                applied_captures[key] = t_capture
+                self._controller.set_robot_pos_on_screen(bot_id, team_color, (x, y), theta, t_capture)
+            touch(key, now)
+
+    def _start_detection_timer(self):
+        """ Démarre le balayage des échéances de détection s'il y a des objets à surveiller """
+        if len(self._detection_wheel) and not self._detection_timer.isActive():
+            self._detection_timer.start(int(self.DETECTION_RESOLUTION * 1000))
+
+    def _sweep_detections(self):
+        """ Cache les objets qui n'ont pas été détectés depuis DETECTION_TIMEOUT, le balayage s'arrête lorsqu'il
+            ne reste plus d'objet visible """
+        for key in self._detection_wheel.sweep(monotonic()):
+            if key[0] == 'ball':
+                self._controller.hide_ball()
+            else:
+                self._applied_captures.pop(key, None)
+                self._controller.hide_mob(key[1], key[0])
+        if not len(self._detection_wheel):
+            self._detection_timer.stop()
 
     def enable_recorder(self):
         """ Activer l'enregistreur sur le modèle de frame """
         if self._recorder is not None:
-            self._recorder.init(frames=self._data_queue_received)
+            # Les index des instantanés ne doivent pas changer pendant la lecture
+            self._snapshot_recorder.hold()
+            self._recorder.close_session()
+            self._recorder.init(snapshots=self._snapshot_recorder)
             self._recorder_is_enable = True
+            self._playback_timer.start(self._frequency_to_milliseconds_int(self._playback_update_rate))
 
     def disable_recorder(self):
         """ Désactiver l'enregistreur sur le modèle de frame """
         if self._recorder is not None:
             self._recorder_is_enable = False
+            self._playback_timer.stop()
+            self._snapshot_recorder.release()
+            # Reprend le direct avec les frames reçus pendant la lecture
+            self._notifier.frames_ready.emit()
+
+    def set_recorder_retention(self, **kwargs):
+        """ Change la rétention de l'enregistrement (max_duration, max_count, max_bytes, downsample_after...) """
+        self._snapshot_recorder.set_retention(**kwargs)
+
+    def get_recorder_retention(self):
+        return self._snapshot_recorder.get_retention()
+
+    def get_recorder_chunk_columns(self):
+        """ Récupère une copie des colonnes de l'enregistrement, pour la sauvegarde d'une session """
+        return self._snapshot_recorder.get_chunk_columns()
+
+    def get_recorder_footprint(self):
+        """ Récupère l'empreinte mémoire de l'enregistrement (octets, instantanés, durée) """
+        return self._snapshot_recorder.get_footprint()
 
     def is_connected(self):
         """ Détermine si le modèle a reçu des données de la vision depuis au moins 1 seconde """
-        if datetime.now() - self._last_frame_caught_time < timedelta(seconds=1):
+        if self._last_frame_caught_time is not None and \
+                monotonic() - self._last_frame_caught_time < self.DETECTION_TIMEOUT:
             return True
         return False
 
@@ -143,4 +208,4 @@ class FrameModel:
     @staticmethod
     def _frequency_to_milliseconds_int(frequency):
         """ Convertit une fréquence en millisecondes en format int """
-        return 1 / frequency * 1000
+        return int(1 / frequency * 1000)
@@ -0,0 +1,64 @@
+# Under MIT License, see LICENSE.txt
+
+from Communication.IngestQueue import IngestQueue, POLICY_LOSSLESS, POLICY_DROP_OLDEST, POLICY_LATEST_PER_KEY, \
+    POLICY_SAMPLE
+from Model.DataObject.WireFormat import peek_packet
+
+__author__ = 'RoboCupULaval'
+
+"""
+    Classes de paquets de StrategyIA dans la file de réception (IngestQueue) du DataInModel:
+
+        control         HandShake, états, GameState, PlayInfo, géométrie: priorité haute, sans perte
+        large           fragments de VeryLargeData: priorité moyenne, le plus ancien est jeté lorsque la voie est
+                        pleine
+        log             logging et graphiques: priorité moyenne, échantillonnés lorsque la voie est pleine
+        draw            dessins et regroupements de dessins: le plus ancien est jeté lorsque la voie est pleine
+        draw_latest     dessins uniques par filtre (is_unique_per_filter): seul le dernier par émetteur et filtre
+                        est gardé
+        unknown         paquets dont l'entête est illisible: priorité basse, le plus ancien est jeté lorsque la
+                        voie est pleine
+"""
+
+LANE_CONTROL = 'control'
+LANE_LARGE = 'large'
+LANE_LOG = 'log'
+LANE_DRAW = 'draw'
+LANE_DRAW_LATEST = 'draw_latest'
+LANE_UNKNOWN = 'unknown'
+
+LOG_TYPES = range(0, 1000)
+PLOT_TYPES = frozenset((1099,))
+LARGE_TYPES = frozenset((2000,))
+DRAW_TYPES = range(3000, 4000)
+# Types dont la classe déclare is_unique_per_filter (DrawMultiplePointsDataIn, DrawInfluenceMapDataIn)
+LATEST_PER_FILTER_TYPES = frozenset((3005, 3007))
+
+
+def classify_packet(raw):
+    """ Range un paquet brut dans sa voie à partir de son entête, sans le décoder """
+    sender, p_type, link = peek_packet(raw)
+    if p_type is None:
+        return LANE_UNKNOWN, None
+    if p_type in LARGE_TYPES:
+        return LANE_LARGE, None
+    if p_type in LATEST_PER_FILTER_TYPES:
+        return LANE_DRAW_LATEST, (sender, p_type, link)
+    if p_type in DRAW_TYPES:
+        return LANE_DRAW, None
+    if p_type in LOG_TYPES or p_type in PLOT_TYPES:
+        return LANE_LOG, None
+    return LANE_CONTROL, None
+
+
+def create_ingest_queue(draw_capacity=1024, latest_capacity=256, log_capacity=512, log_sample_every=4,
+                        large_capacity=256, unknown_capacity=64):
+    """ Crée la file de réception bornée des paquets de StrategyIA """
+    queue = IngestQueue(classify_packet)
+    queue.add_lane(LANE_CONTROL, priority=0, policy=POLICY_LOSSLESS)
+    queue.add_lane(LANE_LARGE, priority=1, policy=POLICY_DROP_OLDEST, capacity=large_capacity)
+    queue.add_lane(LANE_LOG, priority=1, policy=POLICY_SAMPLE, capacity=log_capacity, sample_every=log_sample_every)
+    queue.add_lane(LANE_DRAW, priority=2, policy=POLICY_DROP_OLDEST, capacity=draw_capacity)
+    queue.add_lane(LANE_DRAW_LATEST, priority=2, policy=POLICY_LATEST_PER_KEY, capacity=latest_capacity)
+    queue.add_lane(LANE_UNKNOWN, priority=3, policy=POLICY_DROP_OLDEST, capacity=unknown_capacity)
+    return queue
@@ -0,0 +1,202 @@
+# Under MIT License, see LICENSE.txt
+
+import logging
+import os
+from bisect import bisect_left
+from collections import namedtuple
+from heapq import merge
+from threading import Lock
+
+import numpy as np
+
+__author__ = 'RoboCupULaval'
+
+LEVELS = range(0, 6)
+
+LogRecord = namedtuple('LogRecord', ['seq', 'time', 'level', 'sender', 'text'])
+
+
+class _LevelIndex:
+    """ Numéros de séquence d'un niveau dans l'ordre croissant, les plus anciens sont retirés par le début """
+    def __init__(self):
+        self.seqs = []
+        self.start = 0
+
+    def append(self, seq):
+        self.seqs.append(seq)
+
+    def evict_before(self, first_seq):
+        self.start = bisect_left(self.seqs, first_seq, self.start)
+        if self.start > len(self.seqs) // 2:
+            del self.seqs[:self.start]
+            self.start = 0
+
+    def since(self, seq):
+        return self.seqs[bisect_left(self.seqs, seq, self.start):]
+
+    def last(self, count):
+        return self.seqs[max(self.start, len(self.seqs) - count):]
+
+
+class LogStore:
+    """
+        Journal borné des messages de logging. Chaque message est un enregistrement compact dans des colonnes de
+        capacité fixe (temps, niveau, émetteur, position et longueur du texte) dont le texte est écrit dans une
+        arène d'octets circulaire. Les messages reçoivent des numéros de séquence croissants qui servent de
+        curseur aux lectures incrémentales, et un index par niveau donne les k derniers messages filtrés sans
+        parcourir l'historique. Lorsque la capacité ou l'arène est pleine, les plus anciens messages sont retirés
+        par bloc et, si spill_path est donné, ajoutés à un fichier texte avec rotation (spill_path.1, ...).
+    """
+    _O_NOFOLLOW = getattr(os, 'O_NOFOLLOW', 0)
+
+    def __init__(self, capacity=20000, arena_size=4 * 1024 * 1024, block_size=512, spill_path=None,
+                 spill_max_bytes=8 * 1024 * 1024, spill_backups=2):
+        self._logger = logging.getLogger(LogStore.__name__)
+        self._capacity = capacity
+        self._block_size = min(block_size, capacity)
+        # Un message plus long est tronqué pour qu'un message ne vide jamais l'arène à lui seul
+        self._max_text_bytes = arena_size // 16
+        self._spill_path = spill_path
+        self._spill_max_bytes = spill_max_bytes
+        self._spill_backups = spill_backups
+        self._lock = Lock()
+
+        self._time = np.empty(capacity, dtype=np.float64)
+        self._level = np.empty(capacity, dtype=np.int8)
+        self._sender = np.empty(capacity, dtype=np.int32)
+        # Position absolue dans l'arène (modulo arena_size) et longueur du texte encodé en UTF-8
+        self._offset = np.empty(capacity, dtype=np.int64)
+        self._length = np.empty(capacity, dtype=np.int32)
+        self._arena = bytearray(arena_size)
+        self._arena_end = 0
+
+        self._senders = []
+        self._sender_ids = dict()
+        self._levels = {level: _LevelIndex() for level in LEVELS}
+        self._first_seq = 0
+        self._next_seq = 0
+        self._spilled = 0
+
+    # === ÉCRITURE ===
+    def append(self, timestamp, level, sender, text):
+        """ Ajoute un message et retourne son numéro de séquence """
+        encoded = text.encode('utf-8')[:self._max_text_bytes]
+        if level not in self._levels:
+            level = 0
+        with self._lock:
+            self._make_room(len(encoded))
+            seq = self._next_seq
+            slot = seq % self._capacity
+            self._time[slot] = timestamp
+            self._level[slot] = level
+            self._sender[slot] = self._get_sender_id(sender)
+            self._offset[slot] = self._arena_end
+            self._length[slot] = len(encoded)
+            self._write_arena(encoded)
+            self._levels[level].append(seq)
+            self._next_seq += 1
+        return seq
+
+    def _get_sender_id(self, sender):
+        try:
+            return self._sender_ids[sender]
+        except KeyError:
+            self._sender_ids[sender] = len(self._senders)
+            self._senders.append(sender)
+            return self._sender_ids[sender]
+
+    def _write_arena(self, encoded):
+        arena_size = len(self._arena)
+        pos = self._arena_end % arena_size
+        first = min(len(encoded), arena_size - pos)
+        self._arena[pos:pos + first] = encoded[:first]
+        self._arena[:len(encoded) - first] = encoded[first:]
+        self._arena_end += len(encoded)
+
+    def _read_arena(self, offset, length):
+        arena_size = len(self._arena)
+        pos = offset % arena_size
+        first = min(length, arena_size - pos)
+        encoded = bytes(self._arena[pos:pos + first]) + bytes(self._arena[:length - first])
+        return encoded.decode('utf-8', errors='ignore')
+
+    def _make_room(self, nbytes):
+        """ Retire un bloc des plus anciens messages si la capacité ou l'arène ne suffit pas """
+        while self._first_seq < self._next_seq and \
+                (self._next_seq - self._first_seq >= self._capacity or
+                 self._arena_end + nbytes - self._offset[self._first_seq % self._capacity] > len(self._arena)):
+            self._evict(min(self._block_size, self._next_seq - self._first_seq))
+
+    def _evict(self, count):
+        if self._spill_path is not None:
+            self._spill([self._get_record(seq) for seq in range(self._first_seq, self._first_seq + count)])
+        self._first_seq += count
+        for index in self._levels.values():
+            index.evict_before(self._first_seq)
+
+    def _spill(self, records):
+        """ Ajoute les messages retirés au fichier de débordement, avec rotation au-delà de spill_max_bytes """
+        text = ''.join(record.text + '\n' for record in records).encode('utf-8')
+        try:
+            if os.path.exists(self._spill_path) and \
+                    os.path.getsize(self._spill_path) + len(text) > self._spill_max_bytes:
+                self._rotate_spill()
+            # Le fichier est recréé après une rotation: ne pas suivre un lien symbolique placé à sa place
+            fd = os.open(self._spill_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | self._O_NOFOLLOW, 0o600)
+            with os.fdopen(fd, 'ab') as f:
+                f.write(text)
+            self._spilled += len(records)
+        except OSError as e:
+            self._logger.warning('SPILL: ({}) {}'.format(type(e).__name__, e))
+
+    def _rotate_spill(self):
+        for backup in range(self._spill_backups, 0, -1):
+            source = self._spill_path if backup == 1 else '{}.{}'.format(self._spill_path, backup - 1)
+            if os.path.exists(source):
+                os.replace(source, '{}.{}'.format(self._spill_path, backup))
+        if not self._spill_backups:
+            os.remove(self._spill_path)
+
+    # === LECTURE ===
+    def _get_record(self, seq):
+        slot = seq % self._capacity
+        return LogRecord(seq, float(self._time[slot]), int(self._level[slot]), self._senders[self._sender[slot]],
+                         self._read_arena(int(self._offset[slot]), int(self._length[slot])))
+
+    def read_since(self, cursor, levels=None):
+        """ Récupère les messages de numéro >= cursor, filtrés par niveaux si donnés.
+            Retourne ([LogRecord, ...], curseur de la prochaine lecture). """
+        with self._lock:
+            cursor = max(cursor, self._first_seq)
+            if levels is None:
+                seqs = range(cursor, self._next_seq)
+            else:
+                seqs = merge(*[self._levels[level].since(cursor) for level in levels if level in self._levels])
+            return [self._get_record(seq) for seq in seqs], self._next_seq
+
+    def read_last(self, count, levels=None):
+        """ Récupère les count derniers messages, filtrés par niveaux si donnés, du plus ancien au plus récent """
+        with self._lock:
+            if levels is None:
+                seqs = range(max(self._first_seq, self._next_seq - count), self._next_seq)
+            else:
+                seqs = list(merge(*[self._levels[level].last(count) for level in levels
+                                    if level in self._levels]))[-count:]
+            return [self._get_record(seq) for seq in seqs]
+
+    def get_cursor(self):
+        """ Curseur du prochain message, pour ne lire ensuite que les nouveaux messages """
+        return self._next_seq
+
+    def get_stats(self):
+        with self._lock:
+            first_offset = self._offset[self._first_seq % self._capacity] if self._first_seq < self._next_seq \
+                else self._arena_end
+            return {'records': self._next_seq - self._first_seq,
+                    'first_seq': self._first_seq,
+                    'next_seq': self._next_seq,
+                    'arena_bytes': int(self._arena_end - first_offset),
+                    'spilled': self._spilled}
+
+    def __len__(self):
+        return self._next_seq - self._first_seq
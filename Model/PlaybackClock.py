@@ -0,0 +1,109 @@
+# Under MIT License, see LICENSE.txt
+
+from threading import Lock
+from time import monotonic
+
+__author__ = 'RoboCupULaval'
+
+RATE_MIN = 0.1
+RATE_MAX = 16.0
+
+
+class PlaybackClock:
+    """
+        PlaybackClock donne le temps de lecture (temps de l'enregistrement, secondes epoch) de l'enregistreur.
+        Le temps avance selon l'horloge monotone multipliée par la vitesse (RATE_MIN à RATE_MAX) et reste borné à
+        l'intervalle enregistré: la lecture se met en pause à la fin. Tous les lecteurs (vision, états, dessins,
+        curseur de la vue) lisent ce même temps. Les méthodes sont thread-safe.
+    """
+    def __init__(self, rate=1.0):
+        self._lock = Lock()
+        self._rate = self._clamp_rate(rate)
+        self._is_playing = False
+        self._start = 0.0
+        self._end = 0.0
+        # Temps de lecture au dernier changement et temps monotone correspondant
+        self._anchor_time = 0.0
+        self._anchor_monotonic = monotonic()
+
+    @staticmethod
+    def _clamp_rate(rate):
+        return min(RATE_MAX, max(RATE_MIN, float(rate)))
+
+    def _current(self, now):
+        """ Temps de lecture courant, le verrou doit être acquis """
+        if not self._is_playing:
+            return self._anchor_time
+        current = self._anchor_time + (now - self._anchor_monotonic) * self._rate
+        if current >= self._end:
+            self._is_playing = False
+            self._anchor_time = self._end
+            self._anchor_monotonic = now
+            return self._end
+        return current
+
+    def _set_anchor(self, p_time, now):
+        self._anchor_time = min(self._end, max(self._start, p_time))
+        self._anchor_monotonic = now
+
+    def set_range(self, start, end, p_time=None):
+        """ Borne le temps de lecture à l'intervalle enregistré et se place à p_time (le début par défaut) """
+        with self._lock:
+            self._start, self._end = start, max(start, end)
+            self._set_anchor(start if p_time is None else p_time, monotonic())
+
+    def get_range(self):
+        return self._start, self._end
+
+    def get_time(self):
+        """ Récupère le temps de lecture courant """
+        with self._lock:
+            return self._current(monotonic())
+
+    def get_ratio(self):
+        """ Récupère la position du temps de lecture dans l'intervalle, entre 0 et 1 """
+        with self._lock:
+            if self._end <= self._start:
+                return 0.0
+            return (self._current(monotonic()) - self._start) / (self._end - self._start)
+
+    def seek(self, p_time):
+        """ Se place au temps donné, sans changer l'état de lecture """
+        with self._lock:
+            self._set_anchor(p_time, monotonic())
+
+    def seek_ratio(self, ratio):
+        """ Se place à une proportion (0 à 1) de l'intervalle """
+        with self._lock:
+            self._set_anchor(self._start + (self._end - self._start) * min(1.0, max(0.0, ratio)), monotonic())
+
+    def play(self):
+        with self._lock:
+            now = monotonic()
+            current = self._current(now)
+            if current >= self._end:
+                # Relire depuis le début une fois la fin atteinte
+                current = self._start
+            self._set_anchor(current, now)
+            self._is_playing = True
+
+    def pause(self):
+        with self._lock:
+            now = monotonic()
+            self._set_anchor(self._current(now), now)
+            self._is_playing = False
+
+    def is_playing(self):
+        with self._lock:
+            self._current(monotonic())
+            return self._is_playing
+
+    def set_rate(self, rate):
+        """ Change la vitesse de lecture sans saut du temps de lecture """
+        with self._lock:
+            now = monotonic()
+            self._set_anchor(self._current(now), now)
+            self._rate = self._clamp_rate(rate)
+
+    def get_rate(self):
+        return self._rate
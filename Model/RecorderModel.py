@@ -1,7 +1,11 @@
 # Under MIT License, see LICENSE.txt
 
 import logging
-from datetime import datetime, timedelta
+
+from Model.DataObject.BaseDataObject import CheckedPackage
+from Model.PlaybackClock import PlaybackClock
+from Model.SessionFile import SessionReader, SessionPrefetcher, SessionFileError, SECTION_GAME_STATE, SECTION_ROBOT_STATE, \
+    SECTION_PLAY_INFO
 
 __author__ = 'RoboCupULaval'
 
@@ -19,6 +23,8 @@ def recorder_checker(func):
 
 class RecorderModel:
     is_installed = False
+    # Nombre de blocs décompressés conservés pour une session ouverte (toutes sections confondues)
+    SESSION_CACHE_SIZE = 64
 
     def __init__(self, debug=False):
         """
@@ -31,22 +37,23 @@ class RecorderModel:
             self._logger.setLevel(logging.INFO)
 
         # === DATA ===
-        self._data_frames = None
+        self._snapshots = None
         self._game_state = None
         self._robot_state = None
         self._auto_state = None
-
+        self._draws = None
+        self._active_draws = None
+        self._session = None
+        self._prefetcher = None
+
+        # Index absolus des instantanés: premier de la fenêtre, fin (exclue) et instantané au temps de lecture
+        self._first_index = None
+        self._end_index = None
         self._cursor_pst = None
-        self._nb_frame = None
 
         # === TIME ===
-        self._time_lapse = timedelta(seconds=30)
-        self._time_max = None
-        self._time_min = None
-        self._last_req_time = None
-
-        # === CTRL ===
-        self._ctrl_play = False
+        # Horloge de lecture unique: vision, états, dessins et curseur de la vue lisent son temps
+        self._clock = PlaybackClock()
 
         # == INIT ==
         self._init_logger()
@@ -54,36 +61,63 @@ class RecorderModel:
     # === INIT ===
     def init(self, **kwargs):
         """ Initialise le Recorder """
-        if 'frames' in kwargs.keys():
-            self._init_time_var(kwargs['frames'][-1][0])
-            self._init_frames(kwargs['frames'])
-            self._logger.debug('INIT: frames')
+        if 'snapshots' in kwargs.keys() and len(kwargs['snapshots']):
+            self._init_snapshots(kwargs['snapshots'])
+            self._logger.debug('INIT: snapshots')
 
         if 'game_state' in kwargs.keys() and 'robot_state' in kwargs.keys():
-            self._init_states(kwargs['game_state'], kwargs['robot_state'])
+            self._init_states(kwargs['game_state'], kwargs['robot_state'], kwargs.get('play_info'))
             self._logger.debug('INIT: game_state and robot_state')
 
-        if self._data_frames is not None and self._game_state is not None and self._robot_state is not None:
-            RecorderModel.is_installed = True
+        if 'draws' in kwargs.keys():
+            self._draws = kwargs['draws']
+            self._active_draws = None
+            self._logger.debug('INIT: draws')
 
-    def _init_frames(self, data_frame):
-        """ Initialise les paramètres de données """
-        data_frame = list(data_frame)
-        self._nb_frame = self._get_limit_frame_number(data_frame)
-        # DATA SAVE
-        self._data_frames = data_frame[self._nb_frame:]
+        if self._snapshots is not None and self._game_state is not None and self._robot_state is not None:
+            RecorderModel.is_installed = True
 
-        self._cursor_pst = self._nb_frame
-        self._last_req_time = datetime.now()
+    def _init_snapshots(self, snapshots):
+        """ Initialise la fenêtre de lecture sur les instantanés enregistrés (SnapshotRecorder ou SessionVision) """
+        self._snapshots = snapshots
+        self._first_index = snapshots.get_first_index()
+        self._end_index = snapshots.get_end_index()
+        self._clock.pause()
+        self._clock.set_range(snapshots.get_time(self._first_index), snapshots.get_time(self._end_index - 1))
+        self._cursor_pst = self._first_index
 
-    def _init_states(self, game_state, robot_state):
+    def _init_states(self, game_state, robot_state, play_info=None):
         self._game_state = game_state
         self._robot_state = robot_state
-
-    def _init_time_var(self, p_time):
-        """ Initialise les paramètres de temps """
-        self._time_max = p_time
-        self._time_min = self._time_max - self._time_lapse
+        self._auto_state = play_info
+
+    def open_session(self, path):
+        """ Ouvre un fichier de session sauvegardé, les blocs sont chargés à la demande pendant la lecture """
+        session = SessionReader(path, cache_size=self.SESSION_CACHE_SIZE)
+        if not len(session.get_vision()):
+            session.close()
+            raise SessionFileError('{}: aucun instantané de vision'.format(path))
+        self.close_session()
+        self._session = session
+        self._prefetcher = SessionPrefetcher(session)
+        self.init(snapshots=session.get_vision(),
+                  game_state=session.get_records(SECTION_GAME_STATE),
+                  robot_state=session.get_records(SECTION_ROBOT_STATE),
+                  play_info=session.get_records(SECTION_PLAY_INFO),
+                  draws=session.get_draws())
+        self._logger.debug('INIT: session {}'.format(path))
+
+    def close_session(self):
+        """ Ferme le fichier de session ouvert """
+        if self._prefetcher is not None:
+            self._prefetcher.stop()
+            self._prefetcher = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def is_session_open(self):
+        return self._session is not None
 
     def _init_logger(self):
         """ Initialisation du logger """
@@ -95,102 +129,109 @@ class RecorderModel:
         self._logger.debug('INIT: Logger')
 
     # === GETTER / SETTER ===
-    def _get_limit_frame_number(self, data):
-        """ Récupère le nombre de frame en fonction du laps de temps """
-        iterator = -1
-        while True:
-            try:
-                if data[iterator][0] < self._time_min:
-                    return iterator
-            except IndexError:
-                iterator += 1
-                self._time_min = data[iterator][0]
-                return iterator
-            iterator -= 1
+    def _get_cursor_time(self):
+        return self._clock.get_time()
+
+    def _get_index_at(self, p_time):
+        """ Index de l'instantané en vigueur au temps donné, borné à la fenêtre de lecture """
+        return min(self._end_index - 1, max(self._first_index, self._snapshots.search_time(p_time)))
+
+    def _prefetch(self, p_time):
+        """ Indique le curseur au préchargement des blocs de la session ouverte """
+        if self._prefetcher is not None:
+            self._prefetcher.set_cursor(p_time)
 
     # === PUBLIC METHOD ===
     @recorder_checker
     def play(self):
         """ Met le Recorder en mode lecture """
-        self._ctrl_play = True
+        self._clock.play()
 
     @recorder_checker
     def pause(self):
         """ Met le Recorder en mode pause """
-        self._ctrl_play = False
+        self._clock.pause()
+
+    @recorder_checker
+    def step(self, nb_frame):
+        """ Déplace le temps de lecture de nb_frame instantanés (négatif pour reculer) """
+        index = self._get_index_at(self._clock.get_time()) + nb_frame
+        index = min(self._end_index - 1, max(self._first_index, index))
+        self._clock.seek(self._snapshots.get_time(index))
 
     @recorder_checker
     def back(self):
         """ Recule le cursor d'un frame """
-        index = self._cursor_pst - 1
-        if index >= self._nb_frame:
-            self._cursor_pst = index
+        self.step(-1)
 
     @recorder_checker
     def rewind(self):
         """ Recule le cursor au début """
-        self._cursor_pst = self._nb_frame
+        self._clock.seek_ratio(0)
 
     @recorder_checker
     def forward(self):
         """ Avance le curseur d'un frame """
-        index = self._cursor_pst + 1
-        if index <= -1:
-            self._cursor_pst = index
+        self.step(1)
 
     @recorder_checker
     def skip_to(self, percentage):
-        """ Met le Recorder une position spécifique """
-        index = self._nb_frame - self._nb_frame * percentage / 100
-        self._cursor_pst = int(index)
+        """ Met le Recorder à la position en temps correspondant au pourcentage de la fenêtre """
+        self._clock.seek_ratio(percentage / 100)
+
+    @recorder_checker
+    def skip_to_time(self, p_time):
+        """ Met le Recorder au temps donné (secondes epoch) """
+        self._clock.seek(p_time)
+
+    @recorder_checker
+    def set_rate(self, rate):
+        """ Change la vitesse de lecture (RATE_MIN à RATE_MAX) """
+        self._clock.set_rate(rate)
+
+    def get_rate(self):
+        return self._clock.get_rate()
 
     @recorder_checker
     def get_last_frame(self):
-        """ Recupère le frame en fonction du curseur de lecture du Recorder """
-        if not self._ctrl_play:
-            self._last_req_time = datetime.now()
-            return self._data_frames[self._cursor_pst][1]
-        else:
-            if self._cursor_pst == -1:
-                self._last_req_time = datetime.now()
-                return self._data_frames[-1][1]
-            else:
-                dt_frame = self._data_frames[self._cursor_pst + 1][0] - self._data_frames[self._cursor_pst][0]
-                dt_get = datetime.now() - self._last_req_time
-                if dt_get > dt_frame:
-                    self._last_req_time = datetime.now()
-                    self._cursor_pst += 1
-                return self._data_frames[self._cursor_pst][1]
+        """ Recupère l'instantané (WorldSnapshot) en vigueur au temps de l'horloge de lecture, sans passer par les
+            instantanés intermédiaires """
+        p_time = self._clock.get_time()
+        self._cursor_pst = self._get_index_at(p_time)
+        self._prefetch(p_time)
+        return self._snapshots.get_snapshot(self._cursor_pst)
 
     @recorder_checker
     def get_game_state(self):
-        if self._last_req_time is not None:
-            return self._game_state[self._data_frames[self._cursor_pst][0]]
-        else:
-            return self._game_state[-1]
+        return self._game_state[self._get_cursor_time()]
 
     @recorder_checker
     def get_robot_state(self):
-        if self._last_req_time is not None:
-            return self._robot_state[self._data_frames[self._cursor_pst][0]]
-        else:
-            return self._robot_state[-1]
+        return self._robot_state[self._get_cursor_time()]
 
     @recorder_checker
     def get_auto_state(self):
-        if self._last_req_time is not None:
-            return self._auto_state[self._data_frames[self._cursor_pst][0]]
-        else:
-            return self._auto_state[-1]
+        return self._auto_state[self._get_cursor_time()]
+
+    @recorder_checker
+    def get_draws_if_changed(self):
+        """ Récupère les paquets des dessins actifs au temps du curseur, None s'ils n'ont pas changé. Le timeout
+            est retiré: c'est le curseur qui détermine la durée d'affichage. """
+        if self._draws is None:
+            return None
+        active = self._draws.get_active(self._get_cursor_time())
+        # Un bloc de session relu après son éviction du cache donne de nouveaux objets: les enregistrements sont
+        # comparés par (début, numéro)
+        active_keys = [(record[0], record[3]) for record in active]
+        if active_keys == self._active_draws:
+            return None
+        self._active_draws = active_keys
+        return [CheckedPackage(record[2], data=dict(record[2]['data'], timeout=0)) for record in active]
 
     @recorder_checker
     def get_cursor_percentage(self):
-        """ Recupère le pourcentage de frame """
-        if self._cursor_pst is not None and self._nb_frame is not None:
-            value = 100 - (self._cursor_pst + 1) / self._nb_frame * 100
-            return value
-        else:
-            return 0
+        """ Recupère la position du temps de lecture en pourcentage de la fenêtre """
+        return int(self._clock.get_ratio() * 100)
 
     def is_playing(self):
-        return self._ctrl_play
+        return self._clock.is_playing()
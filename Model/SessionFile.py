@@ -0,0 +1,444 @@
+# Under MIT License, see LICENSE.txt
+
+import io
+import os
+import pickle
+import struct
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+from threading import Thread, Event, Lock
+
+import numpy as np
+
+from Model.DrawRecorder import DrawChunk
+from Model.SnapshotRecorder import SnapshotChunk
+from Model.StateTimeline import TimelineChunk, build_timeline_chunks, thaw_state
+
+__author__ = 'RoboCupULaval'
+
+"""
+    Fichier de session de l'enregistreur (.udsession).
+
+    entête              4s H        b'UDSF', version du format
+    blocs               zlib(pickle) selon le genre de la section:
+                                     vision       colonnes {nom: ndarray}
+                                     records      (temps, valeurs)
+                                     timeline     (temps, keyframe, deltas), un état complet puis les changements
+                                     draw         (ouverts, [[début, fin, paquet, numéro]]): les dessins des
+                                                  blocs précédents encore actifs au début du bloc, puis
+                                                  ceux qui commencent dans le bloc. Le dernier temps du
+                                                  bloc est la plus grande fin
+    pied de page        zlib(pickle) {'meta': {...}, 'kinds': {section: genre},
+                                      'chunks': [(section, premier temps, dernier temps, position, taille,
+                                                  lignes), ...]}
+    fin                 Q I 4s      position et taille du pied de page, b'UDSF'
+
+    Le pied de page sert d'index en temps: un lecteur n'a qu'à le lire pour se positionner, puis ne
+    décompresse que les blocs demandés. Un fichier de session peut venir d'ailleurs: le lecteur ne reconstruit
+    que les types de données de la session (conteneurs de base, tableaux numpy, CheckedPackage).
+"""
+
+SECTION_VISION = 'vision'
+SECTION_GAME_STATE = 'game_state'
+SECTION_ROBOT_STATE = 'robot_state'
+SECTION_PLAY_INFO = 'play_info'
+SECTION_PLOT = 'plot'
+SECTION_DRAW = 'draw'
+
+KIND_VISION = 'vision'
+KIND_RECORDS = 'records'
+KIND_TIMELINE = 'timeline'
+KIND_DRAW = 'draw'
+
+_MAGIC = b'UDSF'
+_FORMAT_VERSION = 3
+_HEADER = struct.Struct('<4sH')
+_TRAILER = struct.Struct('<QI4s')
+
+
+# Classes qu'un fichier de session peut reconstruire, toute autre classe le rend invalide
+_ALLOWED_CLASSES = frozenset([
+    ('builtins', 'set'),
+    ('builtins', 'frozenset'),
+    ('builtins', 'complex'),
+    ('builtins', 'bytearray'),
+    ('collections', 'OrderedDict'),
+    ('numpy', 'dtype'),
+    ('numpy', 'ndarray'),
+    ('numpy._core.numeric', '_frombuffer'),
+    ('numpy.core.numeric', '_frombuffer'),
+    ('numpy._core.multiarray', '_reconstruct'),
+    ('numpy.core.multiarray', '_reconstruct'),
+    ('numpy._core.multiarray', 'scalar'),
+    ('numpy.core.multiarray', 'scalar'),
+    ('Model.DataObject.BaseDataObject', 'CheckedPackage'),
+])
+
+
+class SessionFileError(Exception):
+    """ Fichier de session invalide ou illisible """
+    pass
+
+
+class _SessionUnpickler(pickle.Unpickler):
+    """ Unpickler limité aux classes de _ALLOWED_CLASSES """
+    def find_class(self, module, name):
+        if (module, name) not in _ALLOWED_CLASSES:
+            raise pickle.UnpicklingError('classe {}.{} interdite dans une session'.format(module, name))
+        return super().find_class(module, name)
+
+
+def _load_payload(data):
+    """ Décompresse et désérialise un bloc ou le pied de page d'un fichier de session """
+    return _SessionUnpickler(io.BytesIO(zlib.decompress(data))).load()
+
+
+class SessionWriter:
+    """
+        SessionWriter écrit un fichier de session: les colonnes de vision d'un SnapshotRecorder, des sections
+        d'enregistrements (temps, valeur) découpées en blocs de chunk_rows et des lignes du temps d'états avec
+        une keyframe toutes les keyframe_interval secondes. Chaque bloc est compressé indépendamment.
+    """
+    def __init__(self, path, chunk_rows=1024, keyframe_interval=5.0, compress_level=6):
+        self._path = path
+        self._chunk_rows = chunk_rows
+        self._keyframe_interval = keyframe_interval
+        self._compress_level = compress_level
+        self._chunks = []
+        self._kinds = dict()
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION))
+
+    def _write_chunk(self, section, kind, first_time, last_time, rows, payload):
+        self._kinds[section] = kind
+        data = zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), self._compress_level)
+        self._chunks.append((section, first_time, last_time, self._file.tell(), len(data), rows))
+        self._file.write(data)
+
+    def write_vision(self, chunk_columns):
+        """ Écrit les colonnes de vision (voir SnapshotRecorder.get_chunk_columns) """
+        for columns in chunk_columns:
+            if len(columns['time']):
+                self._write_chunk(SECTION_VISION, KIND_VISION, float(columns['time'][0]), float(columns['time'][-1]),
+                                  len(columns['time']), columns)
+
+    def write_records(self, section, records):
+        """ Écrit une section d'enregistrements [(temps, valeur)] triés par temps """
+        records = list(records)
+        for start in range(0, len(records), self._chunk_rows):
+            block = records[start:start + self._chunk_rows]
+            # Un memo par bloc: les sous-états partagés ne sont sérialisés qu'une fois par bloc
+            memo = dict()
+            times = [timestamp for timestamp, _ in block]
+            values = [thaw_state(value, memo) for _, value in block]
+            self._write_chunk(section, KIND_RECORDS, times[0], times[-1], len(block), (times, values))
+
+    def write_timeline(self, section, records):
+        """ Écrit une section d'états complets [(temps, état)] triés par temps sous forme de keyframes et de
+            deltas, une keyframe par bloc """
+        for times, keyframe, deltas in build_timeline_chunks(records, self._keyframe_interval):
+            self._write_chunk(section, KIND_TIMELINE, times[0], times[-1], len(times), (times, keyframe, deltas))
+
+    def write_draws(self, records):
+        """ Écrit les dessins [[début, fin, paquet, numéro]] triés par début (voir DrawRecorder.get_records).
+            Chaque bloc contient aussi les dessins des blocs précédents encore ouverts à son début. """
+        records = list(records)
+        open_records = []
+        for start in range(0, len(records), self._chunk_rows):
+            block = [list(record) for record in records[start:start + self._chunk_rows]]
+            first_time = block[0][0]
+            open_records = [record for record in open_records if record[1] > first_time]
+            self._write_chunk(SECTION_DRAW, KIND_DRAW, first_time, max(record[1] for record in block), len(block),
+                              (open_records, block))
+            open_records = open_records + block
+
+    def abort(self):
+        """ Ferme et supprime un fichier de session dont l'écriture a échoué """
+        self._file.close()
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+
+    def close(self, meta=None):
+        """ Écrit l'index en pied de page et ferme le fichier """
+        footer = zlib.compress(pickle.dumps({'meta': meta or dict(), 'kinds': self._kinds, 'chunks': self._chunks},
+                                            protocol=pickle.HIGHEST_PROTOCOL))
+        footer_pos = self._file.tell()
+        self._file.write(footer)
+        self._file.write(_TRAILER.pack(footer_pos, len(footer), _MAGIC))
+        self._file.close()
+
+
+class SessionReader:
+    """
+        SessionReader ouvre un fichier de session sans le charger: seul l'index en pied de page est lu. Les blocs
+        sont décompressés à la demande et conservés dans un cache LRU de cache_size blocs, ce qui borne la
+        mémoire peu importe la durée de la session.
+    """
+    def __init__(self, path, cache_size=16):
+        self._path = path
+        self._file = open(path, 'rb')
+        self._lock = Lock()
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        try:
+            self._meta, self._kinds, chunks = self._read_footer()
+        except (struct.error, zlib.error, pickle.UnpicklingError, EOFError, ValueError, KeyError, TypeError) as e:
+            self._file.close()
+            raise SessionFileError('{}: {}'.format(path, e))
+        self._sections = dict()
+        for section, first_time, last_time, position, length, rows in chunks:
+            self._sections.setdefault(section, []).append((first_time, last_time, position, length, rows))
+        self._section_first_times = {section: [first_time for first_time, _, _, _, _ in index]
+                                     for section, index in self._sections.items()}
+
+    def _read_footer(self):
+        magic, version = _HEADER.unpack(self._file.read(_HEADER.size))
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError('entête {} version {} inconnue'.format(magic, version))
+        self._file.seek(-_TRAILER.size, os.SEEK_END)
+        footer_pos, footer_length, magic = _TRAILER.unpack(self._file.read(_TRAILER.size))
+        if magic != _MAGIC:
+            raise ValueError('fin de fichier invalide, session incomplète')
+        self._file.seek(footer_pos)
+        footer = _load_payload(self._file.read(footer_length))
+        return footer['meta'], footer['kinds'], footer['chunks']
+
+    def get_meta(self):
+        return self._meta
+
+    def get_sections(self):
+        return list(self._sections.keys())
+
+    def get_section_index(self, section):
+        """ Récupère l'index d'une section [(premier temps, dernier temps, position, taille, lignes)] """
+        return self._sections.get(section, [])
+
+    def load_chunk(self, section, chunk_index):
+        """ Récupère le contenu décompressé d'un bloc, par le cache LRU """
+        key = section, chunk_index
+        with self._lock:
+            payload = self._cache.get(key)
+            if payload is not None:
+                self._cache.move_to_end(key)
+                return payload
+            _, _, position, length, _ = self._sections[section][chunk_index]
+            self._file.seek(position)
+            data = self._file.read(length)
+        try:
+            payload = _load_payload(data)
+        except (zlib.error, pickle.UnpicklingError, EOFError, ValueError, TypeError) as e:
+            raise SessionFileError('{}: bloc {} de {} invalide: {}'.format(self._path, chunk_index, section, e))
+        kind = self._kinds[section]
+        if kind == KIND_VISION:
+            payload = SnapshotChunk.from_columns(payload)
+        elif kind == KIND_TIMELINE:
+            payload = TimelineChunk(*payload)
+        elif kind == KIND_DRAW:
+            payload = DrawChunk(*payload)
+        with self._lock:
+            self._cache[key] = payload
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return payload
+
+    def prefetch(self, p_time, lookahead):
+        """ Charge dans le cache les blocs de toutes les sections qui couvrent [p_time, p_time + lookahead] """
+        for section, index in self._sections.items():
+            current = max(0, bisect_right(self._section_first_times[section], p_time) - 1)
+            for chunk_index in range(current, len(index)):
+                first_time, last_time, _, _, _ = index[chunk_index]
+                if first_time > p_time + lookahead:
+                    break
+                if chunk_index == current or last_time >= p_time:
+                    self.load_chunk(section, chunk_index)
+
+    def get_vision(self):
+        return SessionVision(self)
+
+    def get_records(self, section):
+        """ Récupère l'accès à une section d'enregistrements ou d'états (ligne du temps) """
+        if self._kinds.get(section) == KIND_TIMELINE:
+            return SessionTimeline(self, section)
+        return SessionRecords(self, section)
+
+    def get_draws(self):
+        return SessionDraws(self)
+
+    def close(self):
+        with self._lock:
+            self._cache.clear()
+            self._file.close()
+
+
+class SessionPrefetcher(Thread):
+    """
+        SessionPrefetcher décompresse en arrière-plan les blocs qui suivent le curseur de lecture pour que la
+        lecture et les déplacements courts ne décompressent jamais dans le fil de l'affichage.
+    """
+    def __init__(self, reader, lookahead=10.0):
+        super().__init__(name=SessionPrefetcher.__name__)
+        self.daemon = True
+        self._reader = reader
+        self._lookahead = lookahead
+        self._cursor_time = None
+        self._event_cursor = Event()
+        self._is_running = True
+        self.start()
+
+    def set_cursor(self, p_time):
+        """ Indique le temps du curseur de lecture """
+        if p_time != self._cursor_time:
+            self._cursor_time = p_time
+            self._event_cursor.set()
+
+    def run(self):
+        while self._is_running:
+            self._event_cursor.wait()
+            self._event_cursor.clear()
+            if not self._is_running:
+                break
+            try:
+                self._reader.prefetch(self._cursor_time, self._lookahead)
+            except (OSError, ValueError, SessionFileError):
+                # Le fichier a été fermé pendant le préchargement, ou il est invalide
+                break
+
+    def stop(self):
+        self._is_running = False
+        self._event_cursor.set()
+        self.join()
+
+
+class SessionVision:
+    """ Accès aux instantanés de vision d'une session avec l'interface de lecture d'un SnapshotRecorder """
+    def __init__(self, reader):
+        self._reader = reader
+        index = reader.get_section_index(SECTION_VISION)
+        self._chunk_first_times = [first_time for first_time, _, _, _, _ in index]
+        self._chunk_starts = []
+        end = 0
+        for _, _, _, _, rows in index:
+            self._chunk_starts.append(end)
+            end += rows
+        self._end = end
+
+    def __len__(self):
+        return self._end
+
+    def get_first_index(self):
+        return 0
+
+    def get_end_index(self):
+        return self._end
+
+    def _locate(self, index):
+        if not 0 <= index < self._end:
+            raise IndexError('{}: index {} hors limite'.format(SessionVision.__name__, index))
+        chunk_index = bisect_right(self._chunk_starts, index) - 1
+        return self._reader.load_chunk(SECTION_VISION, chunk_index), index - self._chunk_starts[chunk_index]
+
+    def get_time(self, index):
+        chunk, row = self._locate(index)
+        return float(chunk.time[row])
+
+    def search_time(self, timestamp):
+        """ Index de la dernière ligne reçue au plus tard au temps donné (la première si aucune) """
+        if not self._end:
+            raise IndexError('{}: aucun instantané enregistré'.format(SessionVision.__name__))
+        chunk_index = max(0, bisect_right(self._chunk_first_times, timestamp) - 1)
+        chunk = self._reader.load_chunk(SECTION_VISION, chunk_index)
+        row = int(np.searchsorted(chunk.time, timestamp, side='right')) - 1
+        return self._chunk_starts[chunk_index] + max(0, row)
+
+    def get_snapshot(self, index):
+        chunk, row = self._locate(index)
+        return chunk.get_snapshot(row)
+
+
+class SessionRecords:
+    """ Accès à une section d'enregistrements d'une session: état en vigueur à un temps ou par index """
+    def __init__(self, reader, section):
+        self._reader = reader
+        self._section = section
+        index = reader.get_section_index(section)
+        self._chunk_first_times = [first_time for first_time, _, _, _, _ in index]
+        self._chunk_rows = [rows for _, _, _, _, rows in index]
+
+    def __len__(self):
+        return sum(self._chunk_rows)
+
+    def __getitem__(self, index):
+        """ Récupère la valeur à l'index (-1 pour la dernière) ou la valeur en vigueur au temps T """
+        if not self._chunk_rows:
+            raise IndexError('{}: section vide'.format(self._section))
+        if isinstance(index, int):
+            if index < 0:
+                index += len(self)
+            for chunk_index, rows in enumerate(self._chunk_rows):
+                if index < rows:
+                    return self._reader.load_chunk(self._section, chunk_index)[1][index]
+                index -= rows
+            raise IndexError('{}: index hors limite'.format(self._section))
+        chunk_index = max(0, bisect_right(self._chunk_first_times, index) - 1)
+        times, values = self._reader.load_chunk(self._section, chunk_index)
+        return values[max(0, bisect_right(times, index) - 1)]
+
+    def get_range(self, start_time, end_time):
+        """ Récupère les (temps, valeur) de l'intervalle [start_time, end_time] """
+        records = []
+        first = max(0, bisect_right(self._chunk_first_times, start_time) - 1)
+        for chunk_index in range(first, len(self._chunk_rows)):
+            if self._chunk_first_times[chunk_index] > end_time:
+                break
+            times, values = self._reader.load_chunk(self._section, chunk_index)
+            records.extend((timestamp, value) for timestamp, value in zip(times, values)
+                           if start_time <= timestamp <= end_time)
+        return records
+
+
+class SessionTimeline:
+    """ Accès à une section d'états d'une session: l'état au temps T est reconstruit à partir de la keyframe de
+        son bloc """
+    def __init__(self, reader, section):
+        self._reader = reader
+        self._section = section
+        index = reader.get_section_index(section)
+        self._chunk_first_times = [first_time for first_time, _, _, _, _ in index]
+        self._chunk_rows = [rows for _, _, _, _, rows in index]
+
+    def __len__(self):
+        return sum(self._chunk_rows)
+
+    def __getitem__(self, index):
+        """ Récupère l'état à l'index (-1 pour le dernier) ou l'état en vigueur au temps T """
+        if not self._chunk_rows:
+            raise IndexError('{}: section vide'.format(self._section))
+        if isinstance(index, int):
+            if index < 0:
+                index += len(self)
+            for chunk_index, rows in enumerate(self._chunk_rows):
+                if 0 <= index < rows:
+                    return self._reader.load_chunk(self._section, chunk_index).get_state(index)
+                index -= rows
+            raise IndexError('{}: index hors limite'.format(self._section))
+        chunk_index = max(0, bisect_right(self._chunk_first_times, index) - 1)
+        return self._reader.load_chunk(self._section, chunk_index).get_state_at(index)
+
+
+class SessionDraws:
+    """ Accès aux dessins d'une session avec l'interface de lecture d'un DrawRecorder. Seul le bloc du temps
+        demandé est lu: il contient les dessins encore ouverts des blocs précédents. """
+    def __init__(self, reader):
+        self._reader = reader
+        self._chunk_first_times = [first_time for first_time, _, _, _, _ in reader.get_section_index(SECTION_DRAW)]
+
+    def get_active(self, p_time):
+        """ Récupère les enregistrements [début, fin, paquet, numéro] actifs au temps donné, dans l'ordre de
+            réception """
+        chunk_index = bisect_right(self._chunk_first_times, p_time) - 1
+        if chunk_index < 0:
+            return []
+        return self._reader.load_chunk(SECTION_DRAW, chunk_index).get_active(p_time)
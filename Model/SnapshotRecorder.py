@@ -0,0 +1,297 @@
+# Under MIT License, see LICENSE.txt
+
+from bisect import bisect_right
+from threading import Thread, Event, Lock
+from time import time
+
+import numpy as np
+
+from Model.VisionMerger import WorldSnapshot
+
+__author__ = 'RoboCupULaval'
+
+TEAMS = ('blue', 'yellow')
+MAX_ROBOT_ID = 16
+
+
+def build_snapshot(t_capture, ball_row, robot_rows):
+    """ Construit un WorldSnapshot à partir d'une ligne de colonnes (NaN pour un objet absent) """
+    ball = None
+    if not np.isnan(ball_row[0]):
+        ball = tuple(ball_row.tolist())
+    robots = dict()
+    for team_index, team_color in enumerate(TEAMS):
+        team_rows = robot_rows[team_index]
+        detected = np.flatnonzero(~np.isnan(team_rows[:, 0]))
+        robots[team_color] = {int(bot_id): tuple(team_rows[bot_id].tolist()) + (t_capture,) for bot_id in detected}
+    return WorldSnapshot(t_capture, [], ball=ball, robots=robots)
+
+
+class SnapshotChunk:
+    """
+        Bloc de capacité fixe de lignes d'instantanés en colonnes préallouées. Une position absente (balle ou
+        robot non détecté) est représentée par NaN.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self.is_downsampled = False
+        # Temps de réception (secondes epoch) et t_capture de la vision
+        self.time = np.empty(capacity, dtype=np.float64)
+        self.t_capture = np.empty(capacity, dtype=np.float64)
+        # ball: x, y, confidence
+        self.ball = np.full((capacity, 3), np.nan, dtype=np.float32)
+        # robots: [ligne, équipe, id] -> x, y, theta, confidence
+        self.robots = np.full((capacity, len(TEAMS), MAX_ROBOT_ID, 4), np.nan, dtype=np.float32)
+
+    def is_full(self):
+        return self.size == self.capacity
+
+    def get_nbytes(self):
+        return self.time.nbytes + self.t_capture.nbytes + self.ball.nbytes + self.robots.nbytes
+
+    def get_columns(self):
+        """ Récupère une copie des colonnes des lignes remplies {nom: ndarray} """
+        return {'time': self.time[:self.size].copy(),
+                't_capture': self.t_capture[:self.size].copy(),
+                'ball': self.ball[:self.size].copy(),
+                'robots': self.robots[:self.size].copy()}
+
+    @classmethod
+    def from_columns(cls, columns):
+        """ Crée un bloc plein à partir de colonnes (voir get_columns) sans les copier """
+        chunk = cls.__new__(cls)
+        chunk.time = columns['time']
+        chunk.t_capture = columns['t_capture']
+        chunk.ball = columns['ball']
+        chunk.robots = columns['robots']
+        chunk.capacity = chunk.size = len(chunk.time)
+        chunk.is_downsampled = False
+        return chunk
+
+    def get_snapshot(self, row):
+        """ Reconstruit le WorldSnapshot d'une ligne avec les champs utilisés par l'affichage """
+        return build_snapshot(float(self.t_capture[row]), self.ball[row].copy(), self.robots[row].copy())
+
+    def downsample(self, step):
+        """ Retourne un bloc compact qui ne garde qu'une ligne sur step """
+        rows = slice(0, self.size, step)
+        chunk = SnapshotChunk(len(range(*rows.indices(self.size))))
+        chunk.time[:] = self.time[rows]
+        chunk.t_capture[:] = self.t_capture[rows]
+        chunk.ball[:] = self.ball[rows]
+        chunk.robots[:] = self.robots[rows]
+        chunk.size = chunk.capacity
+        chunk.is_downsampled = True
+        return chunk
+
+
+class SnapshotRecorder:
+    """
+        SnapshotRecorder enregistre les WorldSnapshot de la vision sous forme de colonnes NumPy, par blocs de
+        chunk_size lignes (quelques centaines d'octets par ligne au lieu d'un paquet protobuf complet).
+        La recherche par temps se fait par searchsorted.
+
+        La rétention est bornée par une durée (secondes), un nombre d'instantanés et un budget d'octets. Un fil
+        d'entretien évince les plus vieux blocs et, si demandé, ne garde qu'un instantané sur downsample_step
+        dans les blocs plus vieux que downsample_after secondes. L'entretien est suspendu (hold) pendant la
+        lecture pour que les index des lignes restent valides.
+    """
+    def __init__(self, chunk_size=4096, max_duration=20 * 60, max_count=None, max_bytes=256 * 1024 * 1024,
+                 downsample_after=None, downsample_step=4, maintenance_interval=1.0):
+        assert chunk_size > 0, "{}.chunk_size: {} doit être > 0".format(SnapshotRecorder.__name__, chunk_size)
+        self._chunk_size = chunk_size
+        self._max_duration = None
+        self._max_count = None
+        self._max_bytes = None
+        self._downsample_after = None
+        self._downsample_step = None
+        self.set_retention(max_duration, max_count, max_bytes, downsample_after, downsample_step)
+
+        self._chunks = []
+        # Index absolu de la première ligne de chaque bloc et temps de sa première ligne
+        self._chunk_starts = []
+        self._chunk_first_times = []
+        self._end = 0
+        self._lock = Lock()
+        self._hold = False
+
+        self._maintenance_interval = maintenance_interval
+        self._event_stop = Event()
+        self._thread = None
+        if maintenance_interval is not None:
+            self._thread = Thread(target=self._run_maintenance, name=SnapshotRecorder.__name__, daemon=True)
+            self._thread.start()
+
+    def __len__(self):
+        with self._lock:
+            return self._end - self._get_first_index()
+
+    def set_retention(self, max_duration=None, max_count=None, max_bytes=None, downsample_after=None,
+                      downsample_step=4):
+        """ Change la rétention (None pour ne pas borner), appliquée par le prochain entretien """
+        assert max_duration is None or max_duration > 0, \
+            "{}.max_duration: {} doit être > 0".format(SnapshotRecorder.__name__, max_duration)
+        assert max_count is None or max_count > 0, \
+            "{}.max_count: {} doit être > 0".format(SnapshotRecorder.__name__, max_count)
+        assert max_bytes is None or max_bytes > 0, \
+            "{}.max_bytes: {} doit être > 0".format(SnapshotRecorder.__name__, max_bytes)
+        assert downsample_step > 1, \
+            "{}.downsample_step: {} doit être > 1".format(SnapshotRecorder.__name__, downsample_step)
+        self._max_duration = max_duration
+        self._max_count = max_count
+        self._max_bytes = max_bytes
+        self._downsample_after = downsample_after
+        self._downsample_step = downsample_step
+
+    def get_retention(self):
+        return {'max_duration': self._max_duration,
+                'max_count': self._max_count,
+                'max_bytes': self._max_bytes,
+                'downsample_after': self._downsample_after,
+                'downsample_step': self._downsample_step}
+
+    def _get_first_index(self):
+        return self._chunk_starts[0] if self._chunk_starts else self._end
+
+    def get_first_index(self):
+        """ Index absolu de la plus vieille ligne conservée """
+        with self._lock:
+            return self._get_first_index()
+
+    def get_end_index(self):
+        """ Index absolu qui suit la dernière ligne enregistrée """
+        return self._end
+
+    def append(self, snapshot, timestamp):
+        """ Ajoute un instantané reçu au temps donné (secondes epoch) """
+        with self._lock:
+            if not self._chunks or self._chunks[-1].is_full() or self._chunks[-1].is_downsampled:
+                self._chunks.append(SnapshotChunk(self._chunk_size))
+                self._chunk_starts.append(self._end)
+                self._chunk_first_times.append(timestamp)
+            chunk = self._chunks[-1]
+            row = chunk.size
+            chunk.time[row] = timestamp
+            chunk.t_capture[row] = snapshot.t_capture if snapshot.t_capture is not None else np.nan
+            if snapshot.ball is not None:
+                chunk.ball[row] = snapshot.ball
+            for team_index, team_color in enumerate(TEAMS):
+                team_rows = chunk.robots[row, team_index]
+                for bot_id, (x, y, theta, confidence, _) in snapshot.robots[team_color].items():
+                    if 0 <= bot_id < MAX_ROBOT_ID:
+                        team_rows[bot_id] = x, y, theta, confidence
+            chunk.size += 1
+            self._end += 1
+
+    def hold(self):
+        """ Suspend l'entretien, les index des lignes ne changent plus jusqu'au release """
+        with self._lock:
+            self._hold = True
+
+    def release(self):
+        with self._lock:
+            self._hold = False
+
+    def stop(self):
+        """ Termine le fil d'entretien """
+        self._event_stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run_maintenance(self):
+        while not self._event_stop.wait(self._maintenance_interval):
+            self.maintain()
+
+    def maintain(self, now=None):
+        """ Applique la rétention: éviction des plus vieux blocs puis sous-échantillonnage """
+        if now is None:
+            now = time()
+        with self._lock:
+            if self._hold:
+                return
+            self._evict(now)
+            if self._downsample_after is not None:
+                self._downsample(now)
+
+    def _evict(self, now):
+        """ Retire les plus vieux blocs tant qu'une borne de rétention est dépassée, sans toucher au dernier """
+        while len(self._chunks) > 1:
+            if self._max_duration is not None and self._chunk_first_times[1] < now - self._max_duration:
+                pass
+            elif self._max_count is not None and self._end - self._chunk_starts[1] >= self._max_count:
+                pass
+            elif self._max_bytes is not None and self._get_nbytes() > self._max_bytes:
+                pass
+            else:
+                break
+            del self._chunks[0]
+            del self._chunk_starts[0]
+            del self._chunk_first_times[0]
+
+    def _downsample(self, now):
+        """ Compacte les blocs complets plus vieux que downsample_after et renumérote les lignes suivantes """
+        removed = 0
+        for chunk_index, chunk in enumerate(self._chunks):
+            self._chunk_starts[chunk_index] -= removed
+            if chunk.is_downsampled or not chunk.is_full() or chunk.size == 0 or \
+                    chunk.time[chunk.size - 1] >= now - self._downsample_after:
+                continue
+            new_chunk = chunk.downsample(self._downsample_step)
+            self._chunks[chunk_index] = new_chunk
+            removed += chunk.size - new_chunk.size
+        self._end -= removed
+
+    def clear(self):
+        with self._lock:
+            self._chunks = []
+            self._chunk_starts = []
+            self._chunk_first_times = []
+
+    def _locate(self, index):
+        """ Retourne le bloc et la ligne d'un index absolu """
+        if not self._get_first_index() <= index < self._end:
+            raise IndexError('{}: index {} hors limite'.format(SnapshotRecorder.__name__, index))
+        chunk_index = bisect_right(self._chunk_starts, index) - 1
+        return self._chunks[chunk_index], index - self._chunk_starts[chunk_index]
+
+    def get_time(self, index):
+        """ Récupère le temps de réception de la ligne d'index absolu """
+        with self._lock:
+            chunk, row = self._locate(index)
+            return float(chunk.time[row])
+
+    def search_time(self, timestamp):
+        """ Index absolu de la dernière ligne reçue au plus tard au temps donné (la première si aucune) """
+        with self._lock:
+            if not self._chunks:
+                raise IndexError('{}: aucun instantané enregistré'.format(SnapshotRecorder.__name__))
+            chunk_index = max(0, bisect_right(self._chunk_first_times, timestamp) - 1)
+            chunk = self._chunks[chunk_index]
+            row = int(np.searchsorted(chunk.time[:chunk.size], timestamp, side='right')) - 1
+            return self._chunk_starts[chunk_index] + max(0, row)
+
+    def get_snapshot(self, index):
+        """ Reconstruit le WorldSnapshot de la ligne d'index absolu avec les champs utilisés par l'affichage """
+        with self._lock:
+            chunk, row = self._locate(index)
+            return chunk.get_snapshot(row)
+
+    def get_chunk_columns(self):
+        """ Récupère une copie des colonnes de chaque bloc conservé, du plus vieux au plus récent """
+        with self._lock:
+            return [chunk.get_columns() for chunk in self._chunks if chunk.size]
+
+    def _get_nbytes(self):
+        return sum(chunk.get_nbytes() for chunk in self._chunks)
+
+    def get_footprint(self):
+        """ Récupère l'empreinte de l'enregistrement: octets alloués, nombre d'instantanés et durée couverte """
+        with self._lock:
+            duration = 0.0
+            if self._chunks and self._chunks[-1].size:
+                last = self._chunks[-1]
+                duration = float(last.time[last.size - 1]) - self._chunk_first_times[0]
+            return {'bytes': self._get_nbytes(),
+                    'frames': self._end - self._get_first_index(),
+                    'duration': duration}
@@ -0,0 +1,119 @@
+# Under MIT License, see LICENSE.txt
+
+from bisect import bisect_right
+from types import MappingProxyType
+
+__author__ = 'RoboCupULaval'
+
+_MAPPINGS = (dict, MappingProxyType)
+
+
+def thaw_state(value, memo=None):
+    """ Convertit un état immuable (MappingProxyType) en dict en conservant le partage des sous-états """
+    if memo is None:
+        memo = dict()
+    if isinstance(value, _MAPPINGS):
+        thawed = memo.get(id(value))
+        if thawed is None:
+            thawed = {key: thaw_state(sub_value, memo) for key, sub_value in value.items()}
+            memo[id(value)] = thawed
+        return thawed
+    return value
+
+
+def diff_state(previous, state, path=()):
+    """ Retourne les changements (modifiés [(chemin, valeur)], retirés [chemin]) pour passer de previous à state.
+        Les sous-états partagés (même objet) ne sont pas parcourus. """
+    changed, removed = [], []
+    if previous is state:
+        return changed, removed
+    for key, value in state.items():
+        if key not in previous:
+            changed.append((path + (key,), value))
+            continue
+        previous_value = previous[key]
+        if previous_value is value:
+            continue
+        if isinstance(value, _MAPPINGS) and isinstance(previous_value, _MAPPINGS):
+            sub_changed, sub_removed = diff_state(previous_value, value, path + (key,))
+            changed.extend(sub_changed)
+            removed.extend(sub_removed)
+        elif type(previous_value) is not type(value) or previous_value != value:
+            changed.append((path + (key,), value))
+    removed.extend(path + (key,) for key in previous.keys() if key not in state)
+    return changed, removed
+
+
+def apply_delta(state, delta):
+    """ Retourne un nouvel état avec le delta appliqué. Seuls les dictionnaires sur le chemin d'un changement
+        sont copiés, le reste est partagé avec state qui n'est pas modifié. """
+    changed, removed = delta
+    new_state = dict(state)
+    copied = {(): new_state}
+    for path, is_removal, value in [(path, False, value) for path, value in changed] + \
+                                   [(path, True, None) for path in removed]:
+        parent = new_state
+        for depth in range(1, len(path)):
+            sub_path = path[:depth]
+            child = copied.get(sub_path)
+            if child is None:
+                child = dict(parent[path[depth - 1]])
+                parent[path[depth - 1]] = child
+                copied[sub_path] = child
+            parent = child
+        if is_removal:
+            parent.pop(path[-1], None)
+        else:
+            parent[path[-1]] = value
+    return new_state
+
+
+def build_timeline_chunks(records, keyframe_interval):
+    """
+        Découpe des enregistrements [(temps, état complet)] en blocs: un état complet (keyframe) au début de chaque
+        bloc, puis un delta par enregistrement jusqu'à keyframe_interval secondes plus tard.
+        Retourne une liste de (temps, keyframe, deltas) où temps contient le temps de chaque enregistrement.
+    """
+    chunks = []
+    previous = None
+    for timestamp, state in records:
+        if not chunks or timestamp - chunks[-1][0][0] >= keyframe_interval:
+            memo = dict()
+            chunks.append(([timestamp], thaw_state(state, memo), [], memo))
+        else:
+            times, _, deltas, memo = chunks[-1]
+            changed, removed = diff_state(previous, state)
+            times.append(timestamp)
+            deltas.append(([(path, thaw_state(value, memo)) for path, value in changed], removed))
+        previous = state
+    return [(times, keyframe, deltas) for times, keyframe, deltas, _ in chunks]
+
+
+class TimelineChunk:
+    """
+        Bloc d'une ligne du temps: une keyframe suivie de deltas. La reconstruction d'un état part de la keyframe,
+        ou du dernier état reconstruit s'il le précède dans le bloc (lecture séquentielle).
+    """
+    def __init__(self, times, keyframe, deltas):
+        self.times = times
+        self.keyframe = keyframe
+        self.deltas = deltas
+        # (position, état) du dernier état reconstruit, remplacé d'un bloc pour la lecture depuis plusieurs fils
+        self._last = 0, keyframe
+
+    def __len__(self):
+        return len(self.times)
+
+    def get_state(self, position):
+        """ Reconstruit l'état de l'enregistrement à la position donnée dans le bloc """
+        last_position, state = self._last
+        if position < last_position:
+            last_position, state = 0, self.keyframe
+        for delta in self.deltas[last_position:position]:
+            state = apply_delta(state, delta)
+        self._last = position, state
+        return state
+
+    def get_state_at(self, p_time):
+        """ Reconstruit l'état en vigueur au temps donné (le premier si le temps le précède) """
+        return self.get_state(max(0, bisect_right(self.times, p_time) - 1))
@@ -1,140 +1,265 @@
 # Under GNU GPLv3 License, see LICENSE.txt
 
-import logging, copy
+import logging
+from bisect import bisect_right
 from datetime import datetime
+from threading import Lock
+from time import time
+from types import MappingProxyType
+from weakref import WeakSet
 
 __author__ = 'jbecirovski'
 
 
+def freeze_state(state, previous=None):
+    """ Retourne une version immuable (MappingProxyType) de l'état. Les sous-dictionnaires et les valeurs égales à
+        celles de l'état précédent sont partagés avec lui plutôt que copiés. """
+    if state is previous:
+        return previous
+    if isinstance(state, (dict, MappingProxyType)):
+        if not isinstance(previous, MappingProxyType):
+            previous = None
+        frozen = dict()
+        is_unchanged = previous is not None and len(previous) == len(state)
+        for key, value in state.items():
+            previous_value = previous.get(key) if previous is not None else None
+            frozen[key] = freeze_state(value, previous_value)
+            if is_unchanged and (key not in previous or frozen[key] is not previous_value):
+                is_unchanged = False
+        if is_unchanged:
+            return previous
+        return MappingProxyType(frozen)
+    if previous is not None and type(previous) is type(state) and previous == state:
+        return previous
+    return state
+
+
+class _StateStore:
+    """ Listes parallèles des temps et des états, partagées entre un TimeListState et ses copies """
+    def __init__(self, times, states, base=0, lock=None):
+        self.times = times
+        self.states = states
+        # Index absolu du premier élément des listes, les éléments avant start sont évincés
+        self.base = base
+        self.start = 0
+        # Le verrou est partagé avec les listes détachées pour qu'une copie garde le même verrou
+        self.lock = lock or Lock()
+        # Copies figées qui lisent encore ces listes
+        self.copies = WeakSet()
+
+    @property
+    def absolute_end(self):
+        return self.base + len(self.states)
+
+
 class TimeListState:
-    """ BaseTimeList est un état qui est géré sous forme d'une liste indexé par un index et par du temps """
-    def __init__(self, name, default_model, debug=False):
+    """
+        TimeListState est un historique d'états indexé par position et par temps. Les temps (secondes epoch) et
+        les états sont conservés dans deux listes parallèles ordonnées: la recherche par temps se fait par
+        bissection, en réutilisant la position de la dernière recherche pour la lecture séquentielle.
+        Chaque état ajouté complète l'état précédent (fusion superficielle) et est conservé sous forme immuable
+        qui partage les sous-dictionnaires inchangés avec l'état précédent. La rétention est bornée par un
+        nombre d'états (max_count) et/ou une durée en secondes (max_duration).
+        Une copie est une vue figée sur le même historique, bornée au premier et au dernier état au moment de la
+        copie. Lorsque l'éviction de l'historique vivant atteint une copie, celle-ci reçoit ses propres listes.
+    """
+    # Les listes sont compactées lorsque la partie évincée dépasse cette proportion
+    _COMPACT_RATIO = 0.5
+
+    def __init__(self, name, default_model, debug=False, max_count=None, max_duration=None):
         assert isinstance(name, str), "{}.name: {} n'a pas le format attendu (str)".format(TimeListState.__name__, name)
+        assert max_count is None or max_count > 0, \
+            "{}.max_count: {} doit être > 0".format(TimeListState.__name__, max_count)
+        assert max_duration is None or max_duration > 0, \
+            "{}.max_duration: {} doit être > 0".format(TimeListState.__name__, max_duration)
         self._name = name
         self._logger = logging.getLogger(TimeListState.__name__ + '.' + self._name)
         if debug:
             self._logger.setLevel(logging.DEBUG)
         else:
             self._logger.setLevel(logging.INFO)
-        self._state = [Node(default_model)]
+        self._max_count = max_count
+        self._max_duration = max_duration
+
+        self._store = _StateStore([time()], [freeze_state(default_model)])
+        # Index absolus de début et de fin pour une copie figée, None pour l'historique vivant
+        self._start = None
+        self._end = None
+        self._last_position = 0
+
         self._init_logger()
-        self._logger.debug('INIT: default_state: {}'.format(self._state[-1]))
+        self._logger.debug('INIT: default_state: {}'.format(self._store.states[-1]))
 
     def _init_logger(self):
         """ Initialisation du logger """
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(threadName)s - %(levelname)s - %(message)s')
-        ch.setFormatter(formatter)
-        self._logger.addHandler(ch)
+        if not self._logger.handlers:
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.DEBUG)
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(threadName)s - %(levelname)s - %(message)s')
+            ch.setFormatter(formatter)
+            self._logger.addHandler(ch)
         self._logger.debug('INIT: Logger')
 
     def __getitem__(self, index):
-        """ Récupère l'état à l'instant T ou l'index """
+        """ Récupère l'état (immuable) à l'index ou l'état en vigueur au temps T (datetime ou secondes epoch) """
         if isinstance(index, int):
-            self._logger.debug('GET: item with index={}'.format(index))
-            return self._state[index].state
-        elif isinstance(index, datetime):
-            self._logger.debug('GET: item with time={}'.format(index))
-            node = self._get_nearest(index)
-            if node is not None:
-                return node.state
+            with self._store.lock:
+                return self._store.states[self._physical_index(index)]
+        elif isinstance(index, (datetime, float)):
+            with self._store.lock:
+                return self._store.states[self._floor_position(self._to_timestamp(index))]
         else:
             raise IndexError()
 
     def __len__(self):
         """ Retourne le nombre d'éléments de la liste """
-        length = len(self._state)
-        self._logger.debug('GET: Length {}'.format(length))
-        return length
-
-    def _get_nearest(self, time):
-        # TODO - Augmenter la rapidité de l'algorithme
-        # \====> Peut être améliorée en ayant une approche par le milieu puisque les données sont ordonnées
-        # \====> Peut être améliorée en gardant la dernière recherche (recherche locale)
-
-        """ Récupère l'état le plus près du temps donné. L'algorithme parcours la liste élément par élément de la fin
-            vers le début et s'arrête lorsqu'un noeud est temporellement plus près que le noeud suivant. """
-        self._logger.debug('GET: searching nearest node with time = {}'.format(time))
-        nearest = self._state[0]
-        for node in self._state[1:]:
-            if node.time < time:
-                nearest = node
-            else:
-                self._logger.debug('GET: Nearest node is index={} | time={}'.format(nearest.index, nearest.time))
-                return nearest
-
-    def append(self, state):
-        """ Ajoute un paquet de données """
-        self._logger.debug('SET: append => {}'.format(state))
-        self._state[0].state.update()
-        self._state[0] = Node(state)
-        #self._state.append(Node(state, parent=self._state[-1]))
+        with self._store.lock:
+            return self._physical_end() - self._physical_start()
 
-    def copy(self):
-        """ Récupère une copie intégrale du TimeListState pour éviter la corruption de la liste originale """
-        self._logger.debug('GET: copy')
-        new_state = []
-        first_node = Node(self._state[0].state)
-        first_node._index = self._state[0].index
-        first_node._time = copy.deepcopy(self._state[0].time)
-        new_state.append(first_node)
-        for i, node in enumerate(self._state[1:], start=1):
-            new_node = Node(node.state, parent=new_state[i - 1])
-            new_node._index = node.index
-            new_node._time = copy.deepcopy(node.time)
-            new_state.append(new_node)
-        new_time_list_state = TimeListState(self._name, self._state[0])
-        new_time_list_state._state = new_state
-        return new_time_list_state
+    def _physical_start(self):
+        """ Position du premier état conservé dans les listes partagées pour cette vue """
+        if self._start is None:
+            return self._store.start
+        return self._start - self._store.base
 
+    def _physical_end(self):
+        """ Position de fin (exclue) dans les listes partagées pour cette vue """
+        if self._end is None:
+            return len(self._store.states)
+        return self._end - self._store.base
 
-class Node:
-    """
-        Node est un noeud avec un index, temps de création et un lien avec le noeud qui le précède et le suit.
-        /!\ Les Nodes sont en mode read-only
-    """
-    _length = 0
-
-    def __init__(self, state, parent=None):
-        self._index = Node._length
-        Node._length += 1
-        self._prev = parent
-        self._next = None
-        self._time = datetime.now()
-
-        if self._prev is not None:
-            self._prev.next = self
-            self._state = self._prev.state
-            self._state.update(state)
-        else:
-            self._state = state
+    def _physical_index(self, index):
+        """ Convertit un index (négatif accepté) en position dans les listes """
+        start, end = self._physical_start(), self._physical_end()
+        length = end - start
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('{}: index {} hors limite ({})'.format(self._name, index, length))
+        return start + index
 
-    @property
-    def index(self):
-        return self._index
+    @staticmethod
+    def _to_timestamp(p_time):
+        if isinstance(p_time, datetime):
+            return p_time.timestamp()
+        return p_time
 
-    @property
-    def state(self):
-        return self._state.copy()
+    def _floor_position(self, timestamp):
+        """ Position du dernier état ajouté au plus tard au temps donné (le premier si le temps le précède) """
+        store = self._store
+        times = store.times
+        start, end = self._physical_start(), self._physical_end()
+        if start == end:
+            raise IndexError('{}: aucun état conservé'.format(self._name))
+        position = self._last_position - store.base
+        if start <= position < end and times[position] <= timestamp:
+            # Recherche locale: même état ou état suivant en lecture séquentielle
+            if position + 1 == end or timestamp < times[position + 1]:
+                return position
+            if position + 2 == end or timestamp < times[position + 2]:
+                self._last_position = store.base + position + 1
+                return position + 1
+        position = max(start, bisect_right(times, timestamp, start, end) - 1)
+        self._last_position = store.base + position
+        return position
 
-    @property
-    def next(self):
-        return self._next
+    def get_floor(self, p_time):
+        """ Récupère l'état en vigueur au temps donné """
+        with self._store.lock:
+            return self._store.states[self._floor_position(float(self._to_timestamp(p_time)))]
 
-    @next.setter
-    def next(self, node):
-        assert isinstance(node, Node)
-        assert self._next is None
-        self._next = node
+    def get_nearest(self, p_time):
+        """ Récupère l'état dont le temps est le plus près du temps donné """
+        timestamp = float(self._to_timestamp(p_time))
+        with self._store.lock:
+            store = self._store
+            position = self._floor_position(timestamp)
+            if position + 1 < self._physical_end() and \
+                    store.times[position + 1] - timestamp < timestamp - store.times[position]:
+                position += 1
+            return store.states[position]
 
-    @property
-    def prev(self):
-        return self._prev
+    def get_time(self, index):
+        """ Récupère le temps (secondes epoch) de l'état à l'index """
+        with self._store.lock:
+            return self._store.times[self._physical_index(index)]
 
-    @property
-    def time(self):
-        return self._time
+    def get_time_range(self):
+        """ Récupère le temps du premier et du dernier état conservé """
+        with self._store.lock:
+            return self._store.times[self._physical_index(0)], self._store.times[self._physical_index(-1)]
+
+    def get_history(self):
+        """ Récupère la liste des (temps, état) conservés, du plus vieux au plus récent """
+        with self._store.lock:
+            store = self._store
+            start, end = self._physical_start(), self._physical_end()
+            return list(zip(store.times[start:end], store.states[start:end]))
 
-    def __repr__(self):
-        return str(self._state)
+    def append(self, state, timestamp=None):
+        """ Ajoute un paquet de données qui complète l'état précédent """
+        assert self._end is None, "{}: une copie figée n'accepte pas de nouvel état".format(self._name)
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('SET: append => {}'.format(state))
+        if timestamp is None:
+            timestamp = time()
+        else:
+            timestamp = self._to_timestamp(timestamp)
+        store = self._store
+        with store.lock:
+            previous = store.states[-1]
+            # Les temps doivent rester monotones pour la bissection
+            timestamp = max(timestamp, store.times[-1])
+            merged = dict(previous)
+            merged.update(state)
+            store.times.append(timestamp)
+            store.states.append(freeze_state(merged, previous))
+            self._evict(timestamp)
+
+    def _evict(self, now):
+        """ Retire les plus vieux états selon la rétention, en conservant toujours le dernier """
+        store = self._store
+        start = store.start
+        end = len(store.states) - 1
+        if self._max_count is not None:
+            start = max(start, len(store.states) - self._max_count)
+        if self._max_duration is not None:
+            start = max(start, bisect_right(store.times, now - self._max_duration, start) - 1)
+        start = min(start, end)
+        if start == store.start:
+            return
+        # Les copies qui perdraient des états reçoivent leurs propres listes avant l'éviction
+        for frozen in list(store.copies):
+            if frozen._start - store.base < start:
+                frozen._detach()
+        # Libère les états évincés sans déplacer les listes à chaque ajout
+        for position in range(store.start, start):
+            store.states[position] = None
+        store.start = start
+        if start > len(store.states) * self._COMPACT_RATIO:
+            del store.times[:start]
+            del store.states[:start]
+            store.base += start
+            store.start = 0
+
+    def _detach(self):
+        """ Copie les états de la vue figée dans ses propres listes (appelé sous le verrou des listes partagées) """
+        store = self._store
+        start, end = self._physical_start(), self._physical_end()
+        self._logger.debug('SET: detach {} états'.format(end - start))
+        store.copies.discard(self)
+        self._store = _StateStore(store.times[start:end], store.states[start:end], base=self._start, lock=store.lock)
+
+    def copy(self):
+        """ Récupère une vue figée du TimeListState, en O(1), qui ne voit pas les états ajoutés par la suite """
+        self._logger.debug('GET: copy')
+        new_time_list_state = TimeListState.__new__(TimeListState)
+        new_time_list_state.__dict__.update(self.__dict__)
+        with self._store.lock:
+            store = self._store
+            new_time_list_state._store = store
+            if self._end is None:
+                new_time_list_state._start = store.base + store.start
+                new_time_list_state._end = store.absolute_end
+            store.copies.add(new_time_list_state)
+        return new_time_list_state
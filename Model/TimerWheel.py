@@ -0,0 +1,72 @@
+# Under MIT License, see LICENSE.txt
+
+from math import floor
+
+__author__ = 'RoboCupULaval'
+
+
+class TimerWheel:
+    """
+        TimerWheel détecte les clés qui n'ont pas été rafraîchies depuis timeout secondes. Les échéances sont
+        rangées dans des cases de resolution secondes: rafraîchir une clé ne fait que changer son échéance tant
+        qu'elle reste dans la même case, et un balayage ne parcourt que les cases échues. Une clé peut donc
+        expirer jusqu'à resolution secondes après son échéance. Les temps viennent d'une horloge monotone.
+    """
+    def __init__(self, timeout=1.0, resolution=0.1):
+        self._timeout = timeout
+        self._resolution = resolution
+        # clé -> échéance, et case -> clés qui y ont été rangées (une clé rafraîchie peut y être périmée)
+        self._deadlines = dict()
+        self._slot_of = dict()
+        self._slots = dict()
+        self._next_slot = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def _get_slot(self, p_time):
+        return int(floor(p_time / self._resolution))
+
+    def touch(self, key, now):
+        """ Repousse l'échéance de la clé à now + timeout """
+        deadline = now + self._timeout
+        self._deadlines[key] = deadline
+        slot = self._get_slot(deadline)
+        if self._slot_of.get(key) != slot:
+            self._slot_of[key] = slot
+            self._slots.setdefault(slot, []).append(key)
+            if self._next_slot is None or slot < self._next_slot:
+                self._next_slot = slot
+
+    def discard(self, key):
+        """ Retire la clé sans la faire expirer """
+        self._deadlines.pop(key, None)
+        self._slot_of.pop(key, None)
+
+    def sweep(self, now):
+        """ Retire et retourne les clés dont l'échéance est passée """
+        expired = []
+        current = self._get_slot(now)
+        while self._next_slot is not None and self._next_slot <= current:
+            for key in self._slots.pop(self._next_slot, ()):
+                if self._slot_of.get(key) != self._next_slot:
+                    continue
+                if self._deadlines[key] <= now:
+                    expired.append(key)
+                    del self._deadlines[key]
+                    del self._slot_of[key]
+                else:
+                    # Échéance dans la case courante mais pas encore atteinte
+                    self._slots.setdefault(current + 1, []).append(key)
+                    self._slot_of[key] = current + 1
+            self._next_slot = min(self._slots) if self._slots else None
+        return expired
+
+    def clear(self):
+        self._deadlines = dict()
+        self._slot_of = dict()
+        self._slots = dict()
+        self._next_slot = None
@@ -0,0 +1,110 @@
+# Under MIT License, see LICENSE.txt
+
+__author__ = 'RoboCupULaval'
+
+
+class WorldSnapshot:
+    """
+        WorldSnapshot est un instantané compact du monde à un tick de vision: la balle et les robots
+        dédoublonnés de toutes les caméras, ainsi que la géométrie du terrain si elle a été reçue.
+    """
+    def __init__(self, t_capture, camera_ids, ball=None, robots=None, field=None):
+        self.t_capture = t_capture
+        self.camera_ids = camera_ids
+        # ball: (x, y, confidence) ou None
+        self.ball = ball
+        # robots: {'blue': {id: (x, y, theta, confidence, t_capture)}, 'yellow': {...}}
+        self.robots = robots if robots is not None else {'blue': dict(), 'yellow': dict()}
+        self.field = field
+
+    def __repr__(self):
+        return 'WorldSnapshot(t_capture={}, cameras={}, ball={}, blue={}, yellow={})' \
+               ''.format(self.t_capture, self.camera_ids, self.ball,
+                         sorted(self.robots['blue'].keys()), sorted(self.robots['yellow'].keys()))
+
+
+class VisionMerger:
+    """
+        VisionMerger s'insère entre la vision et le FrameModel. Il conserve la détection la plus récente de
+        chaque caméra et regroupe les caméras dont le t_capture tombe dans la même fenêtre de tick. Les robots
+        et la balle sont dédoublonnés par identifiant en gardant la détection la plus confiante, puis un seul
+        WorldSnapshot est émis par tick. Un frame légèrement plus ancien que la détection conservée de sa caméra
+        (paquet en retard) est ignoré, mais un recul de plus d'une fenêtre de tick ou une remise à zéro de
+        frame_number (redémarrage de grSim ou de ssl-vision, relecture d'une capture) oublie les détections
+        conservées. Avec follow_rewind (lecture de l'enregistreur), tout retour en arrière les oublie.
+    """
+    # Un recul plus grand que ce seuil dans frame_number indique un redémarrage de la source
+    FRAME_NUMBER_RESET_GAP = 1000
+
+    def __init__(self, tick_window=0.05, follow_rewind=False):
+        self._tick_window = tick_window
+        self._follow_rewind = follow_rewind
+        self._cameras = dict()
+        self._last_snapshot_t_capture = None
+
+    def merge(self, frames):
+        """ Intègre un lot de SSL_WrapperPacket et retourne un WorldSnapshot s'il y a du nouveau, sinon None """
+        has_new_detection = False
+        field = None
+        for frame in frames:
+            if frame.geometry.field.field_width != 0:
+                field = frame.geometry.field
+            if not frame.HasField('detection'):
+                continue
+            detection = frame.detection
+            current = self._cameras.get(detection.camera_id)
+            if current is not None and self._is_rewind(detection, current):
+                self._cameras.clear()
+                current = None
+            if current is None or detection.t_capture >= current.t_capture:
+                self._cameras[detection.camera_id] = detection
+                has_new_detection = True
+
+        if not has_new_detection:
+            if field is not None:
+                return WorldSnapshot(self._last_snapshot_t_capture, [], field=field)
+            return None
+        snapshot = self._build_snapshot()
+        snapshot.field = field
+        self._last_snapshot_t_capture = snapshot.t_capture
+        return snapshot
+
+    def _is_rewind(self, detection, current):
+        """ Détermine si une détection plus ancienne que la détection conservée indique un recul de la source """
+        if detection.t_capture >= current.t_capture:
+            return False
+        return self._follow_rewind or current.t_capture - detection.t_capture > self._tick_window or \
+            current.frame_number - detection.frame_number > self.FRAME_NUMBER_RESET_GAP
+
+    def reset(self):
+        """ Oublie les détections conservées de toutes les caméras """
+        self._cameras.clear()
+        self._last_snapshot_t_capture = None
+
+    def _build_snapshot(self):
+        """ Construit l'instantané du tick le plus récent à partir des caméras de la fenêtre """
+        latest = max(detection.t_capture for detection in self._cameras.values())
+        detections = [detection for detection in self._cameras.values()
+                      if latest - detection.t_capture <= self._tick_window]
+
+        best_ball = None
+        robots = {'blue': dict(), 'yellow': dict()}
+        for detection in detections:
+            t_capture = detection.t_capture
+            for ball in detection.balls:
+                if best_ball is None or ball.confidence > best_ball[2]:
+                    best_ball = ball.x, ball.y, ball.confidence
+            self._merge_robots(robots['blue'], detection.robots_blue, t_capture)
+            self._merge_robots(robots['yellow'], detection.robots_yellow, t_capture)
+
+        return WorldSnapshot(latest, sorted(detection.camera_id for detection in detections),
+                             ball=best_ball, robots=robots)
+
+    @staticmethod
+    def _merge_robots(team_robots, detected_robots, t_capture):
+        """ Garde, pour chaque identifiant, la détection la plus confiante puis la plus récente """
+        for robot in detected_robots:
+            current = team_robots.get(robot.robot_id)
+            if current is None or robot.confidence > current[3] or \
+                    (robot.confidence == current[3] and t_capture > current[4]):
+                team_robots[robot.robot_id] = robot.x, robot.y, robot.orientation, robot.confidence, t_capture
@@ -0,0 +1,44 @@
+# Under MIT License, see LICENSE.txt
+
+from importlib import import_module
+from threading import Lock
+
+__author__ = 'RoboCupULaval'
+
+
+class LazyRegistry:
+    """
+        Table statique {clé: module} des classes d'un catalogue. Par convention, la classe porte le nom de son
+        module (Model.DataObject.DrawingData.DrawLineDataIn -> DrawLineDataIn). Le module n'est importé qu'à la
+        première demande de sa clé, par le mécanisme d'import normal: une classe n'existe donc qu'une seule fois.
+        get_key(classe), si donné, vérifie à l'import que la table correspond à la clé déclarée par la classe.
+    """
+    def __init__(self, table, get_key=None):
+        self._table = dict(table)
+        self._get_key = get_key
+        self._classes = dict()
+        self._lock = Lock()
+
+    def __contains__(self, key):
+        return key in self._table
+
+    def __getitem__(self, key):
+        """ Récupère la classe associée à la clé, KeyError si elle n'est pas enregistrée """
+        try:
+            return self._classes[key]
+        except KeyError:
+            pass
+        module_name = self._table[key]
+        with self._lock:
+            cls = getattr(import_module(module_name), module_name.rpartition('.')[2])
+            if self._get_key is not None and self._get_key(cls) != key:
+                raise KeyError('{}: {} déclare la clé {}'.format(key, module_name, self._get_key(cls)))
+            self._classes[key] = cls
+        return cls
+
+    def keys(self):
+        return self._table.keys()
+
+    def get_loaded(self):
+        """ Récupère les classes déjà importées {clé: classe} """
+        return dict(self._classes)
@@ -88,7 +88,7 @@ class FieldView(QWidget):
     def init_view_event(self):
         """ Initialise les boucles de rafraîchissement des dessins """
         self.timer_screen_update.timeout.connect(self.emit_painting_signal)
-        self.timer_screen_update.start((1 / self.FRAME_RATE) * 1000)
+        self.timer_screen_update.start(int(1000 / self.FRAME_RATE))
 
     def init_window(self):
         """ Initialisation de la fenêtre du widget qui affiche le terrain"""
@@ -231,19 +231,19 @@ class FieldView(QWidget):
         self.draw_filterable = dict()
         self.multiple_points_map = dict()
 
-    def set_ball_pos(self, x, y):
+    def set_ball_pos(self, x, y, t_capture=None):
         """ Modifie la position de la balle sur la fenêtre du terrain """
         if not self.graph_mobs['ball'].x == x and not self.graph_mobs['ball'].y == y:
-            self.graph_mobs['ball'].setPos(x, y)
+            self.graph_mobs['ball'].setPos(x, y, t_capture)
         self.graph_mobs['ball'].show()
 
-    def set_bot_pos(self, bot_id, team_color, x, y, theta):
+    def set_bot_pos(self, bot_id, team_color, x, y, theta, t_capture=None):
         """ Modifie la position et l'orientation d'un robot sur la fenêtre du terrain """
         if team_color =='yellow':
-            self.graph_mobs['robots_yellow'][bot_id].setPos(x, y)
+            self.graph_mobs['robots_yellow'][bot_id].setPos(x, y, t_capture)
             self.graph_mobs['robots_yellow'][bot_id].setRotation(theta)
         elif team_color == 'blue':
-            self.graph_mobs['robots_blue'][bot_id].setPos(x, y)
+            self.graph_mobs['robots_blue'][bot_id].setPos(x, y, t_capture)
             self.graph_mobs['robots_blue'][bot_id].setRotation(theta)
         self.show_bot(bot_id, team_color)
 
@@ -321,6 +321,23 @@ class FieldView(QWidget):
             else:
                 self.draw_filterable[draw.filter] = [draw]
 
+    def load_draws(self, draws):
+        """ Charge un lot de dessins sur l'écran en regroupant les dessins par filtre """
+        grouped_draws = dict()
+        for draw in draws:
+            draw.show()
+            if isinstance(draw, InfluenceMapDrawing):
+                self.graph_map = draw
+            elif type(draw).__name__ == MultiplePointsDrawing.__name__:
+                self.multiple_points_map[draw.filter] = draw
+            else:
+                grouped_draws.setdefault(draw.filter, []).append(draw)
+        for draw_filter, filtered_draws in grouped_draws.items():
+            if draw_filter in self.draw_filterable.keys():
+                self.draw_filterable[draw_filter].extend(filtered_draws)
+            else:
+                self.draw_filterable[draw_filter] = filtered_draws
+
     def get_nearest_mob_from_position(self, x, y):
         """ Requête pour obtenir la distance, le numéro et le dessin du robot le plus près d'une position """
         nearest = []
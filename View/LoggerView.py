@@ -24,8 +24,10 @@ class LoggerView(QWidget):
         self._widget_logger = QTextEdit(self)
 
         self._model = None
-        self._count = 0
+        self._cursor = 0
         self._max_logger_line = 10
+        # Nombre de messages affichés au rechargement en pause
+        self._max_reload_line = 5000
         self.pause = False
         self.init_ui()
 
@@ -133,25 +135,19 @@ class LoggerView(QWidget):
         try:
             QMutexLocker(self._mutex).relock()
             if self._model is not None:
-                messages = self._model.get_last_log(0)
-                if messages is not None:
-                    messages = list(filter(self._filter_with_checkbox, messages))
-                    self._widget_logger.setPlainText('\n'.join(map(str, messages[::-1])))
+                records = self._model.get_last_logs(self._max_reload_line, self._get_checked_levels())
+                self._widget_logger.setPlainText('\n'.join(record.text for record in reversed(records)))
         finally:
             QMutexLocker(self._mutex).unlock()
 
-    def _filter_with_checkbox(self, logging):
+    def _get_checked_levels(self):
+        """ Niveaux de logging cochés dans le filtre """
         link_level_checkbox = {1: self.filter_debug,
                                2: self.filter_info,
                                3: self.filter_warn,
                                4: self.filter_err,
                                5: self.filter_crit}
-        try:
-            if link_level_checkbox[logging.data['level']].isChecked():
-                return True
-            return False
-        except Exception as e:
-            return False
+        return [level for level, checkbox in link_level_checkbox.items() if checkbox.isChecked()]
 
     def set_model(self, model):
         if isinstance(model, DataInModel):
@@ -164,16 +160,13 @@ class LoggerView(QWidget):
             try:
                 QMutexLocker(self._mutex).relock()
                 if self._model is not None:
-                    messages = self._model.get_last_log(self._count)
-                    if messages is not None:
-                        self._count += len(messages)
-                        for msg in messages:
-                            self._queue_string_log.append(str(msg))
+                    records, self._cursor = self._model.get_logs_since(self._cursor)
+                    self._queue_string_log.extend(record.text for record in records)
             finally:
                 QMutexLocker(self._mutex).unlock()
 
     def get_count(self):
-        return self._count
+        return self._cursor
 
     def clear(self):
         reply = QMessageBox.question(self, 'Suppression de la fil', 'Êtes-vous sûr de vouloir effacer la fil de'
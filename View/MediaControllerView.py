@@ -2,14 +2,25 @@
 
 from time import sleep
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, \
-                            QSlider
+                            QSlider, QComboBox, QSpinBox, QCheckBox, QLabel, QFileDialog
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import Qt, QThread, pyqtSlot
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSlot
 
 __author__ = 'RoboCupULaval'
 
 
 class MediaControllerView(QWidget):
+    # Durées de rétention proposées (minutes)
+    RETENTION_DURATIONS = [1, 5, 10, 20, 60]
+    # Au-delà de cet âge (secondes), l'enregistrement ne garde qu'un instantané sur DOWNSAMPLE_STEP
+    DOWNSAMPLE_AFTER = 5 * 60
+    DOWNSAMPLE_STEP = 4
+    # Nombre maximal d'instantanés proposé (0 pour ne pas borner)
+    RETENTION_MAX_FRAMES = 10 * 1000 * 1000
+    SESSION_FILTER = 'Session UI-Debug (*.udsession)'
+    # Vitesses de lecture proposées
+    PLAYBACK_RATES = [0.1, 0.25, 0.5, 1, 2, 4, 8, 16]
+
     def __init__(self, controller):
         super().__init__()
         self.controller = controller
@@ -28,8 +39,12 @@ class MediaControllerView(QWidget):
         self._media_slider.sliderMoved.connect(self.handle_sliderMoved)
         self._media_slider.sliderReleased.connect(self.handle_sliderReleased)
 
+        retention_layout = QHBoxLayout()
+        retention_layout.setAlignment(Qt.AlignCenter)
+
         layout.addLayout(button_layout)
         layout.addWidget(self._media_slider)
+        layout.addLayout(retention_layout)
 
         self._but_play = QPushButton(QIcon('Img/control_play.png'), '')
         self._but_play.clicked.connect(self.play)
@@ -53,6 +68,58 @@ class MediaControllerView(QWidget):
         button_layout.addWidget(self._but_pause)
         button_layout.addWidget(self._but_forward)
 
+        self._playback_rate = QComboBox(self)
+        for rate in self.PLAYBACK_RATES:
+            self._playback_rate.addItem('{}x'.format(rate), rate)
+        self._playback_rate.setCurrentIndex(self.PLAYBACK_RATES.index(1))
+        self._playback_rate.currentIndexChanged.connect(self.update_rate)
+        button_layout.addWidget(self._playback_rate)
+
+        self._but_save = QPushButton('Sauvegarder')
+        self._but_save.clicked.connect(self.save_session)
+        self._but_open = QPushButton('Ouvrir')
+        self._but_open.clicked.connect(self.open_session)
+        button_layout.addWidget(self._but_save)
+        button_layout.addWidget(self._but_open)
+
+        # Rétention de l'enregistrement
+        retention = self.controller.recorder_get_retention()
+        self._retention_duration = QComboBox(self)
+        for minutes in self.RETENTION_DURATIONS:
+            self._retention_duration.addItem('{} min'.format(minutes), minutes * 60)
+        duration_index = self._retention_duration.findData(retention['max_duration'])
+        self._retention_duration.setCurrentIndex(max(0, duration_index))
+        self._retention_duration.currentIndexChanged.connect(self.update_retention)
+        self._retention_memory = QSpinBox(self)
+        self._retention_memory.setRange(16, 4096)
+        self._retention_memory.setSingleStep(16)
+        self._retention_memory.setSuffix(' Mo')
+        self._retention_memory.setValue((retention['max_bytes'] or 256 * 1024 * 1024) // (1024 * 1024))
+        self._retention_memory.valueChanged.connect(self.update_retention)
+        self._retention_frames = QSpinBox(self)
+        self._retention_frames.setRange(0, self.RETENTION_MAX_FRAMES)
+        self._retention_frames.setSingleStep(1000)
+        self._retention_frames.setSuffix(' frames')
+        self._retention_frames.setSpecialValueText('frames illimitées')
+        self._retention_frames.setValue(min(retention['max_count'] or 0, self.RETENTION_MAX_FRAMES))
+        self._retention_frames.valueChanged.connect(self.update_retention)
+        self._retention_downsample = QCheckBox('1/{} après {} min'.format(self.DOWNSAMPLE_STEP,
+                                                                          self.DOWNSAMPLE_AFTER // 60), self)
+        self._retention_downsample.setChecked(retention['downsample_after'] is not None)
+        self._retention_downsample.stateChanged.connect(self.update_retention)
+        self._footprint_label = QLabel('', self)
+
+        retention_layout.addWidget(self._retention_duration)
+        retention_layout.addWidget(self._retention_memory)
+        retention_layout.addWidget(self._retention_frames)
+        retention_layout.addWidget(self._retention_downsample)
+        retention_layout.addWidget(self._footprint_label)
+
+        self._footprint_timer = QTimer()
+        self._footprint_timer.timeout.connect(self.update_footprint)
+        self._footprint_timer.start(1000)
+        self.update_retention()
+
         self._thread = QThread()
         self._thread.run = self.update_slider
         self._thread.start()
@@ -68,6 +135,37 @@ class MediaControllerView(QWidget):
                     pass
             sleep(0.1)
 
+    def update_rate(self):
+        self.controller.recorder_set_rate(self._playback_rate.currentData())
+
+    def update_retention(self):
+        """ Applique la rétention choisie à l'enregistrement """
+        downsample_after = self.DOWNSAMPLE_AFTER if self._retention_downsample.isChecked() else None
+        self.controller.recorder_set_retention(max_duration=self._retention_duration.currentData(),
+                                               max_count=self._retention_frames.value() or None,
+                                               max_bytes=self._retention_memory.value() * 1024 * 1024,
+                                               downsample_after=downsample_after,
+                                               downsample_step=self.DOWNSAMPLE_STEP)
+
+    def update_footprint(self):
+        if self.isVisible():
+            footprint = self.controller.recorder_get_footprint()
+            self._footprint_label.setText('{:.1f} Mo | {} frames | {:.0f} s'.format(footprint['bytes'] / (1024 * 1024),
+                                                                                   footprint['frames'],
+                                                                                   footprint['duration']))
+
+    def save_session(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Sauvegarder la session', '', self.SESSION_FILTER)
+        if path:
+            if not path.endswith('.udsession'):
+                path += '.udsession'
+            self.controller.recorder_save_session(path)
+
+    def open_session(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Ouvrir une session', '', self.SESSION_FILTER)
+        if path and self.controller.recorder_open_session(path):
+            self.rewind()
+
     def pause(self):
         self.controller.recorder_trigger_pause()
         value = self.controller.recorder_get_cursor_percentage()
@@ -15,10 +15,15 @@ class StatusBarView(QWidget):
         self._update_timer = QTimer()
         self._update_timer.timeout.connect(self.update_loop)
         self._update_timer.start(35)
+        self._stats_timer = QTimer()
+        self._stats_timer.timeout.connect(self.update_network_stats)
+        self._stats_timer.start(1000)
 
         # Labels
         self.label_coord_mouse = QLabel('')
         self.label_fps = QLabel('')
+        self.label_strategy_stats = QLabel('')
+        self.label_vision_stats = QLabel('')
 
         # Initialisations
         self.init_ui()
@@ -32,6 +37,31 @@ class StatusBarView(QWidget):
         fps = self._controller.get_fps()
         self.label_fps.setText("[UI refresh rate: {} fps]".format(fps))
 
+    def update_network_stats(self):
+        stats = self._controller.get_network_stats()
+        self.label_strategy_stats.setText('[IA: {}{}]'.format(
+            ' | '.join(self._format_stream(name, stream) for name, stream in sorted(stats['strategy_by_sender'].items()))
+            or 'aucun paquet', self._format_ingest(stats['strategy_ingest'])))
+        self.label_vision_stats.setText('[Vision: {}]'.format(
+            ' | '.join(self._format_stream('cam {}'.format(camera_id), stream)
+                       for camera_id, stream in sorted(stats['vision'].items()))
+            or 'aucun paquet'))
+
+    @staticmethod
+    def _format_stream(name, stream):
+        text = '{} {:.0f} pkt/s {:.0f} ko/s perte {:.1%}'.format(name, stream['packets_per_sec'],
+                                                              stream['bytes_per_sec'] / 1000, stream['loss_ratio'])
+        if stream['latency_p90'] is not None:
+            text += ' lat p90 {:.1f} ms'.format(stream['latency_p90'] * 1000)
+        return text
+
+    @staticmethod
+    def _format_ingest(lanes):
+        """ Résume les paquets jetés par la file de réception, rien si aucun paquet n'a été jeté """
+        dropped = ['{} {}'.format(name, lane['dropped'] + lane['replaced'])
+                   for name, lane in sorted(lanes.items()) if lane['dropped'] + lane['replaced']]
+        return ' | jetés ' + ', '.join(dropped) if dropped else ''
+
     def update_coord_cursor(self):
         x, y = self._controller.get_cursor_position_from_screen()
         self.label_coord_mouse.setText("[X: {:>5} | Y: {:>5}]".format(str(x), str(y)))
@@ -44,10 +74,14 @@ class StatusBarView(QWidget):
         self.setLayout(layout)
         layout.addWidget(self.label_fps)
         layout.addWidget(self.label_coord_mouse)
+        layout.addWidget(self.label_strategy_stats)
+        layout.addWidget(self.label_vision_stats)
 
         font = QFont()
         font.setPixelSize(12)
         self.label_coord_mouse.setFont(font)
         self.label_fps.setFont(font)
+        self.label_strategy_stats.setFont(font)
+        self.label_vision_stats.setFont(font)
 
 
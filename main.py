@@ -17,10 +17,26 @@ def argumentParser(argument):
                         help='Path to the field config file in the StratetyIA config/field folder.')
     parser.add_argument('team_color', metavar='team_color', type=str, default='blue',
                         help='team_color, set the color to use for the ports')
+    parser.add_argument('--trust', metavar='NAME=LEVEL', action='append', default=[],
+                        help='validation level of the packets of a sender: full (default), shape or none. '
+                             'Example: --trust StrategyIA=none')
+    parser.add_argument('--log-spill', metavar='PATH', type=str, default=None,
+                        help='file receiving the oldest logging messages. Default: they are dropped')
     args_ = parser.parse_args(argument)
     return args_
 
 
+def parse_sender_trust(values):
+    """ Convert the --trust NAME=LEVEL arguments to a {name: level} dict """
+    sender_trust = dict()
+    for value in values:
+        name, separator, trust = value.rpartition('=')
+        if not separator or not name:
+            raise RuntimeError("--trust {}: format attendu NAME=LEVEL".format(value))
+        sender_trust[name] = trust
+    return sender_trust
+
+
 def load_config(path):
     config_parser = ConfigParser(allow_no_value=False)
     try:
@@ -47,6 +63,7 @@ if __name__ == '__main__':
         ui_cmd_sender_port = 16666   # DO NOT TOUCH
         ui_cmd_receiver_port = 17777 # DO NOT TOUCH
 
-    f = MainController(args.team_color, int(config["vision_port"]), int(config["referee_port"]), ui_cmd_sender_port, ui_cmd_receiver_port)
+    f = MainController(args.team_color, int(config["vision_port"]), int(config["referee_port"]), ui_cmd_sender_port, ui_cmd_receiver_port,
+                       sender_trust=parse_sender_trust(args.trust), log_spill_path=args.log_spill)
     f.show()
     sys.exit(app.exec())
@@ -0,0 +1,50 @@
+# Under MIT License, see LICENSE.txt
+
+"""
+    Mesure le démarrage à froid du UI-debug: chaque essai est un nouveau processus qui importe MainController
+    et le construit (sans afficher la fenêtre), puis quitte.
+    Exécution depuis la racine du projet: PYTHONPATH=. python test/bench_startup.py [nombre d'essais]
+    Sans écran, utiliser QT_QPA_PLATFORM=offscreen.
+"""
+
+import json
+import subprocess
+import sys
+from statistics import median
+
+__author__ = 'RoboCupULaval'
+
+_TRIAL = '''
+import json, os, sys
+from time import perf_counter
+start = perf_counter()
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+qt = perf_counter()
+from Controller.MainController import MainController
+imported = perf_counter()
+controller = MainController('blue', 10020, 10003, 14444, 15555)
+built = perf_counter()
+print(json.dumps({'qt': qt - start, 'import': imported - qt, 'construct': built - imported,
+                  'modules': len(sys.modules)}))
+sys.stdout.flush()
+os._exit(0)
+'''
+
+
+def run_trial():
+    output = subprocess.check_output([sys.executable, '-c', _TRIAL], stderr=subprocess.DEVNULL)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    results = [run_trial() for _ in range(trials)]
+    for key in ('qt', 'import', 'construct'):
+        values = [result[key] * 1000 for result in results]
+        print('{:<10} médiane {:7.1f} ms   min {:7.1f} ms'.format(key, median(values), min(values)))
+    print('{:<10} {}'.format('modules', results[-1]['modules']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# Under MIT License, see LICENSE.txt
+
+"""
+    Mesure le temps de décodage (pickle) et de validation (DataFactory) par paquet pour les dessins les plus
+    coûteux à valider, pour chaque niveau de confiance de l'émetteur.
+    Exécution depuis la racine du projet: PYTHONPATH=. python test/bench_validation.py
+"""
+
+import pickle
+from random import randint
+from timeit import repeat
+
+from Model.DataObject.DataFactory import DataFactory
+from Model.DataObject.PacketSchema import TRUST_LEVELS
+
+__author__ = 'RoboCupULaval'
+
+SENDER = 'bench'
+
+
+def create_package(p_type, data):
+    return {'name': SENDER, 'version': '1.0', 'type': p_type, 'link': None, 'data': data}
+
+
+def create_packages():
+    return {
+        'influence_map_90x60': create_package(3007, {'field_data': [[randint(0, 100) for _ in range(90)]
+                                                                    for _ in range(60)]}),
+        'multiple_lines_500': create_package(3002, {'points': [(float(randint(-4500, 4500)),
+                                                                float(randint(-3000, 3000))) for _ in range(500)],
+                                                    'timeout': 1}),
+        'multiple_points_200': create_package(3005, {'points': [(randint(-4500, 4500), randint(-3000, 3000))
+                                                                for _ in range(200)]}),
+        'circle': create_package(3003, {'center': (100, 200), 'radius': 90, 'timeout': 0.2}),
+    }
+
+
+def bench(factory, raw, number):
+    """ Temps moyen (µs) du décodage et de la validation d'un paquet """
+    best = min(repeat(lambda: factory.get_data_object(pickle.loads(raw)), number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main():
+    factory = DataFactory()
+    packages = {name: pickle.dumps(package) for name, package in create_packages().items()}
+    print('{:<22}'.format('paquet') + ''.join('{:>12}'.format(trust) for trust in TRUST_LEVELS))
+    for name, raw in sorted(packages.items()):
+        results = []
+        for trust in TRUST_LEVELS:
+            factory.set_sender_trust(SENDER, trust)
+            results.append(bench(factory, raw, 200))
+        print('{:<22}'.format(name) + ''.join('{:>10.1f}µs'.format(result) for result in results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# Under MIT License, see LICENSE.txt
+
+import pickle
+import unittest
+
+from Model.DataObject.DataFactory import DataFactory
+from Model.DecodePipeline import DecodePipeline
+
+__author__ = 'RoboCupULaval'
+
+
+def create_raw(p_type, data):
+    return pickle.dumps({'name': 'StrategyIA', 'version': '1.0', 'type': p_type, 'link': None, 'data': data})
+
+
+def create_influence_map(rows=60, cols=90):
+    return create_raw(3007, {'field_data': [[(x + y) % 100 for x in range(cols)] for y in range(rows)]})
+
+
+class TestDecodePipeline(unittest.TestCase):
+    """ Décodage par voies et ordre d'application des paquets """
+    def create_pipeline(self, use_processes=False):
+        pipeline = DecodePipeline(DataFactory(), dict(), bulk_threshold=1024, use_processes=use_processes)
+        self.addCleanup(pipeline.shutdown)
+        return pipeline
+
+    def drain(self, pipeline):
+        decoded = []
+        while pipeline.has_pending():
+            pipeline.wait_control()
+            decoded.extend(pipeline.pop_ready())
+        return decoded
+
+    def test_large_state_keeps_sender_order(self):
+        pipeline = self.create_pipeline()
+        large = create_raw(1003, {'blue': 'old', 'yellow': 'x' * 64 * 1024})
+        pipeline.submit(large)
+        pipeline.submit(create_raw(1003, {'blue': 'new', 'yellow': 'y'}))
+        decoded = self.drain(pipeline)
+        self.assertEqual([data.data['blue'] for data, _, _, _ in decoded], ['old', 'new'])
+        self.assertEqual([order for _, _, _, order in decoded], [0, 1])
+
+    def test_influence_map_uses_bulk_lane(self):
+        pipeline = self.create_pipeline()
+        pipeline.submit(create_influence_map())
+        pipeline.submit(create_raw(1003, {'blue': 'state'}))
+        pipeline.wait_control()
+        decoded = pipeline.pop_ready()
+        # La voie de contrôle est rendue d'abord, l'Influence Map suit lorsqu'elle est décodée
+        self.assertEqual(decoded[0][0].data['blue'], 'state')
+        decoded.extend(self.drain(pipeline))
+        self.assertEqual([order for _, _, _, order in decoded], [1, 0])
+        self.assertEqual(decoded[1][0].type, 3007)
+
+    def test_decode_errors_are_returned(self):
+        pipeline = self.create_pipeline()
+        pipeline.submit(b'not a pickle')
+        (data, nbytes, error, order), = self.drain(pipeline)
+        self.assertIsNone(data)
+        self.assertIsNotNone(error)
+        self.assertEqual(nbytes, len(b'not a pickle'))
+
+    def test_process_pool(self):
+        pipeline = self.create_pipeline(use_processes=True)
+        pipeline.prewarm()
+        pipeline.submit_bulk(create_influence_map(rows=3, cols=4))
+        (data, _, error, _), = self.drain(pipeline)
+        self.assertIsNone(error)
+        self.assertEqual(data.data['field_data'][2], [2, 3, 4, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
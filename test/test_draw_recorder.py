@@ -0,0 +1,128 @@
+# Under MIT License, see LICENSE.txt
+
+import unittest
+from random import Random
+
+from Model.DrawRecorder import DrawIntervalIndex, DrawChunk, DrawRecorder, INFINITE
+
+__author__ = 'RoboCupULaval'
+
+
+class FakeDraw:
+    """ DataObject de dessin minimal pour DrawRecorder """
+    is_unique_per_filter = False
+
+    def __init__(self, timeout=0, p_filter=None, p_type=3001):
+        self.name = 'StrategyIA'
+        self.version = '1.0'
+        self.type = p_type
+        self.link = None
+        self.data = {'timeout': timeout}
+        self.filter = p_filter
+
+
+class FakeUniqueDraw(FakeDraw):
+    is_unique_per_filter = True
+
+
+def brute_force(records, p_time):
+    return [index for index, record in enumerate(records) if record[0] <= p_time < record[1]]
+
+
+class TestDrawIntervalIndex(unittest.TestCase):
+    """ Recherche des intervalles actifs comparée à un parcours complet """
+    def setUp(self):
+        rand = Random(6)
+        self.records = []
+        for _ in range(2000):
+            start = rand.uniform(0, 100)
+            end = INFINITE if rand.random() < 0.1 else start + rand.uniform(0, 5)
+            self.records.append([start, end, None])
+        self.records.sort(key=lambda record: record[0])
+        self.index = DrawIntervalIndex(self.records)
+
+    def test_query_matches_brute_force(self):
+        for p_time in [-1, 0, 0.5, 33.3, 50, 99.9, 100, 200] + [record[0] for record in self.records[::97]]:
+            self.assertEqual(self.index.query(p_time), brute_force(self.records, p_time))
+
+    def test_end_is_excluded(self):
+        index = DrawIntervalIndex([[1, 2, None], [2, 3, None]])
+        self.assertEqual(index.query(2), [1])
+        self.assertEqual(index.query(3), [])
+
+    def test_shortened_end_is_filtered(self):
+        for record in self.records[::10]:
+            record[1] = min(record[1], record[0] + 0.01)
+        for p_time in (10, 42.42, 75):
+            self.assertEqual(self.index.query(p_time), brute_force(self.records, p_time))
+
+    def test_empty(self):
+        index = DrawIntervalIndex([])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.query(1), [])
+
+
+class TestDrawChunk(unittest.TestCase):
+    def test_open_records_come_first(self):
+        open_record = [0, INFINITE, 'open', 0]
+        chunk = DrawChunk([open_record, [0, 5, 'ended', 1]], [[10, 20, 'draw', 2], [15, INFINITE, 'late', 3]])
+        self.assertEqual([record[2] for record in chunk.get_active(12)], ['open', 'draw'])
+        self.assertEqual([record[2] for record in chunk.get_active(16)], ['open', 'draw', 'late'])
+        self.assertEqual([record[2] for record in chunk.get_active(25)], ['open', 'late'])
+
+
+class TestDrawRecorder(unittest.TestCase):
+    def test_timeout_and_order(self):
+        recorder = DrawRecorder()
+        recorder.record([FakeDraw(timeout=2), FakeDraw()], timestamp=10)
+        recorder.record([FakeDraw(timeout=1)], timestamp=11)
+        self.assertEqual([record[3] for record in recorder.get_active(11.5)], [0, 1, 2])
+        self.assertEqual([record[3] for record in recorder.get_active(12.5)], [1])
+        self.assertEqual(recorder.get_records()[0][1], 12)
+        self.assertEqual(recorder.get_records()[1][1], INFINITE)
+
+    def test_unique_per_filter_ends_previous(self):
+        recorder = DrawRecorder()
+        recorder.record([FakeUniqueDraw(p_filter='a'), FakeUniqueDraw(p_filter='b')], timestamp=10)
+        recorder.record([FakeUniqueDraw(p_filter='a')], timestamp=12)
+        self.assertEqual([record[3] for record in recorder.get_active(11)], [0, 1])
+        self.assertEqual([record[3] for record in recorder.get_active(13)], [1, 2])
+        self.assertEqual(recorder.get_records()[0][1], 12)
+
+    def test_packages_are_copied(self):
+        recorder = DrawRecorder()
+        draw = FakeDraw()
+        recorder.record([draw], timestamp=1)
+        draw.data['timeout'] = 5
+        self.assertEqual(recorder.get_records()[0][2]['data'], {'timeout': 0})
+
+    def test_endless_draws_are_capped(self):
+        recorder = DrawRecorder(max_duration=10)
+        recorder.record([FakeUniqueDraw(p_filter='map')], timestamp=0)
+        for i in range(2000):
+            recorder.record([FakeDraw()], timestamp=i)
+        active = recorder.get_active(1999.5)
+        # Les dessins sans fin plus vieux que max_duration sont oubliés, sauf le dernier dessin unique du filtre
+        self.assertLess(len(recorder), 2000)
+        self.assertEqual(active[0][3], 0)
+        self.assertTrue(all(record[0] >= 1999 - 10 for record in active[1:]))
+        self.assertEqual([record[3] for record in recorder.get_active(1999.5)], [record[3] for record in active])
+
+    def test_live_recording_is_pruned_without_reads(self):
+        recorder = DrawRecorder(max_duration=10)
+        for i in range(50000):
+            recorder.record([FakeDraw(timeout=1 if i % 2 else 0)], timestamp=i / 100)
+        # Sans lecture, l'enregistrement garde au plus deux fois les dessins des 10 dernières secondes
+        self.assertLessEqual(len(recorder), 2 * 1001 + DrawRecorder._PRUNE_MIN)
+        self.assertEqual(recorder.get_active(499.995)[-1][3], 49999)
+
+    def test_clear(self):
+        recorder = DrawRecorder()
+        recorder.record([FakeDraw()], timestamp=1)
+        recorder.clear()
+        self.assertEqual(len(recorder), 0)
+        self.assertEqual(recorder.get_active(1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
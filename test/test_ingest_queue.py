@@ -0,0 +1,171 @@
+# Under MIT License, see LICENSE.txt
+
+import pickle
+import unittest
+
+from Communication.IngestQueue import IngestQueue, POLICY_LOSSLESS, POLICY_DROP_OLDEST, POLICY_LATEST_PER_KEY, \
+    POLICY_SAMPLE
+from Model.DataObject.WireFormat import encode_packet, peek_packet
+from Model.IngestPolicy import classify_packet, create_ingest_queue, LANE_CONTROL, LANE_LARGE, LANE_LOG, LANE_DRAW, \
+    LANE_DRAW_LATEST, LANE_UNKNOWN
+
+__author__ = 'RoboCupULaval'
+
+
+def create_packet(p_type, link=None, name='StrategyIA', data=None):
+    return {'name': name, 'version': '1.0', 'type': p_type, 'link': link, 'data': data or {'timeout': 0}}
+
+
+def classify_by_value(data):
+    """ Classe les paquets de test (voie, clé) """
+    return data
+
+
+class TestIngestQueuePolicies(unittest.TestCase):
+    """ Politiques de perte d'une voie pleine """
+    def create_queue(self, policy, capacity=4, sample_every=1):
+        queue = IngestQueue(classify_by_value)
+        queue.add_lane('lane', priority=1, policy=policy, capacity=capacity, sample_every=sample_every)
+        return queue
+
+    def fill(self, queue, count, key=None):
+        for num in range(count):
+            queue.put((num, ('lane', key(num) if key else None)))
+
+    def test_without_classify_is_unbounded(self):
+        queue = IngestQueue()
+        queue.extend((num, num) for num in range(10000))
+        self.assertEqual(len(queue), 10000)
+        self.assertEqual(queue.popleft(), (0, 0))
+        self.assertEqual([num for num, _ in queue.pop_all()], list(range(1, 10000)))
+        self.assertFalse(queue)
+
+    def test_lossy_lane_needs_capacity(self):
+        with self.assertRaises(ValueError):
+            IngestQueue().add_lane('lane', priority=1, policy=POLICY_DROP_OLDEST)
+        IngestQueue().add_lane('lane', priority=1, policy=POLICY_LOSSLESS)
+
+    def test_drop_oldest(self):
+        queue = self.create_queue(POLICY_DROP_OLDEST)
+        self.fill(queue, 10)
+        self.assertEqual(len(queue), 4)
+        self.assertEqual([num for num, _ in queue.pop_all()], [6, 7, 8, 9])
+        self.assertEqual(queue.get_stats()['lane'], {'queued': 0, 'accepted': 10, 'dropped': 6, 'replaced': 0})
+
+    def test_latest_per_key(self):
+        queue = self.create_queue(POLICY_LATEST_PER_KEY, capacity=3)
+        self.fill(queue, 10, key=lambda num: num % 2)
+        self.assertEqual([num for num, _ in queue.pop_all()], [8, 9])
+        self.assertEqual(queue.get_stats()['lane']['replaced'], 8)
+
+    def test_latest_per_key_capacity(self):
+        queue = self.create_queue(POLICY_LATEST_PER_KEY, capacity=3)
+        self.fill(queue, 5, key=lambda num: num)
+        self.assertEqual([num for num, _ in queue.pop_all()], [2, 3, 4])
+        self.assertEqual(queue.get_stats()['lane']['dropped'], 2)
+
+    def test_sample_keeps_newest(self):
+        queue = self.create_queue(POLICY_SAMPLE, capacity=4, sample_every=4)
+        self.fill(queue, 20)
+        # Le plus récent est toujours gardé, puis un paquet sur 4 du surplus
+        self.assertEqual([num for num, _ in queue.pop_all()], [7, 11, 15, 19])
+        self.assertEqual(queue.get_stats()['lane']['dropped'], 16)
+
+    def test_sample_after_drain(self):
+        queue = self.create_queue(POLICY_SAMPLE, capacity=2, sample_every=3)
+        self.fill(queue, 3)
+        queue.pop_all()
+        queue.put((10, ('lane', None)))
+        queue.put((11, ('lane', None)))
+        queue.put((12, ('lane', None)))
+        self.assertEqual([num for num, _ in queue.pop_all()], [11, 12])
+
+    def test_priority_then_arrival_order(self):
+        queue = IngestQueue(classify_by_value)
+        queue.add_lane('high', priority=0, policy=POLICY_LOSSLESS)
+        queue.add_lane('low_a', priority=1, policy=POLICY_DROP_OLDEST, capacity=10)
+        queue.add_lane('low_b', priority=1, policy=POLICY_LATEST_PER_KEY, capacity=10)
+        lanes = ['low_a', 'low_b', 'high', 'low_b', 'low_a', 'high', 'missing']
+        for num, lane in enumerate(lanes):
+            queue.put((num, (lane, num)))
+        # Une voie inconnue va dans la voie par défaut, de priorité 0
+        self.assertEqual([num for num, _ in queue.pop_all()], [2, 5, 6, 0, 1, 3, 4])
+
+    def test_popleft_by_priority(self):
+        queue = IngestQueue(classify_by_value)
+        queue.add_lane('low', priority=1, policy=POLICY_DROP_OLDEST, capacity=10)
+        queue.put((0, ('low', None)))
+        queue.put((1, (None, None)))
+        self.assertEqual(queue.popleft()[0], 1)
+        self.assertEqual(queue.popleft()[0], 0)
+        with self.assertRaises(IndexError):
+            queue.popleft()
+
+    def test_clear(self):
+        queue = self.create_queue(POLICY_DROP_OLDEST)
+        self.fill(queue, 3)
+        queue.clear()
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue.pop_all(), [])
+
+
+class TestPeekPacket(unittest.TestCase):
+    """ Lecture de l'entête d'un paquet sans le décoder """
+    def test_pickle(self):
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            raw = pickle.dumps(create_packet(3005, link='filtre'), protocol=protocol)
+            self.assertEqual(peek_packet(raw), ('StrategyIA', 3005, 'filtre'))
+
+    def test_pickle_int_link(self):
+        self.assertEqual(peek_packet(pickle.dumps(create_packet(2, link=3))), ('StrategyIA', 2, 3))
+
+    def test_binary(self):
+        self.assertEqual(peek_packet(encode_packet(create_packet(3007), sender_id=4)), (4, 3007, None))
+        self.assertEqual(peek_packet(encode_packet(create_packet(3007, link='filtre'), sender_id=4)),
+                         (4, 3007, 'filtre'))
+
+    def test_unreadable(self):
+        for raw in (b'', b'garbage', b'UD\x10', pickle.dumps([1, 2, 3]), pickle.dumps({'type': 'text'})):
+            self.assertEqual(peek_packet(raw)[1], None)
+
+    def test_type_after_data(self):
+        # L'aperçu s'arrête à 'data': un type placé après les données n'est pas lu
+        packet = {'name': 'StrategyIA', 'data': {'type': 3}, 'type': 3001}
+        self.assertEqual(peek_packet(pickle.dumps(packet))[1], None)
+
+
+class TestIngestPolicy(unittest.TestCase):
+    """ Classement des paquets de StrategyIA dans les voies """
+    def test_classify(self):
+        self.assertEqual(classify_packet(pickle.dumps(create_packet(2))), (LANE_LOG, None))
+        self.assertEqual(classify_packet(pickle.dumps(create_packet(1099))), (LANE_LOG, None))
+        self.assertEqual(classify_packet(pickle.dumps(create_packet(1001))), (LANE_CONTROL, None))
+        self.assertEqual(classify_packet(pickle.dumps(create_packet(2000))), (LANE_LARGE, None))
+        self.assertEqual(classify_packet(pickle.dumps(create_packet(3001))), (LANE_DRAW, None))
+        self.assertEqual(classify_packet(pickle.dumps(create_packet(3900))), (LANE_DRAW, None))
+        self.assertEqual(classify_packet(pickle.dumps(create_packet(3007, link='f'))),
+                         (LANE_DRAW_LATEST, ('StrategyIA', 3007, 'f')))
+        self.assertEqual(classify_packet(b'garbage'), (LANE_UNKNOWN, None))
+
+    def test_queue_is_bounded(self):
+        queue = create_ingest_queue(draw_capacity=8, latest_capacity=2, log_capacity=4, large_capacity=4,
+                                    unknown_capacity=2)
+        raws = [pickle.dumps(create_packet(p_type, link=num % 2))
+                for num, p_type in enumerate([3001, 3007, 2, 2000, 1001] * 50)] + [b'garbage'] * 10
+        queue.extend(enumerate(raws))
+        stats = queue.get_stats()
+        self.assertEqual(stats[LANE_CONTROL]['queued'], 50)
+        self.assertEqual(stats[LANE_DRAW]['queued'], 8)
+        self.assertEqual(stats[LANE_DRAW_LATEST]['queued'], 2)
+        self.assertEqual(stats[LANE_LOG]['queued'], 4)
+        self.assertEqual(stats[LANE_LARGE]['queued'], 4)
+        self.assertEqual(stats[LANE_UNKNOWN]['queued'], 2)
+        batch = queue.pop_all()
+        self.assertEqual(len(batch), 70)
+        # Les paquets de contrôle passent en premier, les paquets illisibles en dernier
+        self.assertTrue(all(peek_packet(raw)[1] == 1001 for _, raw in batch[:50]))
+        self.assertEqual([raw for _, raw in batch[-2:]], [b'garbage'] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# Under MIT License, see LICENSE.txt
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from Model.LogStore import LogStore
+
+__author__ = 'RoboCupULaval'
+
+
+def fill(store, count, levels=(1, 2, 3)):
+    for i in range(count):
+        store.append(float(i), levels[i % len(levels)], 'sender {}'.format(i % 2), 'message {}'.format(i))
+
+
+class TestLogStoreReads(unittest.TestCase):
+    """ Lectures incrémentales et filtrées par niveau """
+    def test_read_since_cursor(self):
+        store = LogStore(capacity=100)
+        fill(store, 10)
+        records, cursor = store.read_since(0)
+        self.assertEqual([record.text for record in records], ['message {}'.format(i) for i in range(10)])
+        self.assertEqual(cursor, 10)
+        self.assertEqual(store.read_since(cursor), ([], 10))
+        store.append(10.0, 1, 'sender 0', 'new')
+        records, cursor = store.read_since(cursor)
+        self.assertEqual([(record.seq, record.text) for record in records], [(10, 'new')])
+        self.assertEqual(cursor, store.get_cursor())
+
+    def test_record_fields(self):
+        store = LogStore()
+        store.append(12.5, 4, 'StrategyIA', 'éàç')
+        record = store.read_last(1)[0]
+        self.assertEqual((record.seq, record.time, record.level, record.sender, record.text),
+                         (0, 12.5, 4, 'StrategyIA', 'éàç'))
+
+    def test_unknown_level_is_zero(self):
+        store = LogStore()
+        store.append(0.0, 42, 'a', 'text')
+        self.assertEqual(store.read_last(1)[0].level, 0)
+
+    def test_levels(self):
+        store = LogStore(capacity=100)
+        fill(store, 30)
+        records, _ = store.read_since(5, levels=[1, 3])
+        self.assertEqual([record.seq for record in records], [i for i in range(5, 30) if i % 3 != 1])
+        self.assertEqual([record.seq for record in store.read_last(3, levels=[2])], [22, 25, 28])
+        self.assertEqual(store.read_last(3, levels=[5]), [])
+
+    def test_read_last(self):
+        store = LogStore(capacity=100)
+        fill(store, 5)
+        self.assertEqual([record.seq for record in store.read_last(3)], [2, 3, 4])
+        self.assertEqual(len(store.read_last(50)), 5)
+
+
+class TestLogStoreEviction(unittest.TestCase):
+    """ Éviction par capacité et par taille de l'arène, et débordement dans un fichier """
+    def test_capacity(self):
+        store = LogStore(capacity=64, block_size=16)
+        fill(store, 1000)
+        self.assertLessEqual(len(store), 64)
+        records, cursor = store.read_since(0)
+        self.assertEqual(records[-1].seq, 999)
+        self.assertEqual([record.seq for record in records], list(range(records[0].seq, 1000)))
+        self.assertEqual([record.text for record in records], ['message {}'.format(record.seq) for record in records])
+        self.assertEqual(cursor, 1000)
+        self.assertEqual([record.seq for record in store.read_last(2, levels=[1])], [996, 999])
+
+    def test_arena(self):
+        store = LogStore(capacity=1000, arena_size=1024, block_size=4)
+        for i in range(200):
+            store.append(float(i), 1, 'a', '{:03d}'.format(i) * 10)
+        stats = store.get_stats()
+        self.assertLessEqual(stats['arena_bytes'], 1024)
+        records, _ = store.read_since(0)
+        # Les textes qui traversent la fin de l'arène sont relus correctement
+        self.assertEqual([record.text for record in records], ['{:03d}'.format(record.seq) * 10 for record in records])
+
+    def test_long_text_is_truncated(self):
+        store = LogStore(arena_size=1024)
+        store.append(0.0, 1, 'a', 'x' * 5000)
+        self.assertEqual(store.read_last(1)[0].text, 'x' * 64)
+
+    def test_spill_rotation(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'spill.txt')
+        store = LogStore(capacity=10, block_size=5, spill_path=path, spill_max_bytes=200, spill_backups=2)
+        fill(store, 200)
+        spilled = store.get_stats()['spilled']
+        self.assertGreater(spilled, 0)
+        self.assertTrue(os.path.exists(path + '.1'))
+        self.assertTrue(os.path.exists(path + '.2'))
+        self.assertFalse(os.path.exists(path + '.3'))
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[-1], 'message {}'.format(spilled - 1))
+        self.assertLessEqual(os.path.getsize(path), 200)
+
+    @unittest.skipUnless(hasattr(os, 'symlink') and hasattr(os, 'O_NOFOLLOW'), 'liens symboliques non supportés')
+    def test_spill_does_not_follow_symlink(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'spill.txt')
+        target = os.path.join(directory, 'target.txt')
+        os.symlink(target, path)
+        store = LogStore(capacity=10, block_size=5, spill_path=path)
+        fill(store, 20)
+        self.assertFalse(os.path.exists(target))
+        self.assertEqual(store.get_stats()['spilled'], 0)
+        self.assertEqual(store.read_last(1)[0].seq, 19)
+
+
+if __name__ == '__main__':
+    unittest.main()
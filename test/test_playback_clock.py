@@ -0,0 +1,91 @@
+# Under MIT License, see LICENSE.txt
+
+import unittest
+from unittest import mock
+
+from Model.PlaybackClock import PlaybackClock, RATE_MIN, RATE_MAX
+
+__author__ = 'RoboCupULaval'
+
+
+class TestPlaybackClock(unittest.TestCase):
+    """ Temps de lecture avec une horloge monotone contrôlée par le test """
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('Model.PlaybackClock.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.clock = PlaybackClock()
+        self.clock.set_range(100.0, 110.0)
+
+    def test_paused_by_default(self):
+        self.now += 5
+        self.assertFalse(self.clock.is_playing())
+        self.assertEqual(self.clock.get_time(), 100.0)
+
+    def test_play_and_pause(self):
+        self.clock.play()
+        self.now += 2
+        self.assertEqual(self.clock.get_time(), 102.0)
+        self.clock.pause()
+        self.now += 3
+        self.assertEqual(self.clock.get_time(), 102.0)
+        self.clock.play()
+        self.now += 1
+        self.assertEqual(self.clock.get_time(), 103.0)
+
+    def test_rate_change_does_not_jump(self):
+        self.clock.play()
+        self.now += 2
+        self.clock.set_rate(4)
+        self.assertEqual(self.clock.get_time(), 102.0)
+        self.now += 1
+        self.assertEqual(self.clock.get_time(), 106.0)
+
+    def test_rate_is_clamped(self):
+        self.clock.set_rate(0)
+        self.assertEqual(self.clock.get_rate(), RATE_MIN)
+        self.clock.set_rate(1000)
+        self.assertEqual(self.clock.get_rate(), RATE_MAX)
+
+    def test_pauses_at_end_and_replays_from_start(self):
+        self.clock.play()
+        self.now += 60
+        self.assertEqual(self.clock.get_time(), 110.0)
+        self.assertFalse(self.clock.is_playing())
+        self.clock.play()
+        self.assertEqual(self.clock.get_time(), 100.0)
+        self.assertTrue(self.clock.is_playing())
+
+    def test_seek_is_clamped_and_keeps_play_state(self):
+        self.clock.seek(50.0)
+        self.assertEqual(self.clock.get_time(), 100.0)
+        self.clock.play()
+        self.clock.seek(105.0)
+        self.now += 1
+        self.assertEqual(self.clock.get_time(), 106.0)
+        self.clock.seek(500.0)
+        self.assertEqual(self.clock.get_time(), 110.0)
+
+    def test_ratio(self):
+        self.clock.seek_ratio(0.25)
+        self.assertEqual(self.clock.get_time(), 102.5)
+        self.assertEqual(self.clock.get_ratio(), 0.25)
+        self.clock.seek_ratio(2)
+        self.assertEqual(self.clock.get_ratio(), 1.0)
+
+    def test_empty_range(self):
+        self.clock.set_range(100.0, 90.0)
+        self.assertEqual(self.clock.get_range(), (100.0, 100.0))
+        self.assertEqual(self.clock.get_ratio(), 0.0)
+        self.clock.play()
+        self.now += 1
+        self.assertEqual(self.clock.get_time(), 100.0)
+
+    def test_set_range_position(self):
+        self.clock.set_range(200.0, 300.0, p_time=250.0)
+        self.assertEqual(self.clock.get_time(), 250.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+# Under MIT License, see LICENSE.txt
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from Model.DataObject.BaseDataObject import CheckedPackage
+from Model.DrawRecorder import INFINITE
+from Model.SessionFile import SessionWriter, SessionReader, SessionFileError, SECTION_VISION, SECTION_GAME_STATE, \
+    SECTION_PLOT, SECTION_DRAW
+from Model.SnapshotRecorder import SnapshotChunk
+from Model.TimeListState.TimeListState import TimeListState
+
+__author__ = 'RoboCupULaval'
+
+
+class Exploit:
+    """ Objet dont la reconstruction appelle une fonction arbitraire """
+    def __reduce__(self):
+        return os.getcwd, ()
+
+
+def create_vision_columns(start, first, count):
+    """ Colonnes de count instantanés d'une ligne par seconde, la balle de la ligne i de la session en (i, -i) """
+    chunk = SnapshotChunk(count)
+    for row in range(count):
+        chunk.time[row] = chunk.t_capture[row] = start + first + row
+        chunk.ball[row] = (first + row, -first - row, 0.9)
+        chunk.robots[row, 0, 3] = (row, 1, 0.5, 1)
+    chunk.size = count
+    return chunk.get_columns()
+
+
+def create_draw(start, timeout, seq):
+    package = CheckedPackage(name='StrategyIA', version='1.0', type=3001, link=None,
+                             data={'start': (0, 0), 'end': (1, 1), 'timeout': timeout})
+    return [start, start + timeout if timeout else INFINITE, package, seq]
+
+
+class TestSessionFile(unittest.TestCase):
+    """ Écriture puis relecture d'un fichier de session """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'test.udsession')
+
+        self.game_states = TimeListState('GameState', {'blue': 'None', 'yellow': {'team': 'None'}})
+        start = self.game_states.get_time(0)
+        for i in range(1, 30):
+            self.game_states.append({'blue': 'state {}'.format(i // 3)}, timestamp=start + i)
+        self.plot = [(start + i / 10, {'speed': float(i)}) for i in range(25)]
+        self.draws = [create_draw(start, 0, 0)] + [create_draw(start + i, 2, i) for i in range(1, 25)]
+
+        writer = SessionWriter(self.path, chunk_rows=10, keyframe_interval=8)
+        writer.write_vision([create_vision_columns(start, 0, 6), create_vision_columns(start, 6, 6)])
+        writer.write_timeline(SECTION_GAME_STATE, self.game_states.get_history())
+        writer.write_records(SECTION_PLOT, self.plot)
+        writer.write_draws(self.draws)
+        writer.close({'team_color': 'blue'})
+        self.start = start
+
+    def open_reader(self):
+        reader = SessionReader(self.path)
+        self.addCleanup(reader.close)
+        return reader
+
+    def test_sections_and_meta(self):
+        reader = self.open_reader()
+        self.assertEqual(reader.get_meta(), {'team_color': 'blue'})
+        self.assertEqual(sorted(reader.get_sections()), sorted([SECTION_VISION, SECTION_GAME_STATE, SECTION_PLOT,
+                                                                SECTION_DRAW]))
+        self.assertEqual(len(reader.get_section_index(SECTION_PLOT)), 3)
+
+    def test_vision(self):
+        vision = self.open_reader().get_vision()
+        self.assertEqual(len(vision), 12)
+        self.assertEqual(vision.get_time(7), self.start + 7)
+        self.assertEqual(vision.search_time(self.start + 7.5), 7)
+        self.assertEqual(vision.search_time(self.start - 1), 0)
+        snapshot = vision.get_snapshot(8)
+        self.assertEqual(snapshot.ball[:2], (8, -8))
+        self.assertEqual(list(snapshot.robots['blue'].keys()), [3])
+        with self.assertRaises(IndexError):
+            vision.get_snapshot(12)
+
+    def test_timeline(self):
+        timeline = self.open_reader().get_records(SECTION_GAME_STATE)
+        history = self.game_states.get_history()
+        self.assertEqual(len(timeline), len(history))
+        for index, (timestamp, state) in enumerate(history):
+            self.assertEqual(timeline[index], {'blue': state['blue'], 'yellow': {'team': 'None'}})
+            self.assertEqual(timeline[timestamp + 0.5]['blue'], state['blue'])
+        self.assertEqual(timeline[-1]['blue'], 'state 9')
+
+    def test_records(self):
+        records = self.open_reader().get_records(SECTION_PLOT)
+        self.assertEqual(len(records), 25)
+        self.assertEqual(records[13], {'speed': 13.0})
+        self.assertEqual(records[-1], {'speed': 24.0})
+        self.assertEqual(records[self.start + 1.05], {'speed': 10.0})
+        self.assertEqual(records.get_range(self.start + 0.95, self.start + 1.25), self.plot[10:13])
+
+    def test_draws(self):
+        draws = self.open_reader().get_draws()
+        self.assertEqual(draws.get_active(self.start - 1), [])
+        self.assertEqual([record[3] for record in draws.get_active(self.start + 15.5)], [0, 14, 15])
+        active = draws.get_active(self.start + 24.5)
+        self.assertEqual([record[3] for record in active], [0, 23, 24])
+        self.assertIsInstance(active[0][2], CheckedPackage)
+
+    def test_truncated_file(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        with self.assertRaises(SessionFileError):
+            SessionReader(self.path)
+
+    def test_unknown_header(self):
+        with open(self.path, 'r+b') as f:
+            f.write(b'XXXX')
+        with self.assertRaises(SessionFileError):
+            SessionReader(self.path)
+
+    def test_forbidden_class_in_footer(self):
+        writer = SessionWriter(self.path)
+        writer.close({'exploit': Exploit()})
+        with self.assertRaises(SessionFileError):
+            SessionReader(self.path)
+
+    def test_forbidden_class_in_chunk(self):
+        writer = SessionWriter(self.path)
+        writer.write_records(SECTION_PLOT, [(1.0, Exploit())])
+        writer.close()
+        reader = self.open_reader()
+        with self.assertRaises(SessionFileError):
+            reader.get_records(SECTION_PLOT)[0]
+
+    def test_corrupted_chunk(self):
+        reader = self.open_reader()
+        _, _, position, length, _ = reader.get_section_index(SECTION_PLOT)[0]
+        with open(self.path, 'r+b') as f:
+            f.seek(position)
+            f.write(b'\x00' * length)
+        with self.assertRaises(SessionFileError):
+            self.open_reader().load_chunk(SECTION_PLOT, 0)
+
+    def test_abort_removes_file(self):
+        writer = SessionWriter(self.path)
+        writer.write_records(SECTION_PLOT, self.plot)
+        writer.abort()
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# Under MIT License, see LICENSE.txt
+
+import unittest
+
+from Model.StateTimeline import thaw_state, diff_state, apply_delta, build_timeline_chunks, TimelineChunk
+from Model.TimeListState.TimeListState import TimeListState
+
+__author__ = 'RoboCupULaval'
+
+
+class TestStateDelta(unittest.TestCase):
+    """ Calcul et application des deltas entre deux états """
+    def test_round_trip(self):
+        previous = {'blue': {0: {'tactic': 'None', 'target': (0, 0)}, 1: {'tactic': 'None'}}, 'yellow': 'x'}
+        state = {'blue': {0: {'tactic': 'GoalKeeper', 'target': (0, 0)}, 2: {'tactic': 'None'}}, 'ref': 1}
+        delta = diff_state(previous, state)
+        self.assertEqual(apply_delta(previous, delta), state)
+
+    def test_diff_paths(self):
+        changed, removed = diff_state({'a': {'b': 1, 'c': 2}, 'd': 3}, {'a': {'b': 1, 'c': 5}})
+        self.assertEqual(changed, [(('a', 'c'), 5)])
+        self.assertEqual(removed, [('d',)])
+
+    def test_type_change_is_a_change(self):
+        changed, _ = diff_state({'a': 1}, {'a': 1.0})
+        self.assertEqual(changed, [(('a',), 1.0)])
+
+    def test_identical_state_has_empty_delta(self):
+        state = {'a': {'b': 1}}
+        self.assertEqual(diff_state(state, state), ([], []))
+
+    def test_apply_does_not_modify_state(self):
+        state = {'a': {'b': {'c': 1}}, 'd': {'e': 2}}
+        new_state = apply_delta(state, ([(('a', 'b', 'c'), 3)], [('d', 'e')]))
+        self.assertEqual(state, {'a': {'b': {'c': 1}}, 'd': {'e': 2}})
+        self.assertEqual(new_state, {'a': {'b': {'c': 3}}, 'd': dict()})
+
+    def test_apply_shares_untouched_sub_states(self):
+        state = {'a': {'b': 1}, 'c': {'d': 2}}
+        new_state = apply_delta(state, ([(('a', 'b'), 3)], []))
+        self.assertIs(new_state['c'], state['c'])
+        self.assertIsNot(new_state['a'], state['a'])
+
+    def test_thaw_keeps_sharing(self):
+        states = TimeListState('Test', {'blue': {'x': 1}, 'yellow': {'x': 1}})
+        states.append({'blue': {'x': 2}})
+        memo = dict()
+        first, second = thaw_state(states[0], memo), thaw_state(states[1], memo)
+        self.assertIsInstance(second, dict)
+        self.assertEqual(second, {'blue': {'x': 2}, 'yellow': {'x': 1}})
+        self.assertIs(first['yellow'], second['yellow'])
+
+
+class TestTimelineChunks(unittest.TestCase):
+    """ Découpe en keyframes et deltas, puis reconstruction par bloc """
+    def setUp(self):
+        states = TimeListState('Test', {'count': 0, 'robots': {i: {'tactic': 'None'} for i in range(6)}})
+        start = states.get_time(0)
+        for i in range(1, 50):
+            states.append({'count': i, 'robots': {j: {'tactic': 'T{}'.format(i if j == i % 6 else 0)}
+                                                  for j in range(6)}}, timestamp=start + i)
+        self.history = states.get_history()
+        self.chunks = [TimelineChunk(*chunk) for chunk in build_timeline_chunks(self.history, keyframe_interval=10)]
+
+    def test_chunk_boundaries(self):
+        self.assertEqual(len(self.chunks), 5)
+        self.assertEqual(sum(len(chunk) for chunk in self.chunks), len(self.history))
+        for chunk in self.chunks:
+            self.assertLess(chunk.times[-1] - chunk.times[0], 10)
+            self.assertEqual(len(chunk.deltas), len(chunk) - 1)
+
+    def test_reconstruction_matches_history(self):
+        records = iter(self.history)
+        for chunk in self.chunks:
+            for position in range(len(chunk)):
+                timestamp, state = next(records)
+                self.assertEqual(chunk.times[position], timestamp)
+                self.assertEqual(chunk.get_state(position), thaw_state(state))
+
+    def test_backward_reconstruction(self):
+        chunk = self.chunks[1]
+        last = chunk.get_state(len(chunk) - 1)
+        self.assertEqual(chunk.get_state(2), thaw_state(self.history[len(self.chunks[0]) + 2][1]))
+        self.assertEqual(chunk.get_state(len(chunk) - 1), last)
+
+    def test_state_at_time(self):
+        chunk = self.chunks[2]
+        self.assertEqual(chunk.get_state_at(chunk.times[3] + 0.5), chunk.get_state(3))
+        self.assertEqual(chunk.get_state_at(chunk.times[0] - 100), chunk.keyframe)
+
+    def test_empty_records(self):
+        self.assertEqual(build_timeline_chunks([], keyframe_interval=10), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+# Under MIT License, see LICENSE.txt
+
+import unittest
+from datetime import datetime
+
+from Model.TimeListState.TimeListState import TimeListState, freeze_state
+
+__author__ = 'RoboCupULaval'
+
+
+def create_history(count, max_count=None, max_duration=None):
+    """ Historique de count états {'value': i} ajoutés aux temps T + i, où T suit le temps de l'état par défaut.
+        Retourne (historique, T). """
+    states = TimeListState('Test', {'value': -1, 'other': 'default'}, max_count=max_count, max_duration=max_duration)
+    base = states.get_time(0) + 100.0
+    for i in range(count):
+        states.append({'value': i}, timestamp=base + i)
+    return states, base
+
+
+class TestTimeListStateLookup(unittest.TestCase):
+    """ Recherche par index et par temps """
+    def test_append_merges_with_previous_state(self):
+        states, base = create_history(3)
+        self.assertEqual(len(states), 4)
+        self.assertEqual(states[-1]['value'], 2)
+        self.assertEqual(states[-1]['other'], 'default')
+        self.assertEqual(states[0]['value'], -1)
+
+    def test_index_out_of_range(self):
+        states, base = create_history(2)
+        with self.assertRaises(IndexError):
+            states[3]
+        with self.assertRaises(IndexError):
+            states[-4]
+        with self.assertRaises(IndexError):
+            states['0']
+
+    def test_floor(self):
+        states, base = create_history(10)
+        self.assertEqual(states.get_floor(base + 4.0)['value'], 4)
+        self.assertEqual(states.get_floor(base + 4.9)['value'], 4)
+        self.assertEqual(states.get_floor(base + 1000.0)['value'], 9)
+        self.assertEqual(states[base + 5.5]['value'], 5)
+        self.assertEqual(states[datetime.fromtimestamp(base + 3.5)]['value'], 3)
+
+    def test_floor_before_first_state(self):
+        states, base = create_history(3)
+        states_start = states.get_time(0)
+        self.assertEqual(states.get_floor(states_start - 10)['value'], -1)
+
+    def test_sequential_and_backward_reads(self):
+        states, base = create_history(50)
+        values = [states.get_floor(base + i / 2)['value'] for i in range(100)]
+        self.assertEqual(values, [i // 2 for i in range(100)])
+        self.assertEqual(states.get_floor(base + 10.0)['value'], 10)
+        self.assertEqual(states.get_floor(base + 1.0)['value'], 1)
+
+    def test_nearest(self):
+        states, base = create_history(5)
+        self.assertEqual(states.get_nearest(base + 1.4)['value'], 1)
+        self.assertEqual(states.get_nearest(base + 1.6)['value'], 2)
+        self.assertEqual(states.get_nearest(base + 400.0)['value'], 4)
+
+    def test_time_stays_monotonic(self):
+        states, base = create_history(3)
+        states.append({'value': 3}, timestamp=base - 50.0)
+        self.assertEqual(states.get_time(-1), base + 2.0)
+        self.assertEqual(states.get_floor(base + 2.0)['value'], 3)
+
+    def test_states_are_read_only(self):
+        states, base = create_history(1)
+        with self.assertRaises(TypeError):
+            states[-1]['value'] = 5
+
+
+class TestTimeListStateRetention(unittest.TestCase):
+    """ Rétention bornée par nombre d'états et par durée """
+    def test_max_count(self):
+        states, base = create_history(1000, max_count=10)
+        self.assertEqual(len(states), 10)
+        self.assertEqual(states[0]['value'], 990)
+        self.assertEqual(states.get_time_range(), (base + 990, base + 999))
+        self.assertEqual(states.get_floor(0.0)['value'], 990)
+
+    def test_max_duration_keeps_state_in_force(self):
+        states, base = create_history(100, max_duration=10)
+        first_time, last_time = states.get_time_range()
+        self.assertEqual(last_time, base + 99.0)
+        # L'état en vigueur au début de la fenêtre est gardé
+        self.assertEqual(first_time, base + 89.0)
+        self.assertEqual(states.get_floor(base + 89.5)['value'], 89)
+
+    def test_state_in_force_is_kept_after_gap(self):
+        states = TimeListState('Test', {'value': 0}, max_duration=1)
+        base = states.get_time(0)
+        states.append({'value': 1}, timestamp=base + 100.0)
+        states.append({'value': 2}, timestamp=base + 1000.0)
+        self.assertEqual([state['value'] for _, state in states.get_history()], [1, 2])
+        self.assertEqual(states.get_floor(base + 999.5)['value'], 1)
+
+    def test_history_after_compaction(self):
+        states, base = create_history(500, max_count=7)
+        history = states.get_history()
+        self.assertEqual([time for time, _ in history], [base + i for i in range(493, 500)])
+        self.assertEqual([state['value'] for _, state in history], list(range(493, 500)))
+
+
+class TestTimeListStateSharing(unittest.TestCase):
+    """ Partage des sous-états inchangés et copies figées """
+    def test_unchanged_sub_states_are_shared(self):
+        states = TimeListState('Test', {'blue': {0: {'tactic': 'None'}}, 'yellow': {0: {'tactic': 'None'}}})
+        previous = states[-1]
+        states.append({'blue': {0: {'tactic': 'GoalKeeper'}}, 'yellow': {0: {'tactic': 'None'}}})
+        self.assertIs(states[-1]['yellow'], previous['yellow'])
+        self.assertIsNot(states[-1]['blue'], previous['blue'])
+        self.assertEqual(states[-1]['blue'][0]['tactic'], 'GoalKeeper')
+
+    def test_freeze_unchanged_state_returns_previous(self):
+        previous = freeze_state({'a': {'b': [1, 2]}, 'c': 1})
+        self.assertIs(freeze_state({'a': {'b': [1, 2]}, 'c': 1}, previous), previous)
+        changed = freeze_state({'a': {'b': [1, 2]}, 'c': 2}, previous)
+        self.assertIs(changed['a'], previous['a'])
+        self.assertEqual(changed['c'], 2)
+
+    def test_freeze_does_not_alias_input(self):
+        source = {'a': {'b': 1}}
+        frozen = freeze_state(source)
+        source['a']['b'] = 2
+        self.assertEqual(frozen['a']['b'], 1)
+
+    def test_copy_is_frozen(self):
+        states, base = create_history(5)
+        frozen = states.copy()
+        states.append({'value': 5}, timestamp=base + 5)
+        self.assertEqual(len(frozen), 6)
+        self.assertEqual(len(states), 7)
+        self.assertEqual(frozen[-1]['value'], 4)
+        self.assertEqual(frozen.get_floor(base + 100)['value'], 4)
+        self.assertEqual(frozen.copy()[-1]['value'], 4)
+        with self.assertRaises(AssertionError):
+            frozen.append({'value': 6})
+
+    def test_copy_keeps_evicted_states(self):
+        states, base = create_history(5, max_count=3)
+        frozen = states.copy()
+        first_time = frozen.get_time(0)
+        for i in range(5, 20):
+            states.append({'value': i}, timestamp=base + i)
+        # L'éviction de l'historique vivant ne retire rien à la copie figée
+        self.assertEqual(len(frozen), 3)
+        self.assertEqual(frozen.get_time(0), first_time)
+        self.assertEqual([state['value'] for _, state in frozen.get_history()], [2, 3, 4])
+        self.assertEqual(frozen.copy().get_time_range(), (base + 2, base + 4))
+        self.assertEqual(len(states), 3)
+        self.assertEqual(states[0]['value'], 17)
+        self.assertEqual(len(states._store.copies), 0)
+
+    def test_copy_is_detached_only_when_reached(self):
+        states, base = create_history(5, max_count=8)
+        frozen = states.copy()
+        for i in range(5, 7):
+            states.append({'value': i}, timestamp=base + i)
+        self.assertIs(frozen._store, states._store)
+        states.append({'value': 7}, timestamp=base + 7)
+        self.assertIsNot(frozen._store, states._store)
+        self.assertEqual([state['value'] for _, state in frozen.get_history()], list(range(-1, 5)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+# Under MIT License, see LICENSE.txt
+
+import unittest
+from random import Random
+
+from Model.TimerWheel import TimerWheel
+
+__author__ = 'RoboCupULaval'
+
+
+class TestTimerWheel(unittest.TestCase):
+    """ Expiration des clés non rafraîchies """
+    def setUp(self):
+        self.wheel = TimerWheel(timeout=1.0, resolution=0.25)
+
+    def test_expires_after_timeout(self):
+        self.wheel.touch('a', 10.0)
+        self.assertEqual(self.wheel.sweep(10.5), [])
+        self.assertIn('a', self.wheel)
+        self.assertEqual(self.wheel.sweep(11.0), ['a'])
+        self.assertNotIn('a', self.wheel)
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_touch_postpones_expiration(self):
+        self.wheel.touch('a', 10.0)
+        self.wheel.touch('a', 10.9)
+        self.assertEqual(self.wheel.sweep(11.5), [])
+        self.assertEqual(self.wheel.sweep(11.9), ['a'])
+
+    def test_deadline_inside_current_slot(self):
+        self.wheel.touch('a', 10.1)
+        # La case de l'échéance (11.1) est atteinte avant l'échéance
+        self.assertEqual(self.wheel.sweep(11.0), [])
+        self.assertEqual(self.wheel.sweep(11.05), [])
+        # La clé est reportée à la case suivante: elle expire au plus resolution secondes après son échéance
+        self.assertEqual(self.wheel.sweep(11.35), ['a'])
+
+    def test_discard(self):
+        self.wheel.touch('a', 10.0)
+        self.wheel.touch('b', 10.0)
+        self.wheel.discard('a')
+        self.wheel.discard('missing')
+        self.assertEqual(self.wheel.sweep(20.0), ['b'])
+
+    def test_touch_after_discard(self):
+        self.wheel.touch('a', 10.0)
+        self.wheel.discard('a')
+        self.wheel.touch('a', 12.0)
+        self.assertEqual(self.wheel.sweep(11.5), [])
+        self.assertEqual(self.wheel.sweep(13.0), ['a'])
+
+    def test_clear(self):
+        self.wheel.touch('a', 10.0)
+        self.wheel.clear()
+        self.assertEqual(self.wheel.sweep(20.0), [])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_matches_deadlines(self):
+        rand = Random(19)
+        deadlines = dict()
+        now = 0.0
+        for _ in range(5000):
+            now += rand.uniform(0, 0.05)
+            key = rand.randrange(50)
+            self.wheel.touch(key, now)
+            deadlines[key] = now + 1.0
+            for key in self.wheel.sweep(now):
+                # Une clé n'expire jamais avant son échéance ni plus d'une case après
+                self.assertLessEqual(deadlines[key], now)
+                self.assertGreater(deadlines[key], now - 0.25 - 0.05)
+                del deadlines[key]
+        self.assertEqual(sorted(self.wheel.sweep(now + 2.0)), sorted(deadlines))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+# Under MIT License, see LICENSE.txt
+
+import unittest
+import zlib
+
+from Model.DataObject.AccessorData.VeryLargeDataAcc import VeryLargeDataAcc
+from Model.DataObject.BaseDataObject import FormatPackageError
+
+__author__ = 'RoboCupULaval'
+
+
+def create_piece(binary_id, total_pieces, piece_number, binary, compressed=False):
+    return VeryLargeDataAcc({'name': 'StrategyIA', 'version': '1.0', 'type': 2000, 'link': None,
+                             'data': {'id': binary_id, 'total_pieces': total_pieces, 'piece_number': piece_number,
+                                      'binary': binary, 'compressed': compressed}})
+
+
+class TestVeryLargeDataReassembly(unittest.TestCase):
+    """ Reconstruction des binaires envoyés en morceaux """
+    def test_out_of_order(self):
+        data = bytes(range(256)) * 10
+        pieces = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+        order = [3, 1, 2]
+        for count, piece_number in enumerate(order):
+            complete = create_piece('order', 3, piece_number, pieces[piece_number - 1]).store()
+            self.assertEqual(complete, count == len(order) - 1)
+        self.assertEqual(create_piece('order', 3, 1, b'').rebuild(), data)
+
+    def test_compressed(self):
+        data = b'influence map' * 1000
+        piece = create_piece('compressed', 1, 1, zlib.compress(data), compressed=True)
+        self.assertTrue(piece.store())
+        self.assertEqual(piece.rebuild(), data)
+
+    def test_too_many_pieces_is_rejected_before_allocation(self):
+        rejected = VeryLargeDataAcc.get_reassembly_stats()['rejected']
+        self.assertFalse(create_piece('huge', 2 ** 40, 1, b'x' * 1000).store())
+        self.assertFalse(create_piece('large', VeryLargeDataAcc.MAX_PIECES, 1, b'x' * 2000).store())
+        stats = VeryLargeDataAcc.get_reassembly_stats()
+        self.assertEqual(stats['rejected'], rejected + 2)
+        self.assertLessEqual(stats['pending_bytes'], VeryLargeDataAcc.MEMORY_CAP)
+
+    def test_decompression_bomb_is_rejected(self):
+        piece = create_piece('bomb', 1, 1, zlib.compress(b'\x00' * (VeryLargeDataAcc.MEMORY_CAP + 1)),
+                             compressed=True)
+        self.assertTrue(piece.store())
+        with self.assertRaises(FormatPackageError):
+            piece.rebuild()
+
+
+if __name__ == '__main__':
+    unittest.main()
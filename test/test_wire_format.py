@@ -0,0 +1,135 @@
+# Under MIT License, see LICENSE.txt
+
+import struct
+import unittest
+from time import time
+
+from Model.DataObject.BaseDataObject import FormatPackageError, CheckedPackage
+from Model.DataObject.WireFormat import encode_packet, decode_packet, is_binary_packet, peek_packet, HEADER, MAGIC, \
+    LINK_NONE, FLAG_STR_LINK
+
+__author__ = 'RoboCupULaval'
+
+
+def create_packet(p_type=3001, link=None, data=None, **extra):
+    packet = {'name': 'StrategyIA', 'version': '1.0', 'type': p_type, 'link': link, 'data': data or dict()}
+    packet.update(extra)
+    return packet
+
+
+class TestWireFormatRoundTrip(unittest.TestCase):
+    """ Encodage puis décodage des paquets au format binaire """
+    def round_trip(self, packet, sender_names=None, sender_id=3):
+        raw = encode_packet(packet, sender_id=sender_id)
+        self.assertTrue(is_binary_packet(raw))
+        return decode_packet(raw, sender_names)
+
+    def test_scalars(self):
+        data = {'none': None, 'yes': True, 'no': False, 'int': -2 ** 40, 'float': 1.25, 'str': 'éàç',
+                'bytes': b'\x00\xff', 'empty_list': [], 'empty_dict': dict()}
+        decoded = self.round_trip(create_packet(data=data))
+        self.assertIsInstance(decoded, CheckedPackage)
+        self.assertEqual(decoded['data'], data)
+        self.assertIs(decoded['data']['yes'], True)
+
+    def test_header(self):
+        decoded = self.round_trip(create_packet(p_type=3005, link=7), sender_names={3: 'StrategyIA'})
+        self.assertEqual(decoded['name'], 'StrategyIA')
+        self.assertEqual(decoded['version'], '1.0')
+        self.assertEqual(decoded['type'], 3005)
+        self.assertEqual(decoded['link'], 7)
+        self.assertEqual(decoded['sender_id'], 3)
+        self.assertNotIn('seq', decoded)
+        self.assertNotIn('sent_time', decoded)
+
+    def test_unknown_sender(self):
+        self.assertEqual(self.round_trip(create_packet(), sender_id=9)['name'], 'sender-9')
+
+    def test_str_link_sequence_and_sent_time(self):
+        decoded = self.round_trip(create_packet(link='filtre', seq=42, sent_time=1234.5))
+        self.assertEqual(decoded['link'], 'filtre')
+        self.assertEqual(decoded['seq'], 42)
+        self.assertEqual(decoded['sent_time'], 1234.5)
+
+    def test_points_and_colors(self):
+        data = {'start': (1, -2), 'end': (0.5, 1.5), 'color': (255, 0, 128), 'points': [(1.0, 2.0), (3, 4)],
+                'nested': [(1, 2, 3, 4), ['a', (True, None)]]}
+        decoded = self.round_trip(create_packet(data=data))['data']
+        self.assertEqual(decoded['start'], (1, -2))
+        self.assertEqual(decoded['end'], (0.5, 1.5))
+        self.assertEqual(decoded['color'], (255, 0, 128))
+        self.assertEqual(decoded['points'], [(1.0, 2.0), (3.0, 4.0)])
+        self.assertEqual(decoded['nested'], [(1, 2, 3, 4), ['a', (True, None)]])
+
+    def test_large_int_point_is_float(self):
+        decoded = self.round_trip(create_packet(data={'p': (2 ** 40, 0)}))['data']
+        self.assertAlmostEqual(decoded['p'][0], 2 ** 40, delta=2 ** 40 * 1e-6)
+
+    def test_int_grid(self):
+        grid = [[x * y - 50 for x in range(9)] for y in range(6)]
+        self.assertEqual(self.round_trip(create_packet(p_type=3007, data={'field_data': grid}))['data'],
+                         {'field_data': grid})
+
+    def test_ragged_grid_is_kept(self):
+        ragged = [[1, 2], [3]]
+        self.assertEqual(self.round_trip(create_packet(data={'ragged': ragged}))['data']['ragged'], ragged)
+
+
+class TestWireFormatErrors(unittest.TestCase):
+    """ Paquets binaires invalides """
+    def test_unsupported_value(self):
+        with self.assertRaises(FormatPackageError):
+            encode_packet(create_packet(data={'set': {1, 2}}))
+
+    def test_truncated_packet(self):
+        raw = encode_packet(create_packet(data={'text': 'abcdef', 'points': [(1, 2)] * 10}))
+        for length in (0, HEADER.size - 1, HEADER.size, len(raw) - 1):
+            with self.assertRaises(FormatPackageError):
+                decode_packet(raw[:length])
+
+    def test_unknown_tag(self):
+        raw = HEADER.pack(MAGIC, 0x10, 0, 3001, LINK_NONE, 0, 0) + b'\xfe'
+        with self.assertRaises(FormatPackageError):
+            decode_packet(raw)
+
+    def test_wrong_version(self):
+        with self.assertRaises(FormatPackageError):
+            decode_packet(encode_packet(create_packet(**{'version': '2.0'})))
+
+    def test_type_out_of_range(self):
+        with self.assertRaises(FormatPackageError):
+            decode_packet(encode_packet(create_packet(p_type=7000)))
+
+    def test_oversized_grid_header(self):
+        header = HEADER.pack(MAGIC, 0x10, 0, 3007, LINK_NONE, 0, 0) + struct.pack('<BI', 9, 1) + \
+            struct.pack('<B', 5) + struct.pack('<I', 10) + b'field_data'
+        for rows, cols in ((200000000, 0), (0, 5), (1 << 12, 1 << 12), (1000, 1000)):
+            start = time()
+            with self.assertRaises(FormatPackageError):
+                decode_packet(header + struct.pack('<BII', 13, rows, cols) + b'\x00' * 16)
+            self.assertLess(time() - start, 1)
+
+    def test_length_past_end(self):
+        header = HEADER.pack(MAGIC, 0x10, 0, 3001, LINK_NONE, 0, 0) + struct.pack('<BI', 9, 1) + \
+            struct.pack('<BI', 5, 1) + b'k'
+        for tag in (5, 6, 10):
+            with self.assertRaises(FormatPackageError):
+                decode_packet(header + struct.pack('<BI', tag, 1000) + b'abc')
+        with self.assertRaises(FormatPackageError):
+            decode_packet(header + struct.pack('<BI', 5, 2 ** 32 - 1))
+
+    def test_str_link_past_end_is_not_peeked(self):
+        raw = HEADER.pack(MAGIC, 0x10, FLAG_STR_LINK, 3005, LINK_NONE, 0, 0) + struct.pack('<I', 100) + b'abc'
+        self.assertEqual(peek_packet(raw), (None, None, None))
+
+    def test_data_is_not_a_dict(self):
+        raw = HEADER.pack(MAGIC, 0x10, 0, 3001, LINK_NONE, 0, 0) + struct.pack('<Bq', 3, 1)
+        with self.assertRaises(FormatPackageError):
+            decode_packet(raw)
+
+    def test_pickle_is_not_binary(self):
+        self.assertFalse(is_binary_packet(b'\x80\x03}q\x00'))
+
+
+if __name__ == '__main__':
+    unittest.main()